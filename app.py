@@ -4,16 +4,20 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import io
+import json
 import random
+import itertools
+import uuid
 
 # --- CUSTOM MODULE IMPORTS ---
-from utils.vision import analyze_crop_disease
+from utils.vision import analyze_crop_disease, stream_crop_analysis, get_cascade_stats
 from utils.insurance import check_weather_oracle, trigger_payout_transaction,generate_insurance_policy
 
 from utils.carbon import calculate_green_score, mint_carbon_tokens
 from utils.history import load_history, save_transaction
 from utils.rag import agent_chain
 from utils.market_agent import broker_agent
+from utils.broker_service import broker_service, BrokerBusy
 # Try to import Qrcode (Fail gracefully if not installed)
 try:
     import qrcode
@@ -49,6 +53,7 @@ st.set_page_config(layout="wide", page_title="VeriYield Protocol", page_icon="
 # --- SESSION STATE INITIALIZATION ---
 if 'logged_in' not in st.session_state: st.session_state.logged_in = False
 if 'chat_history' not in st.session_state: st.session_state.chat_history = []
+if 'session_id' not in st.session_state: st.session_state.session_id = uuid.uuid4().hex  # Broker session key
 if 'crop_data' not in st.session_state: st.session_state.crop_data = None
 if 'last_analysis' not in st.session_state: st.session_state.last_analysis = None
 if 'user_input' not in st.session_state: st.session_state.user_input = ""
@@ -70,6 +75,24 @@ with st.sidebar:
     st.info("Simulating Polygon Amoy Network")
     god_mode = st.toggle("⚡ God Mode (Force Drought)", value=False)
     st.caption("Toggle to trigger Insurance Payout demo.")
+    with st.expander("📈 Vision Cascade Stats"):
+        st.json(get_cascade_stats())
+    with st.expander("🔎 Search Cache Stats"):
+        from utils.search_service import search_service
+        st.json(search_service.stats())
+    with st.expander("🤝 Broker Service Stats"):
+        st.json(broker_service.stats())
+    with st.expander("🧾 Invoice Ledger"):
+        from utils.ledger import invoice_ledger, month_range
+        st.json(invoice_ledger.stats())
+        month = datetime.now().strftime("%Y-%m")
+        if st.button("📦 Prepare This Month's CSV"):
+            date_from, date_to = month_range(month)
+            st.session_state.ledger_csv = invoice_ledger.export_bytes("csv", date_from=date_from, date_to=date_to)
+        if 'ledger_csv' in st.session_state:
+            st.download_button("⬇️ Download CSV", st.session_state.ledger_csv,
+                               file_name=f"veriyield_invoices_{month}.csv", mime="text/csv")
+        st.caption("Full month-end export: python -m utils.ledger --month YYYY-MM --out invoices.csv")
     st.divider()
     st.caption("VeriYield Neural-Chain v2.0")
     st.divider()
@@ -172,40 +195,97 @@ else:
                 st.image(img, caption="Field Capture", use_column_width=True)
         
         with col_metrics:
+            full_assay = st.checkbox("🔬 Full assay (always grade with the vision model)",
+                                     help="Skips the local pre-screen shortcut for healthy-looking photos.")
             if img and st.button("Analyze Quality", type="primary"):
                 with st.spinner("Running Llama-Vision Assayer..."):
-                    result = analyze_crop_disease(img)
+                    # Placeholders are filled field-by-field while the model is still streaming
+                    crop_slot = st.empty()
+                    grade_slot = st.empty()
+                    m1, m2 = st.columns(2)
+                    size_slot, conf_slot = m1.empty(), m2.empty()
+                    defects_slot = st.empty()
+                    expl_slot = st.empty()
+
+                    def render_field(key, value):
+                        if key == 'crop_type':
+                            crop_slot.caption(f"🌱 Crop: {value}")
+                        elif key == 'fci_grade':
+                            grade_slot.markdown(f"### Grade: {value}")
+                        elif key == 'estimated_size_mm':
+                            size_slot.metric("Est. Size", value)
+                        elif key == 'confidence':
+                            conf_slot.metric("Confidence", value)
+                        elif key == 'visual_defects':
+                            defects = value if isinstance(value, list) else [str(value)]
+                            defects_slot.markdown("**Visual Defects:** " + ", ".join(defects or ['None']))
+                        elif key == 'explanation':
+                            expl_slot.info(f"**Explanation:** {value}")
+
+                    result = None
+                    try:
+                        for event in stream_crop_analysis(img, full_assay=full_assay):
+                            if event[0] == "field":
+                                render_field(event[1], event[2])
+                            else:
+                                result = event[1]
+                    except Exception:
+                        result = None
+                    if result is None:  # Non-streaming fallback
+                        result = analyze_crop_disease(img, full_assay=full_assay)
+
                     st.session_state.crop_data = result
                     st.session_state.last_analysis = result # For Tab 2 compatibility
                     
-                    # Display Results
-                    st.markdown(f"### Grade: {result.get('fci_grade', 'N/A')}")
-                    
-                    m1, m2 = st.columns(2)
-                    m1.metric("Est. Size", result.get('estimated_size_mm', 'N/A'))
-                    m2.metric("Confidence", result.get('confidence', 'N/A'))
-                    
-                    st.write("**Visual Defects:**")
-                    st.write(", ".join(result.get('visual_defects', ['None'])))
-                    
-                    st.info(f"**Explanation:** {result.get('explanation', 'Analysis complete.')}")
-                    st.divider()
-                    st.subheader("🧠 Multi-Modal Research Agent")
-                    
-                    with st.status("🕵️ Agent is searching the web...", expanded=True) as status:
-                        st.write(f"🔍 Searching: '{result.get('search_term', 'Crop disease treatment')}'")
-                        st.write("🌐 Browsing: agmarknet.gov.in, amazon.in, krishijagran.com...")
-                        
-                        # CALL THE LANGGRAPH AGENT
-                        advisory = agent_chain.generate_detailed_advisory(
-                            disease_data=result,
-                            weather_context="Live", # Agent fetches this automatically now
-                            market_context="Live"
-                        )
-                        status.update(label="✅ Research Complete!", state="complete", expanded=False)
-                    
-                    # Display the Agent's Report
-                    st.markdown(advisory)
+                    # Final render from the complete result (covers cache hits and fallbacks)
+                    for key in ('crop_type', 'fci_grade', 'estimated_size_mm', 'confidence', 'visual_defects', 'explanation'):
+                        render_field(key, result.get(key, 'N/A'))
+                    if result.get('prescreen'):
+                        st.caption("⚡ Local pre-screen verdict (no cloud AI call needed)")
+                    if result.get('near_duplicate_of') is not None:
+                        st.caption("♻️ Matched a previously assayed photo (served instantly)")
+
+                    # Unusable photos (blurry / no crop) get a retake prompt instead of a web research run
+                    if result.get('prescreen') and result.get('fci_grade') == 'N/A':
+                        st.warning("📸 Please retake the photo and analyze again.")
+                    # Healthy-looking pre-screen verdicts carry no grade: ask for the model assay first
+                    elif result.get('needs_full_assay'):
+                        st.info("🔬 Tick 'Full assay' and analyze again to get an FCI grade before selling.")
+                    else:
+                        st.divider()
+                        st.subheader("🧠 Multi-Modal Research Agent")
+
+                        district = st.session_state.get('land_data', {}).get('district')
+                        first_chunk, advisory_stream = None, None
+                        with st.status("🕵️ Agent is searching the web...", expanded=True) as status:
+                            st.write(f"🔍 Searching: '{result.get('search_term', 'Crop disease treatment')}'")
+                            st.write("🌐 Browsing: agmarknet.gov.in, amazon.in, krishijagran.com...")
+
+                            # CALL THE LANGGRAPH AGENT (research runs until the first report token)
+                            try:
+                                advisory_stream = agent_chain.stream_detailed_advisory(result, location=district)
+                                first_chunk = next(advisory_stream, "")
+                            except Exception:
+                                advisory_stream = None
+                            status.update(label="✅ Research Complete!", state="complete", expanded=False)
+
+                        # Display the Agent's Report as it is written
+                        advisory = None
+                        report_slot = st.empty()
+                        if advisory_stream is not None:
+                            try:
+                                with report_slot.container():
+                                    advisory = st.write_stream(itertools.chain([first_chunk], advisory_stream))
+                            except Exception:
+                                advisory = None
+                        if not advisory:  # Non-streaming fallback (replaces any partial stream)
+                            advisory = agent_chain.generate_detailed_advisory(
+                                disease_data=result,
+                                weather_context="Live", # Agent fetches this automatically now
+                                market_context="Live",
+                                location=district
+                            )
+                            report_slot.markdown(advisory)
                     
                     if result.get('fci_grade') == 'Grade A':
                         st.balloons()
@@ -228,14 +308,21 @@ else:
         # Real-world apps use ArcLayers to show connection, not just dots.
         import pydeck as pdk
         
-        # Route: Nashik (Farm) -> Mumbai (Port/Market)
+        # Routes: the farm parcel -> every mandi, with road distance and haulage cost from one vectorized pass
+        from utils.geo import MARKETS, DEFAULT_FARM, road_km_matrix, logistics_cost_matrix
+        land = st.session_state.get('land_data', {})
+        farm = (land['lat'], land['lon']) if 'lat' in land else DEFAULT_FARM
+        market_coords = list(MARKETS.values())
+        road_km = road_km_matrix(farm, market_coords)[0]
+        haulage = logistics_cost_matrix(farm, market_coords)[0]
         route_data = [{
-            "from_name": "Nashik Farm (Survey 24/A)",
-            "to_name": "Mumbai APMC Port",
-            "start": [73.7898, 19.9975], # Lon, Lat
-            "end": [73.0297, 19.0330],
-            "distance": "167 km"
-        }]
+            "from_name": f"Farm (Survey {land.get('survey_no', '45/2A')})",
+            "to_name": name,
+            "start": [farm[1], farm[0]], # Lon, Lat
+            "end": [lon, lat],
+            "distance": f"{km:.0f} km",
+            "cost": f"₹{cost:.2f}/kg"
+        } for (name, (lat, lon)), km, cost in zip(MARKETS.items(), road_km, haulage)]
         
         # Define the 3D Map Layers
         layer_arc = pdk.Layer(
@@ -259,11 +346,11 @@ else:
         )
 
         # Render Map
-        view_state = pdk.ViewState(latitude=19.5, longitude=73.4, zoom=7, pitch=45)
+        view_state = pdk.ViewState(latitude=farm[0] - 0.4, longitude=farm[1] - 0.2, zoom=7, pitch=45)
         r = pdk.Deck(
             layers=[layer_arc, layer_scatter], 
             initial_view_state=view_state,
-            tooltip={"text": "{from_name} ➝ {to_name}"}
+            tooltip={"text": "{from_name} ➝ {to_name}: {distance}, haulage {cost}"}
         )
         
         c1, c2 = st.columns([2, 1])
@@ -299,14 +386,16 @@ else:
             result = st.session_state.last_analysis
             
             # Create the 'Block' Data
+            if 'asset_id' not in st.session_state: st.session_state.asset_id = f"CROP-{random.randint(1000,9999)}"
             passport_data = {
-                "asset_id": f"CROP-{random.randint(1000,9999)}",
+                "asset_id": st.session_state.asset_id,
                 "farmer_id": "0x71C...9E3F",
                 "grade": result.get('fci_grade'),
                 "harvest_date": datetime.now().strftime("%Y-%m-%d"),
                 "origin": "Nashik, Maharashtra",
                 "sustainability_score": st.session_state.get('carbon_result', {}).get('score', 'N/A')
             }
+            st.session_state.passport = passport_data  # Feeds the ONDC catalog listing
             
             c_a, c_b = st.columns(2)
             
@@ -397,10 +486,38 @@ else:
 
         # Import the Agents
         from utils.market_agent import broker_agent
-        from utils.ondc import broadcast_to_ondc, generate_invoice
+        from utils.ondc import broadcast_to_ondc, post_bids_to_book, accept_bid, rest_listing
+        from utils.order_book import matching_engine
+        from utils.geo import DEFAULT_FARM
+        from utils.catalog import catalog_index, listing_from_session
+        
+        # Buyer-side view: faceted search over every active listing on the network
+        with st.expander("🔎 Buyer Catalog Search"):
+            browse = catalog_index.search(per_page=0)
+            f1, f2, f3 = st.columns(3)
+            crops = f1.multiselect("Crop", sorted(browse['facets']['crop']))
+            grades = f2.multiselect("Grade", sorted(browse['facets']['grade']))
+            districts = f3.multiselect("District", sorted(browse['facets']['district']))
+            f4, f5, f6 = st.columns(3)
+            qty_range = f4.slider("Quantity (kg)", 0, 20000, (0, 20000), step=100)
+            min_green = f5.slider("Min Green Score", 0, 180, 0)
+            sort_label = f6.selectbox("Sort by", ["Price ↑", "Price ↓", "Quantity ↓", "Green Score ↓", "Newest"])
+            sort_by, descending = {"Price ↑": ("price", False), "Price ↓": ("price", True),
+                                   "Quantity ↓": ("quantity_kg", True), "Green Score ↓": ("green_score", True),
+                                   "Newest": ("created_at", True)}[sort_label]
+            page_no = st.number_input("Page", min_value=1, value=1, step=1)
+            found = catalog_index.search(crop=crops or None, grade=grades or None, district=districts or None,
+                                         quantity_kg=qty_range, green_score=(min_green, None) if min_green else None,
+                                         sort_by=sort_by, descending=descending, page=int(page_no), per_page=10)
+            st.caption(f"{found['total']:,} listings • {found['took_ms']} ms")
+            if found['results']:
+                st.dataframe(pd.DataFrame(found['results'])[['crop', 'grade', 'district', 'quantity_kg', 'price', 'green_score', 'seller']],
+                             use_container_width=True, hide_index=True)
         
         if not st.session_state.crop_data:
             st.warning("⚠️ Please analyze a crop in Tab 1 first to establish quality.")
+        elif st.session_state.crop_data.get('needs_full_assay'):
+            st.warning("⚠️ This crop only has a local pre-screen verdict. Run a full assay in Tab 1 to grade it for sale.")
         else:
             # Layout: Left = Chat (Raju Bhai), Right = ONDC Network
             col_chat, col_ondc = st.columns([1, 1.2])
@@ -444,7 +561,14 @@ else:
                     with chat_container: st.chat_message("user", avatar="👨‍🌾").write(user_msg)
                     
                     with st.spinner(f"{broker_agent.name} is checking rates..."):
-                        response = broker_agent.chat_with_broker(st.session_state.chat_history, st.session_state.crop_data, user_msg)
+                        try:
+                            # Session-scoped, concurrency-limited broker (fair queue across farmers)
+                            response = broker_service.chat(
+                                st.session_state.session_id, st.session_state.chat_history,
+                                st.session_state.crop_data, user_msg
+                            )
+                        except BrokerBusy:
+                            response = "🙏 Sir ji, mandi is very busy right now. Please ask again in a minute."
                     
                     st.session_state.chat_history.append({"role": "assistant", "content": response})
                     with chat_container: st.chat_message("assistant", avatar="👳").write(response)
@@ -464,40 +588,86 @@ else:
                     """, unsafe_allow_html=True)
                     
                     qty = st.slider("Quantity to Sell (kg)", 100, 5000, 500)
+                    auto_sell = st.number_input("Auto-sell at (₹/kg, 0 = off)", min_value=0.0, value=0.0, step=0.5,
+                                                help="Rests the lot in the ONDC order book: any bid at or above this price buys it automatically.")
                     
                     st.info("💡 **Pro Tip:** Use the 'Broadcast' button below to find REAL market rates via the ONDC Gateway.")
                     
                     # THE "REAL WORLD" MOMENT
                     if st.button("📡 Broadcast to ONDC Network", type="primary", use_container_width=True):
                         with st.status("🔄 Handshaking with ONDC Gateway...", expanded=True):
-                            st.write("🔍 Searching for active Buyer Apps...")
-                            time.sleep(1)
-                            st.write("📡 Pinging BigBasket, Blinkit, Ninjacart...")
-                            time.sleep(1)
+                            st.write("📡 Broadcasting listing to Buyer Apps (BPPs)...")
                             
-                            # CALL THE NEW RAG-POWERED FUNCTION
-                            st.session_state.bids = broadcast_to_ondc(st.session_state.crop_data)
+                            # Concurrent Beckn broadcast, bounded by the bid window
+                            land = st.session_state.get('land_data', {})
+                            farm = (land['lat'], land['lon']) if 'lat' in land else DEFAULT_FARM
+                            previous = st.session_state.get('bids')
+                            st.session_state.bids, report = broadcast_to_ondc(st.session_state.crop_data, qty, with_report=True, farm_location=farm)
+                            # Auto-sell: rest the lot first so the incoming bids cross it by price-time priority
+                            fills, invoices = [], []
+                            previous_listing, st.session_state.listing_order_id = st.session_state.get('listing_order_id'), None
+                            if auto_sell > 0:
+                                listed = rest_listing(st.session_state.crop_data, qty, auto_sell, seller=st.session_state.session_id,
+                                                      replaces=previous_listing)
+                                # Kept even when sold out: Accept subtracts what auto-sell already sold
+                                st.session_state.listing_order_id = listed['order']['order_id']
+                                fills, invoices = listed['fills'], listed['invoices']
+                            elif previous_listing:
+                                matching_engine.cancel(previous_listing)
+                            booked = post_bids_to_book(st.session_state.bids, st.session_state.crop_data, qty, replaces=previous)
+                            fills, invoices = fills + booked['fills'], invoices + booked['invoices']
+                            listing = listing_from_session(
+                                st.session_state.crop_data, qty, report['ask_price'], st.session_state.session_id,
+                                land_data=st.session_state.get('land_data'), passport=st.session_state.get('passport'),
+                                carbon_result=st.session_state.get('carbon_result'))
+                            catalog_index.add(listing)
+                            st.session_state.listing_id = listing['listing_id']
                             
+                            if report["source"] == "ondc":
+                                dropped = sum(report["dropped"].values())
+                                st.write(f"⏱️ {report['endpoints']} BPPs polled in {report['elapsed_s']}s ({dropped} late/invalid dropped)")
+                            else:
+                                st.write("🧮 No live BPPs reachable - quoting from the market price book")
                             st.write(f"✅ {len(st.session_state.bids)} Competitive Bids Received!")
+                            sold = [inv for fill, inv in zip(fills, invoices) if fill['seller'] == st.session_state.session_id]
+                            if sold:
+                                st.session_state.invoice, st.session_state.invoices = sold[0], sold
+                                st.write(f"🔁 Auto-sold {sum(inv['quantity_kg'] for inv in sold):,} kg at ₹{auto_sell:g}/kg or better")
+                                if sum(inv['quantity_kg'] for inv in sold) >= qty:
+                                    catalog_index.remove(listing['listing_id'])
+                            if len(fills) > len(sold):
+                                st.write(f"🔁 {len(fills) - len(sold)} bid fill(s) matched other sellers' resting listings")
                     
                     # Display Bids
                     if 'bids' in st.session_state:
-                        st.markdown("#### ⚡ Live Bids (Expires in 5:00)")
+                        st.markdown("#### ⚡ Live Bids (ranked by net price to you)")
                         
                         for bid in st.session_state.bids:
+                            live = matching_engine.order(bid.get('order_id'))
                             with st.container():
                                 # Custom Card Layout for Bid
                                 c1, c2, c3 = st.columns([0.8, 2, 1.2])
                                 with c1: st.markdown(f"## {bid['logo']}")
                                 with c2: 
                                     st.write(f"**{bid['buyer_app']}**")
-                                    st.caption(f"⭐ {bid['rating']} • {bid['distance']}")
+                                    expiry = f"Expires in {live['expires_in_s'] // 60}:{live['expires_in_s'] % 60:02d}" if live else "Expired / filled"
+                                    st.caption(f"⭐ {bid['rating']} • {bid['distance']} • ⏳ {expiry}")
                                 with c3:
                                     st.metric("Offer", f"₹{bid['price']}/kg")
-                                    if st.button(f"Accept", key=bid['buyer_app']):
-                                        inv = generate_invoice(bid, st.session_state.crop_data, qty)
-                                        st.session_state.invoice = inv
-                                        st.rerun()
+                                    if 'net_price' in bid:
+                                        st.caption(f"Net ₹{bid['net_price']}/kg after ₹{bid['logistics_cost']}/kg haulage")
+                                    if st.button(f"Accept", key=bid.get('order_id', bid['buyer_app']), disabled=live is None):
+                                        result = accept_bid(bid, st.session_state.crop_data, qty, seller=st.session_state.session_id,
+                                                            listing_order_id=st.session_state.get('listing_order_id'))
+                                        st.session_state.listing_order_id = None
+                                        if result['invoices']:
+                                            if result['order']['remaining'] == 0:  # Sold out: off the buyer catalog
+                                                catalog_index.remove(st.session_state.get('listing_id'))
+                                            st.session_state.invoice = result['invoices'][0]
+                                            st.session_state.invoices = result['invoices']
+                                            st.rerun()
+                                        else:
+                                            st.warning("This bid is no longer live. Broadcast again for fresh bids.")
                         
                         # Show Invoice if Deal Accepted
                         # ... (Previous code for displaying bids) ...
@@ -517,10 +687,10 @@ else:
                                     <strong>Buyer:</strong> <span>{inv['buyer']}</span>
                                 </div>
                                 <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
-                                    <strong>Quantity:</strong> <span>{inv['quantity']}</span>
+                                    <strong>Quantity:</strong> <span>{inv['quantity_kg']:,} kg @ ₹ {inv['price_per_kg']:,.2f}/kg</span>
                                 </div>
                                 <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
-                                    <strong>Total Payout:</strong> <span style="font-size: 1.2rem; font-weight: bold; color: #15803D;">{inv['total_amount']}</span>
+                                    <strong>Total Payout:</strong> <span style="font-size: 1.2rem; font-weight: bold; color: #15803D;">₹ {inv['total_amount']:,.2f}</span>
                                 </div>
                                 <div style="font-family: monospace; background: #e6e6e6; padding: 5px; border-radius: 5px; font-size: 0.8rem; margin-top: 10px;">
                                     Contract Hash: {inv['invoice_id']}
@@ -528,6 +698,9 @@ else:
                             </div>
                             """, unsafe_allow_html=True)
                             
+                            if len(st.session_state.get('invoices', [])) > 1:
+                                st.caption("Also filled: " + ", ".join(f"{i['quantity_kg']:,} kg to {i['buyer']} @ ₹ {i['price_per_kg']:,.2f}" for i in st.session_state.invoices[1:]))
+                            
                             st.balloons()
                             
                             # 2. DOWNLOAD ACTION
@@ -547,7 +720,7 @@ else:
         st.subheader("🌍 Regenerative Farming Audit (AI-Verified)")
         
         # Import the new function
-        from utils.vision import verify_sustainable_practice
+        from utils.vision import verify_sustainable_claims
 
         with st.form("carbon_audit"):
             st.info("📝 Self-Reporting Protocol")
@@ -561,52 +734,48 @@ else:
             
             st.divider()
             st.info("📸 Proof of Work (Required for High Scores)")
-            audit_img = st.file_uploader("Upload Field Photo for AI Verification", type=['jpg', 'png'])
+            audit_imgs = st.file_uploader("Upload Field Photos for AI Verification", type=['jpg', 'png'], accept_multiple_files=True)
             
             submitted = st.form_submit_button("Run AI Audit & Calculate Score")
             
         if submitted:
-            # 1. Base Calculation
+            # 1. Self-Reported Inputs
             inputs = {
                 "tillage": "No-Till" if "No-Till" in tillage else "Conventional",
-                "irrigation": "Drip" if "Drip" in irrigation else "Flood",
+                "irrigation": "Drip" if "Drip" in irrigation else ("Sprinkler" if "Sprinkler" in irrigation else "Flood"),
                 "fertilizer": "Organic" if "Organic" in fertilizer else "Synthetic",
                 "cover_crop": cover_crop
             }
-            base_result = calculate_green_score(inputs)
-            final_score = base_result['total_score']
             
-            # 2. AI Verification Layer (The "Advanced" Upgrade)
-            verification_bonus = False
-            if audit_img:
+            # 2. AI Verification Layer: every claim checked in a single vision call
+            verification = None
+            if audit_imgs:
                 with st.spinner("AI Auditor is inspecting the field..."):
-                    # We verify the highest value claim (e.g., No-Till or Drip)
-                    claim_to_check = inputs['tillage'] if inputs['tillage'] == 'No-Till' else inputs['irrigation']
-                    audit_result = verify_sustainable_practice(audit_img, claim_to_check)
-                    
-                    if audit_result.get('verified'):
-                        st.success(f"AI Verified: {claim_to_check}")
-                        st.caption(f"Evidence: {audit_result.get('evidence')}")
-                        final_score += 20 # BONUS for Verified Proof
-                        verification_bonus = True
+                    parcel_id = st.session_state.get('land_data', {}).get('survey_no')
+                    verification = verify_sustainable_claims(audit_imgs, inputs, parcel_id=parcel_id)
+
+                for claim, verdict in verification.items():
+                    if verdict['verified']:
+                        st.success(f"AI Verified: {verdict['claimed']} ({verdict['confidence']:.0f}% confidence)")
+                        st.caption(f"Evidence: {verdict['evidence']}")
                     else:
-                        st.error(f"AI Rejection: Could not verify {claim_to_check}")
-                        st.caption(f"Reason: {audit_result.get('evidence')}")
-            
-            # 3. Save to Session State
+                        st.error(f"AI Rejection: Could not verify {verdict['claimed']}")
+                        st.caption(f"Reason: {verdict['evidence']}")
+
+            # 3. Score (self-reported points + per-claim verified bonuses) & Save to Session State
+            base_result = calculate_green_score(inputs, verification)
+            final_score = base_result['total_score']
             st.session_state.carbon_result = {
                 "score": final_score,
                 "tokens": int(final_score * 0.5),
                 "breakdown": base_result['breakdown']
             }
-            if verification_bonus:
-                st.session_state.carbon_result['breakdown'].append("🌟 +20: AI Visual Proof Bonus")
 
         # 4. Results & Minting
         if 'carbon_result' in st.session_state:
             res = st.session_state.carbon_result
             
-            st.metric("VeriYield Green Score", f"{res['score']}/170")
+            st.metric("VeriYield Green Score", f"{res['score']}/180")
             for item in res['breakdown']: st.caption(item)
                 
             if res['score'] > 100:
@@ -0,0 +1,80 @@
+"""
+Shared fixtures: every test run gets throwaway cache / ledger directories (set before any utils
+module is imported), and vision tests talk to a local MockGroqServer instead of Groq.
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+_RUN_DIR = tempfile.mkdtemp(prefix="veriyield_tests_")
+os.environ.setdefault("VERIYIELD_CACHE_DIR", os.path.join(_RUN_DIR, "cache"))
+os.environ.setdefault("VERIYIELD_LEDGER_DIR", os.path.join(_RUN_DIR, "ledger"))
+os.environ.setdefault("VISION_RPM", "6000")   # The shared token bucket would otherwise pace tests at 30/min
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+
+def make_image(seed=0, size=320, fmt="PNG", quality=90):
+    """Textured leaf-like photo: sharp, mostly plant pixels, with brown lesion blotches."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = np.zeros((size, size, 3), dtype=np.uint8)
+    pixels[..., 0] = 40 + rng.integers(0, 40, (size, size))
+    pixels[..., 1] = 110 + rng.integers(0, 90, (size, size))
+    pixels[..., 2] = 30 + rng.integers(0, 30, (size, size))
+    for _ in range(12):
+        y, x = rng.integers(10, size - 30, 2)
+        pixels[y:y + 20, x:x + 20] = (110, 60, 20)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt, **({"quality": quality} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    def _write(seed=0, name=None, **kwargs):
+        path = tmp_path / (name or f"photo_{seed}.png")
+        path.write_bytes(make_image(seed, **kwargs))
+        return str(path)
+    return _write
+
+
+@pytest.fixture
+def fresh_vision_state(tmp_path):
+    """Empty assay / audit caches and a perceptual index in tmp_path (swapped in via the registry)."""
+    from utils import vision
+    from utils.phash import PerceptualIndex
+    from utils.registry import registry
+
+    vision.assay_cache.clear()
+    vision.audit_cache.clear()
+    registry.register("vision.perceptual_index", lambda: PerceptualIndex(str(tmp_path / "phash_index.jsonl")))
+    yield vision
+    vision.assay_cache.clear()
+    vision.audit_cache.clear()
+    registry.register("vision.perceptual_index", PerceptualIndex)
+
+
+@pytest.fixture
+def groq_server():
+    from utils.mock_servers import MockGroqServer
+
+    servers = []
+
+    def _start(**kwargs):
+        server = MockGroqServer(**kwargs).start()
+        servers.append(server)
+        return server
+    yield _start
+    for server in servers:
+        server.stop()
+
+
+def groq_client(server):
+    from groq import Groq
+    return Groq(api_key="test", base_url=server.url, max_retries=0)
@@ -0,0 +1,101 @@
+"""Beckn broadcast engine against local MockBPPServer buyer apps."""
+
+import pytest
+
+from utils.beckn import BecknGateway, MalformedBid, build_search_request, parse_on_search
+from utils.mock_servers import MockBPPServer
+from utils.pricing import BUYERS
+
+GRACE_S = 0.3   # Scheduling slack allowed on top of the bid window
+
+
+@pytest.fixture
+def bpps():
+    servers = []
+
+    def _start(*specs):
+        """specs: (buyer index, latency, mode) per BPP; returns their base URLs."""
+        for i, latency, mode in specs:
+            buyer = dict(BUYERS[i % len(BUYERS)], buyer_app=f"{BUYERS[i % len(BUYERS)]['buyer_app']} #{len(servers)}")
+            servers.append(MockBPPServer(buyer, latency=latency, mode=mode).start())
+        return [server.url for server in servers]
+    yield _start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def gateway():
+    engine = BecknGateway(endpoints=[], window_s=1.0)
+    yield engine
+    engine.close()
+
+
+def _broadcast(gateway, urls, **kwargs):
+    return gateway.broadcast("Tomato", "Grade A", 1000, 24.0, endpoints=urls, **kwargs)
+
+
+def test_collects_and_ranks_every_timely_bid(gateway, bpps):
+    report = _broadcast(gateway, bpps((0, 0.0, "ok"), (1, 0.05, "ok"), (2, 0.1, "ok")))
+
+    prices = [bid["price"] for bid in report["bids"]]
+    assert len(prices) == 3
+    assert prices == sorted(prices, reverse=True)
+    assert all(bid["location"] for bid in report["bids"])
+
+
+def test_quorum_returns_before_the_window_closes(gateway, bpps):
+    urls = bpps((0, 0.0, "ok"), (1, 0.0, "ok"), (2, 3.0, "ok"))
+    report = _broadcast(gateway, urls, window_s=2.0, quorum=2)
+
+    assert len(report["bids"]) == 2
+    assert report["dropped"]["not_needed"] == 1
+    assert report["elapsed_s"] < 1.0
+
+
+def test_late_bids_are_cancelled_at_the_deadline(gateway, bpps):
+    urls = bpps((0, 0.0, "ok"), (1, 3.0, "ok"), (2, 3.0, "ok"))
+    report = _broadcast(gateway, urls, window_s=0.5)
+
+    assert len(report["bids"]) == 1
+    assert report["dropped"]["late"] == 2
+    assert report["elapsed_s"] <= 0.5 + GRACE_S
+
+
+def test_malformed_and_mismatched_responses_are_dropped(gateway, bpps):
+    urls = bpps((0, 0.0, "ok"), (1, 0.0, "malformed"), (2, 0.0, "mismatch"), (0, 0.0, "error"))
+    report = _broadcast(gateway, urls)
+
+    assert [bid["buyer_app"] for bid in report["bids"]] == [f"{BUYERS[0]['buyer_app']} #0"]
+    assert report["dropped"]["malformed"] == 2
+    assert report["dropped"]["failed"] == 1
+    assert gateway.stats()["malformed"] == 2
+
+
+@pytest.mark.parametrize("window_s", [0.3, 0.8])
+def test_elapsed_is_bounded_by_the_window(gateway, bpps, window_s):
+    urls = bpps(*[(i, 0.05 * i, "ok") for i in range(6)], (0, 5.0, "ok"))
+    report = _broadcast(gateway, urls, window_s=window_s)
+
+    assert report["elapsed_s"] <= window_s + GRACE_S
+    assert report["dropped"]["late"] >= 1
+
+
+def test_no_endpoints_returns_an_empty_report(gateway):
+    report = _broadcast(gateway, [])
+    assert report["bids"] == [] and report["endpoints"] == 0
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda p: p["context"].update(transaction_id="other"),
+    lambda p: p["context"].update(action="search"),
+    lambda p: p["message"]["catalog"]["providers"][0]["items"][0]["price"].update(value="999"),
+    lambda p: p["message"]["catalog"]["providers"].clear(),
+])
+def test_parse_on_search_rejects_bad_payloads(mutate):
+    request = build_search_request("Tomato", "Grade A", 1000, 24.0)
+    payload = MockBPPServer(BUYERS[0]).on_search(request)
+    assert parse_on_search(payload, request)["price"] > 0
+    mutate(payload)
+    with pytest.raises(MalformedBid):
+        parse_on_search(payload, request)
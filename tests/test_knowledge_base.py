@@ -0,0 +1,23 @@
+"""Local treatment guides: retrieval confidence decides whether the web is searched."""
+
+import pytest
+
+from utils.knowledge_base import KB_MIN_CONFIDENCE, knowledge_base
+
+
+@pytest.mark.parametrize("crop, disease", [
+    ("Tomato", "Early Blight"),
+    ("Potato", "Early Blight"),
+    ("Wheat", "Yellow Rust"),
+])
+def test_guide_for_the_crop_is_served_locally(crop, disease):
+    assert knowledge_base.lookup_treatment(crop, disease)["confidence"] >= KB_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("crop, disease", [
+    ("Onion", "Early Blight"),
+    ("Onion", "Purple Blotch"),
+    ("Rice", "Yellow Rust"),
+])
+def test_guide_for_another_crop_falls_back_to_the_web(crop, disease):
+    assert knowledge_base.lookup_treatment(crop, disease)["confidence"] < KB_MIN_CONFIDENCE
@@ -0,0 +1,131 @@
+"""ONDC order book: price-time matching, targeted accepts, auto-sell listings and throughput."""
+
+import pytest
+
+from utils import ondc
+from utils.order_book import MatchingEngine, ORDER_BOOK_BENCH_MIN_OPS, benchmark
+
+CROP = {"crop_type": "Tomato", "fci_grade": "Grade A"}
+KEY = ("Tomato", "Grade A", "Nashik")
+
+
+@pytest.fixture
+def engine():
+    return MatchingEngine(invoicer=lambda fill: {"fill_id": fill["fill_id"], "buyer": fill["buyer"],
+                                                 "price_per_kg": fill["price"], "quantity_kg": fill["quantity_kg"]})
+
+
+@pytest.fixture
+def book(monkeypatch, engine):
+    """ondc helpers wired to a private engine instead of the process-wide one."""
+    monkeypatch.setattr(ondc, "matching_engine", engine)
+    return engine
+
+
+def _bids(*quotes):
+    return [{"buyer_app": buyer, "price": price} for buyer, price in quotes]
+
+
+# --- MATCHING ---
+
+def test_listing_fills_best_price_then_earliest_bid(engine):
+    engine.place_bid("Low", *KEY, 300, 24)
+    engine.place_bid("Early", *KEY, 300, 25)
+    engine.place_bid("Late", *KEY, 300, 25)
+
+    fills = engine.place_listing("farmer", *KEY, 500, 24)["fills"]
+
+    assert [(f["buyer"], f["quantity_kg"], f["price"]) for f in fills] == [("Early", 300, 25), ("Late", 200, 25)]
+
+
+def test_listing_never_sells_below_its_reserve(engine):
+    engine.place_bid("Cheap", *KEY, 500, 20)
+    placed = engine.place_listing("farmer", *KEY, 500, 22)
+
+    assert placed["fills"] == []
+    assert placed["order"]["remaining"] == 500
+    assert engine.stats()["live_orders"] == 2
+
+
+def test_expired_bids_do_not_fill(engine):
+    engine.place_bid("Gone", *KEY, 500, 25, ttl_s=10, now=0)
+    assert engine.place_listing("farmer", *KEY, 500, 20, now=11)["fills"] == []
+    assert engine.stats()["expired"] == 1
+
+
+def test_immediate_listing_cancels_its_remainder(engine):
+    engine.place_bid("Small", *KEY, 200, 25)
+    placed = engine.place_listing("farmer", *KEY, 500, 25, immediate=True)
+
+    assert sum(f["quantity_kg"] for f in placed["fills"]) == 200
+    assert placed["order"]["remaining"] == 300
+    assert engine.stats()["live_orders"] == 0
+
+
+def test_take_fills_the_chosen_bid_not_the_best_one(engine):
+    engine.place_bid("FarAway", *KEY, 500, 25)
+    nearby = engine.place_bid("Nearby", *KEY, 500, 24)["order"]["order_id"]
+
+    taken = engine.take(nearby, "farmer", 500)
+
+    assert [(f["buyer"], f["price"]) for f in taken["fills"]] == [("Nearby", 24)]
+    assert len(taken["invoices"]) == 1
+    assert engine.order(nearby) is None
+
+
+def test_take_of_an_expired_bid_fills_nothing(engine):
+    order_id = engine.place_bid("Gone", *KEY, 500, 25, ttl_s=10, now=0)["order"]["order_id"]
+    assert engine.take(order_id, "farmer", 500, now=11) == {"order": None, "fills": [], "invoices": []}
+
+
+# --- ONDC FLOW ---
+
+def test_accept_sells_to_the_clicked_bid(book):
+    bids = ondc.post_bids_to_book(_bids(("FarAway", 25), ("Nearby", 24)), CROP, 500)["bids"]
+    result = ondc.accept_bid(bids[1], CROP, 500, seller="s1")
+
+    assert [inv["buyer"] for inv in result["invoices"]] == ["Nearby"]
+    assert book.order(bids[0]["order_id"]) is not None
+
+
+def test_rebroadcast_replaces_the_previous_bids(book):
+    first = ondc.post_bids_to_book(_bids(("A", 25), ("B", 24)), CROP, 500)["bids"]
+    ondc.post_bids_to_book(_bids(("A", 25), ("B", 24)), CROP, 500, replaces=first)
+
+    assert book.stats()["live_orders"] == 2
+
+
+def test_auto_sell_listing_is_crossed_by_incoming_bids(book):
+    listed = ondc.rest_listing(CROP, 500, 24.5, seller="s1")
+    booked = ondc.post_bids_to_book(_bids(("High", 25), ("Low", 24)), CROP, 300)
+
+    assert [(f["buyer"], f["seller"], f["quantity_kg"], f["price"]) for f in booked["fills"]] == \
+        [("High", "s1", 300, 24.5)]
+    assert len(booked["invoices"]) == 1
+    assert book.order(listed["order"]["order_id"])["remaining"] == 200
+
+
+def test_accept_after_auto_sell_only_sells_the_remainder(book):
+    listing_id = ondc.rest_listing(CROP, 500, 24.5, seller="s1")["order"]["order_id"]
+    bids = ondc.post_bids_to_book(_bids(("High", 25), ("Low", 24)), CROP, 300)["bids"]
+
+    result = ondc.accept_bid(bids[1], CROP, 500, seller="s1", listing_order_id=listing_id)
+
+    assert [(f["buyer"], f["quantity_kg"]) for f in result["fills"]] == [("Low", 200)]
+    assert book.order(listing_id) is None
+
+
+def test_accept_after_auto_sell_sold_everything_sells_nothing(book):
+    listing_id = ondc.rest_listing(CROP, 300, 24, seller="s1")["order"]["order_id"]
+    bids = ondc.post_bids_to_book(_bids(("High", 25), ("Other", 24.5)), CROP, 300)["bids"]
+
+    result = ondc.accept_bid(bids[1], CROP, 300, seller="s1", listing_order_id=listing_id)
+    assert result["fills"] == []
+
+
+# --- THROUGHPUT ---
+
+def test_matching_throughput_with_invoicing():
+    report = benchmark(100000)   # Long enough for the 60 s (simulated) bid expiries to kick in
+    assert report["fills"] > 0 and report["expired"] > 0
+    assert report["orders_per_s"] >= ORDER_BOOK_BENCH_MIN_OPS, report
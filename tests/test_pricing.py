@@ -0,0 +1,37 @@
+"""Deterministic pricing: grade premiums and bid quotes."""
+
+import pytest
+
+from utils.pricing import GRADE_PREMIUM, _grade_key, fair_price, quote_bids
+from utils.vision import GRADE_SEVERITY, PENDING_GRADE
+
+
+@pytest.mark.parametrize("grade, key", [
+    ("Grade A", "grade a"),
+    ("Grade A (size > 50mm)", "grade a"),
+    ("Grade B", "grade b"),
+    ("Reject", "reject"),
+    ("rejected", "reject"),
+])
+def test_assay_grade_strings_map_to_their_premium(grade, key):
+    assert _grade_key(grade) == key
+
+
+def test_every_assay_grade_has_its_own_premium():
+    premiums = {grade: GRADE_PREMIUM[_grade_key(grade)] for grade in GRADE_SEVERITY}
+    assert len(set(premiums.values())) == len(premiums), premiums
+
+
+def test_reject_is_priced_below_grade_b():
+    assert fair_price(20, "Reject")["fair_price"] < fair_price(20, "Grade B")["fair_price"]
+
+
+def test_pending_assay_never_earns_the_grade_a_premium():
+    assert fair_price(20, PENDING_GRADE)["fair_price"] < fair_price(20, "Grade A")["fair_price"]
+
+
+def test_quotes_are_deterministic_and_sorted():
+    entry = {"current_price": 24.0, "trend": "stable", "demand": "high", "supply": "moderate"}
+    bids = quote_bids(entry, "Grade A", 1000)
+    assert bids == quote_bids(entry, "Grade A", 1000)
+    assert [bid["price"] for bid in bids] == sorted((bid["price"] for bid in bids), reverse=True)
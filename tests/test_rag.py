@@ -0,0 +1,39 @@
+"""Research agent: deadlines and which reports may be stored."""
+
+import time
+
+import pytest
+
+from utils import rag
+
+
+@pytest.fixture
+def slow_sources(monkeypatch):
+    """Web search and price lookup that both outlive a 0.3 s research deadline."""
+    def slow(*args, **kwargs):
+        time.sleep(1.0)
+        return "₹20/kg"
+    monkeypatch.setattr(rag, "SEARCH_TIMEOUT_S", 0.3)
+    monkeypatch.setattr(rag.search_service, "search", slow)
+    monkeypatch.setattr(rag.market_intel, "describe", slow)
+
+
+def _state(crop="Onion", disease="Purple Blotch"):
+    return rag.AgentChain._initial_state(crop, disease, "Nashik", f"{disease} {crop} treatment")
+
+
+def test_research_step_is_bounded_by_one_deadline(slow_sources):
+    started = time.perf_counter()
+    result = rag.researcher_node(_state())
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.3 + 0.25   # Not 2x the deadline (search wait, then market wait)
+    assert result["research_ok"] is False
+    assert "timed out" in result["search_results"]
+    assert rag.MARKET_UNAVAILABLE in result["search_results"]
+
+
+def test_research_with_every_source_answering_is_ok(monkeypatch):
+    monkeypatch.setattr(rag.search_service, "search", lambda query, category="general": "Spray mancozeb 0.25%.")
+    monkeypatch.setattr(rag.market_intel, "describe", lambda crop, market=None: "Onion @ Nashik ₹22/kg")
+    assert rag.researcher_node(_state())["research_ok"] is True
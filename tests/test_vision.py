@@ -0,0 +1,147 @@
+"""Vision engine against MockGroqServer: caching, near-duplicates, streaming and audits."""
+
+import io
+import json
+
+from PIL import Image
+
+from utils.mock_servers import MOCK_ASSAY
+from tests.conftest import groq_client
+
+
+def _recompressed(path, tmp_path):
+    """The same photo after a crop-and-resize plus JPEG recompression (WhatsApp-style)."""
+    image = Image.open(path)
+    width, height = image.size
+    image = image.crop((4, 4, width - 4, height - 4)).resize((width // 2, height // 2))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=70)
+    out = tmp_path / "recompressed.jpg"
+    out.write_bytes(buffer.getvalue())
+    return str(out)
+
+
+def _claims_reply(verified):
+    return lambda request: json.dumps({
+        key: {"verified": verified, "confidence": 80, "evidence": "mock"} for key in ("tillage", "irrigation")
+    })
+
+
+AUDIT_INPUTS = {"tillage": "No-Till", "irrigation": "Drip"}
+
+
+# --- ASSAY ---
+
+def test_assay_is_served_from_cache_on_reupload(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server()
+    client, photo = groq_client(server), image_path(1)
+
+    first = vision.analyze_crop_disease(photo, client=client)
+    second = vision.analyze_crop_disease(photo, client=client)
+
+    assert first["fci_grade"] == MOCK_ASSAY["fci_grade"]
+    assert second == first
+    assert server.request_count == 1
+
+
+def test_near_duplicate_photo_skips_the_model(fresh_vision_state, groq_server, image_path, tmp_path):
+    vision, server = fresh_vision_state, groq_server()
+    client, photo = groq_client(server), image_path(2)
+
+    vision.analyze_crop_disease(photo, client=client)
+    duplicate = vision.analyze_crop_disease(_recompressed(photo, tmp_path), client=client)
+
+    assert duplicate.get("near_duplicate_of") is not None
+    assert duplicate["disease_name"] == MOCK_ASSAY["disease_name"]
+    assert server.request_count == 1
+
+
+def test_different_photos_each_reach_the_model(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server()
+    client = groq_client(server)
+
+    vision.analyze_crop_disease(image_path(3), client=client)
+    vision.analyze_crop_disease(image_path(4), client=client)
+
+    assert server.request_count == 2
+
+
+def test_stream_yields_fields_before_the_result(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(chunk_size=4)
+    events = list(vision.stream_crop_analysis(image_path(5), client=groq_client(server)))
+
+    fields = [event for event in events if event[0] == "field"]
+    assert events[-1][0] == "result"
+    assert [event[0] for event in events].count("result") == 1
+    assert {key for _, key, _ in fields} >= {"crop_type", "disease_name", "fci_grade"}
+    assert events[-1][1]["fci_grade"] == MOCK_ASSAY["fci_grade"]
+
+
+def test_streamed_assay_is_cached_for_the_blocking_path(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server()
+    client, photo = groq_client(server), image_path(6)
+
+    streamed = list(vision.stream_crop_analysis(photo, client=client))[-1][1]
+    assert vision.analyze_crop_disease(photo, client=client) == streamed
+    assert server.request_count == 1
+
+
+def test_api_error_returns_the_fallback_assay(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(reply=lambda request: "not json at all")
+    result = vision.analyze_crop_disease(image_path(7), client=groq_client(server))
+
+    assert result["fci_grade"] == "N/A"
+    assert result["confidence"] == "Zero"
+
+
+# --- AUDITS ---
+
+def test_claims_audit_parses_verdicts_and_caches(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(reply=_claims_reply(True))
+    client, photo = groq_client(server), image_path(10)
+
+    first = vision.verify_sustainable_claims(photo, AUDIT_INPUTS, client=client, parcel_id="A")
+    again = vision.verify_sustainable_claims(photo, AUDIT_INPUTS, client=client, parcel_id="A")
+
+    assert all(entry["verified"] is True for entry in first.values())
+    assert again == first
+    assert server.request_count == 1
+
+
+def test_claims_audit_treats_false_strings_as_unverified(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(reply=_claims_reply("false"))
+    result = vision.verify_sustainable_claims(image_path(11), AUDIT_INPUTS, client=groq_client(server))
+
+    assert all(entry["verified"] is False for entry in result.values())
+
+
+def test_claims_audit_rejects_photo_reused_for_another_parcel(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(reply=_claims_reply(True))
+    client, photo = groq_client(server), image_path(12)
+
+    vision.verify_sustainable_claims(photo, AUDIT_INPUTS, client=client, parcel_id="A")
+    reused = vision.verify_sustainable_claims(photo, AUDIT_INPUTS, client=client, parcel_id="B")
+
+    assert all(entry["verified"] is False and "duplicate_of" in entry for entry in reused.values())
+    assert server.request_count == 1
+
+
+def test_single_claim_audit_rejects_photo_reused_for_another_parcel(fresh_vision_state, groq_server, image_path):
+    reply = lambda request: json.dumps({"verified": True, "confidence": 90, "evidence": "mock"})
+    vision, server = fresh_vision_state, groq_server(reply=reply)
+    client, photo = groq_client(server), image_path(13)
+
+    first = vision.verify_sustainable_practice(photo, "No-Till", client=client, parcel_id="A")
+    reused = vision.verify_sustainable_practice(photo, "No-Till", client=client, parcel_id="B")
+
+    assert first["verified"] is True
+    assert reused["verified"] is False and "duplicate_of" in reused
+    assert server.request_count == 1
+
+
+def test_single_claim_audit_is_unverified_on_api_error(fresh_vision_state, groq_server, image_path):
+    vision, server = fresh_vision_state, groq_server(reply=lambda request: "not json at all")
+    result = vision.verify_sustainable_practice(image_path(14), "Drip Irrigation", client=groq_client(server))
+
+    assert result["verified"] is False
+    assert "unavailable" in result["reason"].lower()
@@ -0,0 +1,197 @@
+"""
+advisory_store.py
+SUPPORT MODULE: Precomputed Advisory Warehouse
+Responsibility: Field Reports keyed by (crop, disease, district, day). The report for
+"Tomato / Early Blight / Nashik" today is the same for every farmer in the district, so it is
+generated once (on demand or by the batch job) and then served from disk.
+
+Batch job:
+    python -m utils.advisory_store              # fill today's disease x district matrix once
+    python -m utils.advisory_store --schedule   # keep running, refill every day at ADVISORY_PRECOMPUTE_HOUR
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.cache import ResultCache, content_key
+
+# Reports stay valid for their day bucket; the TTL only bounds how long stale days linger on disk
+ADVISORY_TTL_S = int(os.getenv("ADVISORY_TTL_S", 36 * 3600))
+ADVISORY_PRECOMPUTE_HOUR = int(os.getenv("ADVISORY_PRECOMPUTE_HOUR", 4))  # Local time, before mandis open
+ADVISORY_WORKERS = int(os.getenv("ADVISORY_WORKERS", 4))
+
+# Diseases the vision engine reports most often. Combinations without a local guide in
+# data/treatment_docs (e.g. Onion / Purple Blotch) are researched on the web at precompute time.
+ADVISORY_MATRIX = [
+    ("Tomato", "Early Blight"),
+    ("Tomato", "Late Blight"),
+    ("Potato", "Late Blight"),
+    ("Wheat", "Yellow Rust"),
+    ("Wheat", "Brown Rust"),
+    ("Grape", "Powdery Mildew"),
+    ("Onion", "Purple Blotch"),
+]
+
+# Districts served by the pilot (comma-separated override via env)
+DISTRICTS = [d.strip() for d in os.getenv(
+    "ADVISORY_DISTRICTS", "Nashik,Pune,Ahmednagar,Satara,Solapur,Jalgaon,Kolhapur,Nagpur"
+).split(",") if d.strip()]
+
+
+def date_bucket(when=None):
+    """Day bucket (local date, ISO format) an advisory belongs to."""
+    return (when or datetime.now()).strftime("%Y-%m-%d")
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+class AdvisoryStore:
+    """
+    Disk-backed warehouse of generated advisories.
+    Entries: {"crop", "disease", "location", "date", "advisory", "generated_at", "source"}.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or ResultCache("advisories", ttl_seconds=ADVISORY_TTL_S)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(crop, disease, location, day=None):
+        return content_key("advisory", _normalize(crop), _normalize(disease), _normalize(location), day or date_bucket())
+
+    def get(self, crop, disease, location, day=None):
+        """Returns the stored entry for today's bucket (or `day`), or None."""
+        entry = self.cache.get(self.key(crop, disease, location, day))
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def put(self, crop, disease, location, advisory, source="on_demand", day=None):
+        entry = {
+            "crop": crop,
+            "disease": disease,
+            "location": location,
+            "date": day or date_bucket(),
+            "advisory": advisory,
+            "generated_at": time.time(),
+            "source": source,
+        }
+        self.cache.put(self.key(crop, disease, location, day), entry)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+
+advisory_store = AdvisoryStore()
+
+
+def precompute_advisories(generate, matrix=None, districts=None, max_workers=ADVISORY_WORKERS,
+                          store=None, force=False):
+    """
+    Fills today's bucket for every (crop, disease) x district combination.
+    - generate: callable(crop, disease, location) -> advisory markdown (the uncached pipeline)
+    - Combinations already in the store are skipped unless force=True.
+
+    Returns:
+        dict: {"computed", "skipped", "failed", "seconds"}
+    """
+    store = store or advisory_store
+    day = date_bucket()
+    jobs = [(crop, disease, district)
+            for crop, disease in (matrix or ADVISORY_MATRIX)
+            for district in (districts or DISTRICTS)]
+
+    summary = {"computed": 0, "skipped": 0, "failed": 0}
+    pending = []
+    for job in jobs:
+        if not force and store.cache.get(store.key(*job, day=day)):
+            summary["skipped"] += 1
+        else:
+            pending.append(job)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="advisory") as pool:
+        futures = {pool.submit(generate, *job): job for job in pending}
+        for future in as_completed(futures):
+            crop, disease, district = futures[future]
+            try:
+                store.put(crop, disease, district, future.result(), source="precompute", day=day)
+                summary["computed"] += 1
+            except Exception as e:
+                logging.warning(f"Advisory precompute failed for {crop}/{disease}/{district}: {e}")
+                summary["failed"] += 1
+
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    logging.info(f"Advisory precompute for {day}: {summary}")
+    return summary
+
+
+class AdvisoryScheduler:
+    """
+    Runs precompute_advisories once on start, then daily at `hour` (local time), in a daemon thread.
+    """
+
+    def __init__(self, generate, hour=ADVISORY_PRECOMPUTE_HOUR, **precompute_kwargs):
+        self.generate = generate
+        self.hour = hour
+        self.precompute_kwargs = precompute_kwargs
+        self.last_summary = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def seconds_until_next_run(self, now=None):
+        now = now or datetime.now()
+        next_run = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.last_summary = precompute_advisories(self.generate, **self.precompute_kwargs)
+            except Exception as e:
+                logging.error(f"Advisory precompute run failed: {e}")
+            self._stop.wait(self.seconds_until_next_run())
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="advisory-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from utils.rag import agent_chain
+
+    if "--schedule" in sys.argv:
+        scheduler = AdvisoryScheduler(agent_chain.run_pipeline).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        print(precompute_advisories(agent_chain.run_pipeline, force="--force" in sys.argv))
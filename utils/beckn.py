@@ -0,0 +1,278 @@
+"""
+beckn.py
+SUPPORT MODULE: Beckn Broadcast Engine
+Responsibility: Sends a produce listing to every configured ONDC buyer app (BPP) at once and
+collects their on_search bids inside a fixed window, so broadcast latency is bounded by the
+window and not by the slowest buyer.
+
+- One asyncio event loop (background thread) and one pooled aiohttp session shared by all broadcasts.
+- Collection stops at the deadline or as soon as `quorum` valid bids are in; stragglers are cancelled.
+- Late, failed and malformed responses (wrong transaction, missing / implausible price) are dropped
+  and counted; the remaining bids are ranked best price first.
+
+BPP endpoints come from ONDC_BPP_URLS (comma-separated base URLs; the engine POSTs to <url>/search).
+Responses are read synchronously from the /search call instead of a separate /on_search callback.
+"""
+
+import os
+import math
+import uuid
+import atexit
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+
+ONDC_BPP_URLS = [u.strip() for u in os.getenv("ONDC_BPP_URLS", "").split(",") if u.strip()]
+ONDC_BID_WINDOW_S = float(os.getenv("ONDC_BID_WINDOW_S", 2.0))
+ONDC_BID_QUORUM = int(os.getenv("ONDC_BID_QUORUM", 0))       # 0 = wait for every BPP (or the deadline)
+ONDC_BAP_ID = os.getenv("ONDC_BAP_ID", "veriyield.bap")
+ONDC_DOMAIN = "ONDC:AGR10"
+MAX_CONNECTIONS = 100
+PLAUSIBLE_BAND = (0.3, 3.0)   # Bids outside 0.3x-3x of the asking price are treated as malformed
+
+
+class MalformedBid(ValueError):
+    """Raised when an on_search response cannot be turned into a bid."""
+
+
+def build_search_request(crop, grade, quantity_kg, ask_price, location="Nashik", ttl_s=ONDC_BID_WINDOW_S):
+    """Beckn-style search payload for one produce lot."""
+    return {
+        "context": {
+            "domain": ONDC_DOMAIN,
+            "action": "search",
+            "version": "1.2.0",
+            "bap_id": ONDC_BAP_ID,
+            "transaction_id": str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "ttl": f"PT{max(1, math.ceil(ttl_s))}S",
+        },
+        "message": {
+            "intent": {
+                "item": {
+                    "descriptor": {"name": crop},
+                    "quantity": {"count": quantity_kg, "unit": "kilogram"},
+                    "price": {"currency": "INR", "value": f"{ask_price:.2f}"},
+                    "tags": {"grade": grade},
+                },
+                "fulfillment": {"start": {"location": {"city": location}}},
+            }
+        },
+    }
+
+
+def parse_on_search(payload, request, response_ms=None):
+    """
+    Validates one on_search response against the request and flattens it into a bid.
+
+    Returns:
+        dict: {buyer_app, logo, price, distance, distance_km, location, rating, bpp_id, response_ms}
+    """
+    try:
+        context = payload["context"]
+        if context.get("action") != "on_search":
+            raise MalformedBid(f"unexpected action {context.get('action')!r}")
+        if context.get("transaction_id") != request["context"]["transaction_id"]:
+            raise MalformedBid("transaction_id mismatch")
+        provider = payload["message"]["catalog"]["providers"][0]
+        item = provider["items"][0]
+        price = float(item["price"]["value"])
+        name = provider["descriptor"]["name"]
+        fulfillment = (provider.get("fulfillments") or [{}])[0]
+    except MalformedBid:
+        raise
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise MalformedBid(f"missing or invalid field: {e}") from None
+
+    ask = float(request["message"]["intent"]["item"]["price"]["value"])
+    if not math.isfinite(price) or not (ask * PLAUSIBLE_BAND[0] <= price <= ask * PLAUSIBLE_BAND[1]):
+        raise MalformedBid(f"implausible price {price}")
+
+    pickup = str(fulfillment.get("type", "")).lower() in ("pickup", "self-pickup")
+    distance_km = fulfillment.get("distance_km")
+    try:  # Beckn gps: "lat,lon" of the delivery point
+        gps = fulfillment.get("end", {}).get("location", {}).get("gps")
+        location = tuple(float(x) for x in gps.split(",")) if gps else None
+    except (AttributeError, ValueError):
+        location = None
+    return {
+        "buyer_app": name,
+        "logo": provider["descriptor"].get("symbol", "🛒"),
+        "price": round(price, 2),
+        "distance": "Pickup" if pickup else (f"{distance_km} km" if distance_km is not None else "—"),
+        "distance_km": distance_km,
+        "location": location if location and len(location) == 2 else None,
+        "rating": str(provider.get("rating", "—")),
+        "bpp_id": context.get("bpp_id", name),
+        "response_ms": response_ms,
+    }
+
+
+def rank_bids(bids):
+    """Best price first; faster responders win ties. One bid per BPP (its best)."""
+    best = {}
+    for bid in bids:
+        current = best.get(bid["bpp_id"])
+        if current is None or bid["price"] > current["price"]:
+            best[bid["bpp_id"]] = bid
+    return sorted(best.values(), key=lambda bid: (-bid["price"], bid["response_ms"] or 0))
+
+
+class BecknGateway:
+    """
+    Thread-safe broadcaster. broadcast() blocks the caller for at most `window_s` (plus a small
+    grace period); the HTTP work runs on the gateway's own loop.
+    """
+
+    def __init__(self, endpoints=None, window_s=ONDC_BID_WINDOW_S, quorum=ONDC_BID_QUORUM):
+        self.endpoints = list(ONDC_BPP_URLS if endpoints is None else endpoints)
+        self.window_s = window_s
+        self.quorum = quorum
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._metrics = {"broadcasts": 0, "bids": 0, "late": 0, "malformed": 0, "failed": 0}
+
+    # --- EVENT LOOP ---
+
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="beckn-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _get_session(self):
+        """Pooled keep-alive session, created on the gateway loop on first use."""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    # --- BROADCAST ---
+
+    async def _post(self, endpoint, payload, deadline):
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # Backstop only: the collector cancels stragglers at the deadline
+        timeout = aiohttp.ClientTimeout(total=max(0.01, deadline - start) + 1)
+        async with self._get_session().post(endpoint.rstrip("/") + "/search", json=payload,
+                                            timeout=timeout) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            body = await response.json(content_type=None)
+        return body, round((loop.time() - start) * 1000)
+
+    async def _collect(self, request, endpoints, window_s, quorum):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + window_s
+        tasks = {asyncio.ensure_future(self._post(url, request, deadline)): url for url in endpoints}
+        pending = set(tasks)
+        bids = []
+        dropped = {"late": 0, "malformed": 0, "failed": 0, "not_needed": 0}
+
+        while pending and not (quorum and len(bids) >= quorum):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    body, response_ms = task.result()
+                    bids.append(parse_on_search(body, request, response_ms))
+                except MalformedBid as e:
+                    dropped["malformed"] += 1
+                    logging.info(f"Dropped bid from {tasks[task]}: {e}")
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    dropped["late"] += 1
+                except Exception as e:
+                    dropped["failed"] += 1
+                    logging.info(f"BPP {tasks[task]} failed: {e}")
+
+        reason = "not_needed" if quorum and len(bids) >= quorum else "late"
+        for task in pending:
+            task.cancel()
+            dropped[reason] += 1
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        return {
+            "bids": rank_bids(bids),
+            "dropped": dropped,
+            "endpoints": len(endpoints),
+            "elapsed_s": round(loop.time() - start, 3),
+            "transaction_id": request["context"]["transaction_id"],
+        }
+
+    def broadcast(self, crop, grade, quantity_kg, ask_price, location="Nashik", endpoints=None,
+                  window_s=None, quorum=None):
+        """
+        Broadcasts one lot and waits for the bid window to close.
+
+        Returns:
+            dict: {"bids" (ranked), "dropped": {late, malformed, failed, not_needed},
+                   "endpoints", "elapsed_s", "transaction_id"}
+        """
+        endpoints = self.endpoints if endpoints is None else endpoints
+        window_s = self.window_s if window_s is None else window_s
+        quorum = self.quorum if quorum is None else quorum
+        request = build_search_request(crop, grade, quantity_kg, ask_price, location, window_s)
+        if not endpoints:
+            return {"bids": [], "dropped": {}, "endpoints": 0, "elapsed_s": 0.0,
+                    "transaction_id": request["context"]["transaction_id"]}
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._collect(request, endpoints, window_s, quorum), self._ensure_loop())
+        report = future.result(timeout=window_s + 5)
+
+        with self._lock:
+            self._metrics["broadcasts"] += 1
+            self._metrics["bids"] += len(report["bids"])
+            for reason in ("late", "malformed", "failed"):
+                self._metrics[reason] += report["dropped"][reason]
+        return report
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, endpoints=len(self.endpoints))
+
+    def close(self):
+        """Closes the pooled HTTP session (the loop thread is a daemon and needs no cleanup)."""
+        if self._loop is not None and self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+            self._session = None
+
+
+# Singleton used by ondc.py
+beckn_gateway = BecknGateway()
+atexit.register(beckn_gateway.close)
+
+
+if __name__ == "__main__":
+    # Local demo: 3 healthy buyer apps, one that answers after the window, one that sends garbage
+    from utils.mock_servers import MockBPPServer
+    from utils.pricing import BUYERS
+
+    servers = [MockBPPServer(buyer, latency=0.05 * i) for i, buyer in enumerate(BUYERS)]
+    servers.append(MockBPPServer(dict(BUYERS[0], buyer_app="Slow Mandi"), latency=5.0))
+    servers.append(MockBPPServer(dict(BUYERS[1], buyer_app="Broken App"), mode="malformed"))
+    for server in servers:
+        server.start()
+    try:
+        gateway = BecknGateway([s.url for s in servers], window_s=1.0)
+        report = gateway.broadcast("Tomato", "Grade A", 1000, 24.0)
+        for bid in report["bids"]:
+            print(f"{bid['logo']} {bid['buyer_app']:<22} ₹{bid['price']}/kg  ({bid['response_ms']} ms)")
+        print(f"Dropped: {report['dropped']} | elapsed {report['elapsed_s']}s for {report['endpoints']} BPPs")
+        gateway.close()
+    finally:
+        for server in servers:
+            server.stop()
@@ -8,8 +8,8 @@ import json
 import hashlib
 import time
 from datetime import datetime
-from web3 import Web3
 from dotenv import load_dotenv
+from utils.registry import registry, lazy
 
 # Load environment variables
 load_dotenv()
@@ -37,6 +37,7 @@ class BlockchainManager:
         self.contract_address = os.getenv("CONTRACT_ADDRESS")
         
         try:
+            from web3 import Web3
             self.w3 = Web3(Web3.HTTPProvider(self.rpc_url))
             self.is_connected = self.w3.is_connected()
             if self.is_connected:
@@ -112,5 +113,6 @@ class BlockchainManager:
             "explorer_link": "#"
         }
 
-# Initialize global instance
-blockchain_manager = BlockchainManager()
\ No newline at end of file
+# Global instance: the Web3 connection is opened on first use, not at import
+registry.register("blockchain.manager", BlockchainManager)
+blockchain_manager = lazy("blockchain.manager")
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+broker_service.py
+SUPPORT MODULE: Concurrent Broker Service
+Responsibility: Runs many Raju Bhai negotiations at once without one busy farmer (or a saturated
+Groq account) stalling everybody else.
+
+- Per-session state: each Streamlit session gets its own NegotiationMemory, evicted when idle.
+- One asyncio event loop (background thread) drives graph invocations via ainvoke.
+- Global concurrency limit with fair queuing: each session has its own FIFO, sessions are served
+  round-robin, and a session never has more than one turn in flight.
+- Backpressure: the queue is bounded (BrokerBusy when full or when a turn waits too long), and the
+  concurrency limit shrinks on Groq rate-limit errors and grows back on success (AIMD).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.negotiation_memory import NegotiationMemory
+
+BROKER_MAX_CONCURRENCY = int(os.getenv("BROKER_MAX_CONCURRENCY", 16))
+BROKER_MAX_QUEUE = int(os.getenv("BROKER_MAX_QUEUE", 500))
+BROKER_QUEUE_TIMEOUT_S = float(os.getenv("BROKER_QUEUE_TIMEOUT_S", 30))
+BROKER_SESSION_TTL_S = int(os.getenv("BROKER_SESSION_TTL_S", 3600))
+RATE_LIMIT_BACKOFF_S = 2.0
+MAX_ATTEMPTS = 2
+
+
+class BrokerBusy(Exception):
+    """Raised when the service sheds load (queue full, waited too long, or Groq saturated)."""
+
+
+def _is_rate_limited(exc):
+    return getattr(exc, "status_code", None) == 429 or "RateLimit" in type(exc).__name__
+
+
+class BrokerSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.memory = NegotiationMemory()
+        self.last_seen = time.time()
+
+
+class _Job:
+    __slots__ = ("session", "args", "future", "enqueued_at", "attempts")
+
+    def __init__(self, session, args):
+        self.session = session
+        self.args = args
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class BrokerService:
+    """
+    Thread-safe front door for app.py. chat() blocks the caller only while its own turn is
+    queued / running; submit() returns a concurrent.futures.Future.
+    """
+
+    def __init__(self, broker=None, max_concurrency=BROKER_MAX_CONCURRENCY, max_queue=BROKER_MAX_QUEUE,
+                 queue_timeout=BROKER_QUEUE_TIMEOUT_S, session_ttl=BROKER_SESSION_TTL_S):
+        self._broker = broker
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.session_ttl = session_ttl
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._queued = 0
+        self._metrics = {"completed": 0, "failed": 0, "rejected": 0, "timed_out": 0, "rate_limited": 0}
+
+        # Event-loop state (only touched from the loop thread)
+        self._loop = None
+        self._queues = {}          # session_id -> deque[_Job]
+        self._ready = deque()      # session_ids with queued work, round-robin order
+        self._busy = set()         # session_ids with a turn in flight
+        self._active = 0
+        self._capacity = float(max_concurrency)  # AIMD-controlled; the effective limit is int(capacity)
+        self._last_cut = 0.0
+
+    # --- SESSIONS ---
+
+    def session(self, session_id):
+        """Returns (creating if needed) the isolated state for a session; evicts idle ones."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = BrokerSession(session_id)
+                for sid in [s for s, v in self._sessions.items() if now - v.last_seen > self.session_ttl]:
+                    del self._sessions[sid]
+            session.last_seen = now
+            return session
+
+    def reset_session(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    # --- EVENT LOOP ---
+
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                # Sync graph nodes run here; sized so the executor never becomes the hidden limit
+                loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_concurrency + 4,
+                                                             thread_name_prefix="broker"))
+                threading.Thread(target=loop.run_forever, name="broker-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _get_broker(self):
+        if self._broker is None:
+            from utils.market_agent import broker_agent
+            self._broker = broker_agent
+        return self._broker
+
+    # --- PUBLIC API ---
+
+    def submit(self, session_id, chat_history, crop_data, user_input):
+        """Queues one negotiation turn. Raises BrokerBusy immediately if the queue is full."""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._metrics["rejected"] += 1
+                raise BrokerBusy("Broker queue is full")
+            self._queued += 1
+        job = _Job(self.session(session_id), (list(chat_history), dict(crop_data or {}), user_input))
+        self._ensure_loop().call_soon_threadsafe(self._enqueue, job)
+        return job.future
+
+    def chat(self, session_id, chat_history, crop_data, user_input, timeout=None):
+        """Blocking helper for Streamlit: returns the broker's reply or raises BrokerBusy."""
+        future = self.submit(session_id, chat_history, crop_data, user_input)
+        return future.result(timeout=timeout or self.queue_timeout + 60)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, sessions=len(self._sessions), queued=self._queued,
+                        active=self._active, limit=self._limit)
+
+    @property
+    def _limit(self):
+        return max(1, int(self._capacity))
+
+    # --- SCHEDULER (loop thread) ---
+
+    def _enqueue(self, job, front=False):
+        sid = job.session.session_id
+        queue = self._queues.setdefault(sid, deque())
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+        if sid not in self._busy and sid not in self._ready:
+            self._ready.append(sid)
+        self._pump()
+
+    def _pump(self):
+        while self._active < self._limit and self._ready:
+            sid = self._ready.popleft()
+            queue = self._queues.get(sid)
+            if not queue:
+                continue
+            job = queue.popleft()
+            if time.monotonic() - job.enqueued_at > self.queue_timeout:
+                self._finish(job, error=BrokerBusy("Waited too long for a free broker"), metric="timed_out")
+                if queue:
+                    self._ready.append(sid)
+                continue
+            self._busy.add(sid)
+            self._active += 1
+            self._loop.create_task(self._run(job))
+
+    async def _run(self, job):
+        sid = job.session.session_id
+        job.attempts += 1
+        requeue = False
+        try:
+            chat_history, crop_data, user_input = job.args
+            reply = await self._get_broker().achat_with_broker(chat_history, crop_data, user_input,
+                                                               memory=job.session.memory)
+            # Additive increase: roughly +1 slot per window of successful calls
+            self._capacity = min(float(self.max_concurrency), self._capacity + 1.0 / self._capacity)
+            self._finish(job, result=reply, metric="completed")
+        except Exception as e:
+            if _is_rate_limited(e):
+                with self._lock:
+                    self._metrics["rate_limited"] += 1
+                # Multiplicative decrease, at most once per backoff window (a burst of 429s is one signal)
+                now = time.monotonic()
+                if now - self._last_cut > RATE_LIMIT_BACKOFF_S:
+                    self._capacity = max(1.0, self._capacity / 2)
+                    self._last_cut = now
+                    logging.warning(f"Groq rate limited; broker concurrency now {self._limit}.")
+                if job.attempts < MAX_ATTEMPTS:
+                    requeue = True
+                else:
+                    self._finish(job, error=BrokerBusy("Groq is saturated, try again shortly"), metric="rejected")
+            else:
+                self._finish(job, error=e, metric="failed")
+        finally:
+            self._active -= 1
+            if requeue:
+                # The session stays busy during the backoff so its later turns cannot overtake this one
+                self._loop.call_later(RATE_LIMIT_BACKOFF_S, self._retry, job)
+            else:
+                self._release(sid)
+            self._pump()
+
+    def _retry(self, job):
+        job.enqueued_at = time.monotonic()  # Already admitted once: the queue timeout restarts after the backoff
+        self._busy.discard(job.session.session_id)
+        self._enqueue(job, front=True)
+
+    def _release(self, sid):
+        self._busy.discard(sid)
+        if self._queues.get(sid):
+            self._ready.append(sid)  # Back of the line: round-robin across sessions
+        else:
+            self._queues.pop(sid, None)
+
+    def _finish(self, job, result=None, error=None, metric="completed"):
+        with self._lock:
+            self._queued -= 1
+            self._metrics[metric] += 1
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+
+# Singleton used by app.py
+broker_service = BrokerService()
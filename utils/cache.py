@@ -0,0 +1,123 @@
+"""
+cache.py
+SUPPORT MODULE: Persistent Result Cache
+Responsibility: Content-addressed on-disk cache for expensive model calls (vision assays, audits).
+Entries expire after a TTL and the store is trimmed back to a size budget in LRU order.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+CACHE_DIR = os.getenv("VERIYIELD_CACHE_DIR", ".veriyield_cache")
+
+
+def content_key(*parts):
+    """
+    Builds a SHA-256 key from raw bytes / strings.
+    Each part is length-prefixed so ('ab', 'c') and ('a', 'bc') never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    One JSON file per entry, named after its content key.
+    - TTL: measured from when the entry was written.
+    - LRU: file mtime is bumped on every hit; eviction drops the oldest mtimes first.
+    """
+
+    def __init__(self, namespace, ttl_seconds=7 * 24 * 3600, max_entries=2000, max_bytes=50 * 1024 * 1024):
+        self.directory = os.path.join(CACHE_DIR, namespace)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss / expired entry."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path, None)  # Mark as recently used
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def put(self, key, value):
+        """Writes an entry atomically, then enforces the size budget."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "value": value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Cache write failed ({e}).")
+            return
+        self._evict()
+
+    def clear(self):
+        with self._lock:
+            for name in self._entry_names():
+                self._remove(os.path.join(self.directory, name))
+
+    def _entry_names(self):
+        try:
+            return [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return []
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for name in self._entry_names():
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+            if len(entries) <= self.max_entries and total_bytes <= self.max_bytes:
+                return
+
+            entries.sort()  # Least recently used first
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total_bytes -= size
+            logging.info(f"Cache '{os.path.basename(self.directory)}' trimmed to {len(entries)} entries.")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,10 +1,20 @@
 import random
 import time
 
-def calculate_green_score(inputs):
+# Bonus for each practice the AI auditor confirms from photos (sums to the old flat +20)
+VERIFICATION_BONUS = {
+    "tillage": ("No-Till", 7),
+    "irrigation": ("Drip", 5),
+    "fertilizer": ("Organic", 5),
+    "cover_crop": (True, 3),
+}
+
+def calculate_green_score(inputs, verification=None):
     """
     Calculates Regenerative Score based on Cool Farm Tool principles.
     Base Score: 100
+    verification: optional per-claim verdicts from verify_sustainable_claims();
+    each verified sustainable practice earns its VERIFICATION_BONUS.
     """
     score = 100
     details = []
@@ -26,9 +36,20 @@ def calculate_green_score(inputs):
         score += 10
         details.append("✅ +10: Cover Cropping")
 
+    # AI Visual Proof: per-claim bonuses (only for sustainable practices the photos confirm)
+    verified_claims = []
+    for claim, (sustainable_value, bonus) in VERIFICATION_BONUS.items():
+        verdict = (verification or {}).get(claim) or {}
+        claimed = bool(inputs.get(claim)) if sustainable_value is True else inputs.get(claim) == sustainable_value
+        if claimed and verdict.get("verified"):
+            score += bonus
+            verified_claims.append(claim)
+            details.append(f"🌟 +{bonus}: AI-Verified {verdict.get('claimed', claim)}")
+
     return {
         "total_score": score,
         "breakdown": details,
+        "verified_claims": verified_claims,
         "eligible_tokens": int(score * 0.5) # Example: 150 score = 75 AgriTokens
     }
 
@@ -0,0 +1,454 @@
+"""
+catalog.py
+SUPPORT MODULE: Faceted Catalog Index
+Responsibility: Buyer-side search over every active produce listing (assay result + Tab 2
+passport + Tab 5 green score), filtered by crop / grade / district and quantity / price / green
+score ranges, sorted and paginated in milliseconds at a million listings.
+
+- Facets: an inverted posting list of doc ids per value, plus a code column for cheap re-checks.
+- Numbers: one NumPy column per field, with a sorted copy (values + doc ids) for range lookups.
+  New listings land in an unsorted tail that is scanned directly until it is merged in.
+- Updates are incremental: add / upsert / remove flip an alive bit; expired listings are swept
+  by a timer heap (and excluded by every query); dead docs are compacted away in bulk.
+
+Benchmark:
+    python -m utils.catalog [n_listings]
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import threading
+from array import array
+
+import numpy as np
+
+CATALOG_LISTING_TTL_S = int(os.getenv("CATALOG_LISTING_TTL_S", 24 * 3600))
+CATALOG_BENCH_BUDGET_MS = 50      # p95 query time the benchmark must meet at 1M listings
+
+FACETS = ("crop", "grade", "district")
+NUMERIC = ("quantity_kg", "price", "green_score", "created_at", "expires_at")
+_TAIL_MERGE_MIN = 4096            # Merge the unsorted tail into the sorted columns past this size...
+_TAIL_MERGE_FRACTION = 0.05       # ...or this fraction of all docs, whichever is larger
+_COMPACT_MIN = 4096               # Compact once dead docs exceed this count and half of all docs
+
+
+def _norm(value):
+    return str(value if value is not None else "").strip().lower()
+
+
+def listing_from_session(crop_data, quantity_kg, price, seller, land_data=None, passport=None,
+                         carbon_result=None, ttl_s=CATALOG_LISTING_TTL_S):
+    """One catalog listing from the app's session state (assay, land parcel, passport, green score)."""
+    land_data = land_data or {}
+    passport = passport or {}
+    score = (carbon_result or {}).get("score", passport.get("sustainability_score"))
+    now = time.time()
+    return {
+        "listing_id": passport.get("asset_id") or f"{seller}:{crop_data.get('crop_type')}",
+        "seller": seller,
+        "crop": crop_data.get("crop_type", "Unknown"),
+        "grade": crop_data.get("fci_grade", passport.get("grade", "Grade B")),
+        "district": land_data.get("district", "Nashik"),
+        "quantity_kg": quantity_kg,
+        "price": price,
+        "green_score": score if isinstance(score, (int, float)) else 0,
+        "created_at": now,
+        "expires_at": now + ttl_s,
+    }
+
+
+class CatalogIndex:
+    """Thread-safe listing index. Doc ids are dense ints; listing_id -> doc id is kept in a dict."""
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.RLock()
+        self._init_storage(capacity)
+
+    def _init_storage(self, capacity):
+        self._n = 0
+        self._capacity = capacity
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._dead = 0
+        self._codes = {f: np.full(capacity, -1, dtype=np.int32) for f in FACETS}
+        self._values = {f: np.zeros(capacity, dtype=np.float64) for f in NUMERIC}
+        self._vocab = {f: {} for f in FACETS}       # normalized value -> code
+        self._labels = {f: [] for f in FACETS}      # code -> display value
+        self._postings = {f: [] for f in FACETS}    # code -> array of doc ids
+        self._live = {f: [] for f in FACETS}        # code -> live listings (facet counts without a scan)
+        self._listing_ids = []
+        self._sellers = []
+        self._docs = {}                             # listing_id -> doc id
+        self._sorted = {}                           # field -> (sorted values, doc ids); covers docs < _sorted_upto
+        self._sorted_upto = 0
+        self._timers = []                           # (expires_at, doc id)
+
+    # --- UPDATES ---
+
+    def _grow(self):
+        capacity = self._capacity * 2
+        self._alive = np.concatenate([self._alive, np.zeros(self._capacity, dtype=bool)])
+        for f in FACETS:
+            self._codes[f] = np.concatenate([self._codes[f], np.full(self._capacity, -1, dtype=np.int32)])
+        for f in NUMERIC:
+            self._values[f] = np.concatenate([self._values[f], np.zeros(self._capacity)])
+        self._capacity = capacity
+
+    def _code(self, facet, value):
+        key = _norm(value)
+        code = self._vocab[facet].get(key)
+        if code is None:
+            code = self._vocab[facet][key] = len(self._labels[facet])
+            self._labels[facet].append(str(value))
+            self._postings[facet].append(array("i"))
+            self._live[facet].append(0)
+        return code
+
+    def _add(self, listing):
+        listing_id = listing["listing_id"]
+        if listing_id in self._docs:
+            self._remove(listing_id)
+        if self._n == self._capacity:
+            self._grow()
+        doc = self._n
+        self._n += 1
+        for f in FACETS:
+            code = self._code(f, listing.get(f))
+            self._codes[f][doc] = code
+            self._postings[f][code].append(doc)
+            self._live[f][code] += 1
+        for f in NUMERIC:
+            self._values[f][doc] = float(listing.get(f) or 0)
+        self._alive[doc] = True
+        self._listing_ids.append(listing_id)
+        self._sellers.append(listing.get("seller"))
+        self._docs[listing_id] = doc
+        heapq.heappush(self._timers, (self._values["expires_at"][doc], doc))
+        return doc
+
+    def add(self, listing):
+        """Adds (or replaces, by listing_id) one listing. Missing expires_at means 'never'."""
+        listing = dict(listing)
+        listing.setdefault("created_at", time.time())
+        listing.setdefault("expires_at", float("inf"))
+        with self._lock:
+            self._expire(time.time())
+            return self._add(listing)
+
+    def add_many(self, listings):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            for listing in listings:
+                listing = dict(listing)
+                listing.setdefault("created_at", now)
+                listing.setdefault("expires_at", float("inf"))
+                self._add(listing)
+
+    def _remove(self, listing_id):
+        doc = self._docs.pop(listing_id, None)
+        if doc is None or not self._alive[doc]:
+            return False
+        self._alive[doc] = False
+        self._dead += 1
+        for f in FACETS:
+            self._live[f][self._codes[f][doc]] -= 1
+        return True
+
+    def remove(self, listing_id):
+        with self._lock:
+            removed = self._remove(listing_id)
+            self._maybe_compact()
+            return removed
+
+    def _expire(self, now):
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            _, doc = heapq.heappop(timers)
+            if self._alive[doc] and self._docs.get(self._listing_ids[doc]) == doc:
+                self._remove(self._listing_ids[doc])
+
+    def expire(self, now=None):
+        with self._lock:
+            before = self._dead
+            self._expire(time.time() if now is None else now)
+            self._maybe_compact()
+            return self._dead - before
+
+    def _maybe_compact(self):
+        if self._dead < _COMPACT_MIN or self._dead * 2 < self._n:
+            return
+        keep = np.flatnonzero(self._alive[:self._n])
+        codes = {f: self._codes[f][keep] for f in FACETS}
+        values = {f: self._values[f][keep] for f in NUMERIC}
+        listing_ids = [self._listing_ids[d] for d in keep]
+        sellers = [self._sellers[d] for d in keep]
+        labels, vocab = self._labels, self._vocab
+
+        self._init_storage(max(1024, len(keep) * 2))
+        n = len(keep)
+        self._n = n
+        self._alive[:n] = True
+        self._vocab, self._labels = vocab, labels
+        for f in FACETS:
+            self._codes[f][:n] = codes[f]
+            self._live[f] = np.bincount(codes[f], minlength=len(labels[f])).tolist()
+            self._postings[f] = [array("i") for _ in labels[f]]
+            order = np.argsort(codes[f], kind="stable")
+            bounds = np.searchsorted(codes[f][order], np.arange(len(labels[f]) + 1))
+            for code in range(len(labels[f])):
+                self._postings[f][code].frombytes(order[bounds[code]:bounds[code + 1]].astype(np.intc).tobytes())
+        for f in NUMERIC:
+            self._values[f][:n] = values[f]
+        self._listing_ids, self._sellers = listing_ids, sellers
+        self._docs = {listing_id: doc for doc, listing_id in enumerate(listing_ids)}
+        self._timers = [(t, doc) for doc, t in enumerate(values["expires_at"]) if t != float("inf")]
+        heapq.heapify(self._timers)
+
+    # --- QUERY PLANNING ---
+
+    def _sorted_column(self, field):
+        """Sorted (values, doc ids) for docs < _sorted_upto; the tail is merged in once it grows too big."""
+        if self._n - self._sorted_upto > max(_TAIL_MERGE_MIN, self._n * _TAIL_MERGE_FRACTION):
+            # Sort just the tail and splice it in: O(n) per column instead of a full re-sort
+            tail = np.arange(self._sorted_upto, self._n)
+            for f, (values, docs) in self._sorted.items():
+                tail_values = self._values[f][tail]
+                order = np.argsort(tail_values, kind="stable")
+                at = np.searchsorted(values, tail_values[order], side="right")  # After equal, older docs
+                self._sorted[f] = (np.insert(values, at, tail_values[order]), np.insert(docs, at, tail[order]))
+            self._sorted_upto = self._n
+        if field not in self._sorted:
+            column = self._values[field][:self._sorted_upto]
+            order = np.argsort(column, kind="stable")
+            self._sorted[field] = (column[order], order)
+        return self._sorted[field]
+
+    def warm(self):
+        """Builds every sorted column now (e.g. after a bulk load) instead of on the first query."""
+        with self._lock:
+            for field in NUMERIC:
+                self._sorted_column(field)
+
+    def _range_docs(self, field, low, high):
+        """Doc ids (alive or not) with low <= value <= high: sorted-column slice + tail scan."""
+        values, docs = self._sorted_column(field)
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        tail = np.arange(self._sorted_upto, self._n)
+        if len(tail):
+            tail = tail[self._in_range(self._values[field][tail], low, high)]
+        return np.concatenate([docs[start:end], tail])
+
+    def _range_size(self, field, low, high):
+        values, _ = self._sorted_column(field)
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return end - start
+
+    @staticmethod
+    def _in_range(values, low, high):
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def _facet_codes(self, facet, wanted):
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        return [self._vocab[facet][_norm(v)] for v in wanted if _norm(v) in self._vocab[facet]]
+
+    def _posting_docs(self, facet, codes):
+        lists = [np.frombuffer(self._postings[facet][code], dtype=np.intc) for code in codes]
+        return np.concatenate(lists).astype(np.int64) if lists else np.empty(0, dtype=np.int64)
+
+    def _browse(self, sort_by, descending, last):
+        """
+        Unfiltered search: the `last` best live docs (plus every doc tied with the last one) read
+        off the sorted column from the right end, merged with the live unsorted tail.
+        """
+        values, order = self._sorted_column(sort_by)
+        alive = self._alive
+        walk = order[::-1] if descending else order
+        picked, found, pos, chunk = [], 0, 0, max(256, last * 2)
+        while found < last and pos < len(walk):
+            part = walk[pos:pos + chunk]
+            part = part[alive[part]]
+            picked.append(part)
+            found += len(part)
+            pos += chunk
+            chunk *= 2
+        docs = np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+
+        tail = np.arange(self._sorted_upto, self._n)
+        tail = tail[alive[tail]]
+        if found >= last > 0:
+            boundary = self._values[sort_by][docs[last - 1]]
+            ties = order[np.searchsorted(values, boundary, side="left"):np.searchsorted(values, boundary, side="right")]
+            docs = np.concatenate([docs[:last], ties[alive[ties]]])
+            tail_values = self._values[sort_by][tail]
+            tail = tail[tail_values >= boundary] if descending else tail[tail_values <= boundary]
+        return np.unique(np.concatenate([docs, tail]))
+
+    # --- SEARCH ---
+
+    def search(self, crop=None, grade=None, district=None, quantity_kg=None, price=None, green_score=None,
+               sort_by="price", descending=False, page=1, per_page=20, now=None):
+        """
+        Facet filters take a value or a list of values (OR within a facet, AND across facets).
+        Range filters take (low, high); either end may be None.
+
+        Returns:
+            dict: {"total", "page", "per_page", "results": [listing dicts], "facets": {facet: {value: count}},
+                   "took_ms"}
+        """
+        if sort_by not in NUMERIC:
+            raise ValueError(f"Cannot sort by '{sort_by}' (use one of {NUMERIC})")
+        start_time = time.perf_counter()
+        now = time.time() if now is None else now
+        facet_filters = {f: v for f, v in (("crop", crop), ("grade", grade), ("district", district)) if v is not None}
+        range_filters = {f: r for f, r in (("quantity_kg", quantity_kg), ("price", price),
+                                           ("green_score", green_score)) if r is not None}
+
+        with self._lock:
+            self._expire(now)
+            codes = {f: self._facet_codes(f, v) for f, v in facet_filters.items()}
+
+            first = max(0, (page - 1) * per_page)
+            if not facet_filters and not range_filters:
+                # Browsing everything: no full scan, facet counts come from the live counters
+                total = self._n - self._dead
+                docs = self._browse(sort_by, descending, min(total, first + per_page))
+                facets = {f: {self._labels[f][c]: n for c, n in enumerate(self._live[f]) if n} for f in FACETS}
+                return self._page(docs, total, facets, sort_by, descending, page, per_page, now, start_time)
+
+            # 1. Candidates from the most selective access path
+            if facet_filters:
+                driver = min(codes, key=lambda f: sum(len(self._postings[f][c]) for c in codes[f]))
+                docs = self._posting_docs(driver, codes[driver])
+            else:
+                driver = min(range_filters, key=lambda f: self._range_size(f, *range_filters[f]))
+                docs = self._range_docs(driver, *range_filters[driver])
+
+            # 2. Re-check every other filter on the candidates' columns
+            mask = self._alive[docs] & (self._values["expires_at"][docs] > now)
+            for f, wanted in codes.items():
+                if f != driver:
+                    mask &= np.isin(self._codes[f][docs], wanted)
+            for f, (low, high) in range_filters.items():
+                if f != driver:
+                    mask &= self._in_range(self._values[f][docs], low, high)
+            docs = docs[mask]
+
+            # 3. Facet counts over the full result set
+            facets = {}
+            for f in FACETS:
+                counts = np.bincount(self._codes[f][docs], minlength=len(self._labels[f]))
+                facets[f] = {self._labels[f][c]: int(counts[c]) for c in np.flatnonzero(counts)}
+
+            return self._page(docs, len(docs), facets, sort_by, descending, page, per_page, now, start_time)
+
+    def _page(self, docs, total, facets, sort_by, descending, page, per_page, now, start_time):
+        """Sorts only as much as the requested page needs (ties broken by insertion order)."""
+        first = max(0, (page - 1) * per_page)
+        last = min(total, first + per_page)
+        if last <= first:  # Counts only (per_page=0) or past the last page
+            return {"total": total, "page": page, "per_page": per_page, "results": [], "facets": facets,
+                    "took_ms": round((time.perf_counter() - start_time) * 1000, 2)}
+        key = self._values[sort_by][docs]
+        if descending:
+            key = -key
+        if last < len(docs):
+            boundary = np.partition(key, last - 1)[last - 1]
+            within = key <= boundary
+            docs, key = docs[within], key[within]
+        page_docs = docs[np.lexsort((docs, key))[first:last]]
+        results = [self._listing(doc, now) for doc in page_docs]
+        return {"total": total, "page": page, "per_page": per_page, "results": results, "facets": facets,
+                "took_ms": round((time.perf_counter() - start_time) * 1000, 2)}
+
+    def _listing(self, doc, now):
+        listing = {"listing_id": self._listing_ids[doc], "seller": self._sellers[doc]}
+        for f in FACETS:
+            listing[f] = self._labels[f][self._codes[f][doc]]
+        for f in NUMERIC:
+            listing[f] = float(self._values[f][doc])
+        listing["expires_in_s"] = max(0, round(listing["expires_at"] - now)) if listing["expires_at"] != float("inf") else None
+        return listing
+
+    def get(self, listing_id):
+        with self._lock:
+            doc = self._docs.get(listing_id)
+            return self._listing(doc, time.time()) if doc is not None and self._alive[doc] else None
+
+    def stats(self):
+        with self._lock:
+            return {"listings": self._n - self._dead, "docs": self._n, "dead": self._dead,
+                    "unsorted_tail": self._n - self._sorted_upto,
+                    "facet_values": {f: len(self._labels[f]) for f in FACETS}}
+
+
+# Singleton used by app.py
+catalog_index = CatalogIndex()
+
+
+def benchmark(n_listings=1000000, n_queries=200, seed=5):
+    """
+    Loads n_listings random listings (and warms the sorted columns), then times a mix of faceted / range / sorted / paginated
+    queries (plus incremental adds and removals between them).
+
+    Returns:
+        dict: {"listings", "load_s", "p50_ms", "p95_ms", "max_ms", "queries"}
+    """
+    rng = random.Random(seed)
+    crops = ["Tomato", "Onion", "Potato", "Wheat", "Grape", "Soybean", "Cotton", "Rice"]
+    grades = ["Grade A", "Grade B", "Grade C"]
+    districts = ["Nashik", "Pune", "Ahmednagar", "Solapur", "Jalgaon", "Satara", "Sangli", "Kolhapur",
+                 "Aurangabad", "Nagpur", "Amravati", "Latur"]
+    now = time.time()
+
+    def make(i):
+        return {"listing_id": f"L{i}", "seller": f"farmer-{i % 50000}", "crop": rng.choice(crops),
+                "grade": rng.choice(grades), "district": rng.choice(districts),
+                "quantity_kg": rng.randint(50, 20000), "price": round(rng.uniform(8, 60), 1),
+                "green_score": rng.randint(60, 180), "created_at": now - rng.uniform(0, 86400),
+                "expires_at": now + rng.uniform(60, 86400)}
+
+    index = CatalogIndex(capacity=n_listings + 1024)
+    start = time.perf_counter()
+    index.add_many(make(i) for i in range(n_listings))
+    index.warm()
+    load_s = time.perf_counter() - start
+
+    timings = []
+    for q in range(n_queries):
+        # Incremental churn between queries: new listings arrive, some are withdrawn
+        for j in range(20):
+            index.add(make(n_listings + q * 20 + j))
+        index.remove(f"L{rng.randrange(n_listings)}")
+        kind = q % 4
+        if kind == 0:
+            params = {"crop": rng.choice(crops), "grade": "Grade A", "sort_by": "price", "descending": True}
+        elif kind == 1:
+            params = {"district": rng.sample(districts, 2), "quantity_kg": (1000, 5000), "green_score": (120, None),
+                      "sort_by": "quantity_kg"}
+        elif kind == 2:
+            params = {"price": (20, 22), "sort_by": "green_score", "descending": True}
+        else:
+            params = {"sort_by": "created_at", "descending": True}
+        params["page"] = rng.randint(1, 5)
+        timings.append(index.search(**params)["took_ms"])
+
+    timings.sort()
+    return {"listings": n_listings, "load_s": round(load_s, 1), "p50_ms": timings[len(timings) // 2],
+            "p95_ms": timings[int(len(timings) * 0.95) - 1], "max_ms": timings[-1], "queries": n_queries}
+
+
+if __name__ == "__main__":
+    report = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
+    print(report)
+    assert report["p95_ms"] <= CATALOG_BENCH_BUDGET_MS, f"p95 {report['p95_ms']}ms exceeds {CATALOG_BENCH_BUDGET_MS}ms"
+    print(f"✅ p95 {report['p95_ms']} ms over {report['listings']:,} listings")
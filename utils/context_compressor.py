@@ -0,0 +1,109 @@
+"""
+context_compressor.py
+SUPPORT MODULE: Search-Context Compressor
+Responsibility: Shrinks raw search output before it is pasted into an LLM prompt. Results are split
+into sentences, near-duplicates dropped, each sentence scored lexically against the intent
+(crop, disease, price ...) and the best ones packed into a token budget, kept in original order.
+
+Prompt size drives Groq latency and cost, so every agent runs its web context through here.
+"""
+
+import os
+import re
+import math
+
+from utils.knowledge_base import tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 350))
+DEDUPE_THRESHOLD = 0.8  # Jaccard overlap above which a sentence counts as a repeat
+
+# Words that make a sentence useful for a given intent, beyond the query terms themselves
+INTENT_TERMS = {
+    "price": {"price", "rate", "quintal", "kg", "rs", "inr", "modal", "arrival", "wholesale",
+              "mandi", "apmc", "market", "demand", "supply", "trend", "rise", "fall", "sell"},
+    "treatment": {"spray", "fungicide", "dose", "apply", "application", "control", "mancozeb",
+                  "copper", "organic", "neem", "interval", "resistant", "remove", "prevent", "ml", "g"},
+    "general": set(),
+}
+
+_PRICE_PATTERN = re.compile(r"(₹|rs\.?\s?|inr\s?)\s?\d|\d+\s?(/|per)\s?(kg|quintal|qtl)", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English / Hinglish text)."""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def split_sentences(text):
+    """Sentences and bullet lines from search snippets; fragments under 4 words are dropped."""
+    sentences = []
+    for line in re.split(r"\n+", text or ""):
+        for sentence in re.split(r"(?<=[.!?])\s+|\s+\.\.\.\s+", line):
+            sentence = sentence.strip(" \t-*•")
+            if len(sentence.split()) >= 4:
+                sentences.append(sentence)
+    return sentences
+
+
+def _score(tokens, sentence, query_terms, intent_terms, intent):
+    if not tokens:
+        return 0.0
+    unique = set(tokens)
+    score = 2.0 * len(unique & query_terms) + len(unique & intent_terms)
+    if intent == "price" and _PRICE_PATTERN.search(sentence):
+        score += 3.0  # A concrete ₹ figure is what the price prompts need
+    return score / math.sqrt(len(tokens))
+
+
+def compress_context(text, query="", intent="general", token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Returns:
+        dict: {"text", "original_tokens", "compressed_tokens", "ratio",
+               "sentences_total", "sentences_kept"}
+    """
+    original_tokens = estimate_tokens(text or "")
+    sentences = split_sentences(text)
+    query_terms = set(tokenize(query))
+    intent_terms = set(tokenize(" ".join(INTENT_TERMS.get(intent, ())))) | INTENT_TERMS.get(intent, set())
+
+    # Dedupe (first occurrence wins), then score
+    candidates = []
+    kept_sets = []
+    for position, sentence in enumerate(sentences):
+        tokens = tokenize(sentence)
+        token_set = set(tokens)
+        if any(len(token_set & seen) / max(1, len(token_set | seen)) >= DEDUPE_THRESHOLD for seen in kept_sets):
+            continue
+        kept_sets.append(token_set)
+        candidates.append((_score(tokens, sentence, query_terms, intent_terms, intent), position, sentence))
+
+    # Greedy pack by score, then restore reading order
+    chosen = []
+    used = 0
+    for score, position, sentence in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        cost = estimate_tokens(sentence)
+        if used + cost > token_budget:
+            continue
+        chosen.append((position, sentence))
+        used += cost
+
+    compressed = "\n".join(sentence for _, sentence in sorted(chosen))
+    if not compressed and text:
+        compressed = text[:token_budget * 4]  # Unsplittable blob: hard truncate
+    compressed_tokens = estimate_tokens(compressed)
+    return {
+        "text": compressed,
+        "original_tokens": original_tokens,
+        "compressed_tokens": compressed_tokens,
+        "ratio": round(original_tokens / compressed_tokens, 2) if compressed_tokens else 1.0,
+        "sentences_total": len(sentences),
+        "sentences_kept": len(chosen),
+    }
+
+
+def compress_for_prompt(text, query="", intent="general", token_budget=CONTEXT_TOKEN_BUDGET, label="Context"):
+    """compress_context() for prompt building: logs the ratio and returns just the text."""
+    result = compress_context(text, query, intent, token_budget)
+    print(f"🗜️ {label} compressed {result['original_tokens']} → {result['compressed_tokens']} tokens "
+          f"({result['ratio']}x)")
+    return result["text"]
@@ -0,0 +1,256 @@
+"""
+field_scan.py
+CORE MODULE 1b: Field-Scale Vision (Tiled Mode)
+Responsibility: Assays drone / orthomosaic captures of whole parcels by cutting them into
+overlapping tiles, grading tiles in parallel and stitching the verdicts into a severity heatmap.
+
+Memory stays bounded regardless of input size:
+- Uncompressed rasters (.npy, raw TIFF/PPM) are memory-mapped; only the tile being cut is paged in.
+- JPEGs are decoded at a reduced DCT scale so the decoded raster fits MAX_DECODE_PIXELS.
+- Other compressed formats are decoded only if they already fit the budget.
+- At most 2 x max_concurrency encoded tiles exist at any moment.
+"""
+
+import io
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from PIL import Image
+
+from utils.vision import analyze_crop_disease, summarize_consignment, _normalize_grade, GRADE_SEVERITY
+
+# Largest raster we are willing to hold decoded in memory (~300 MB as RGB)
+MAX_DECODE_PIXELS = int(os.getenv("FIELD_MAX_DECODE_PIXELS", 100_000_000))
+TILE_SIZE = int(os.getenv("FIELD_TILE_SIZE", 1024))
+TILE_OVERLAP = int(os.getenv("FIELD_TILE_OVERLAP", 128))
+
+# Image.open() refuses very large rasters by default (decompression-bomb guard).
+# We lift it only while reading headers, because we never decode beyond MAX_DECODE_PIXELS.
+_open_lock = threading.Lock()
+
+
+def _open_unbounded(path):
+    with _open_lock:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+
+
+class TiledRaster:
+    """
+    Lazy region reader over a large image file.
+    read_region(x, y, w, h) returns a PIL RGB image without loading the whole file.
+    Coordinates are in raster space; `scale` < 1 when a JPEG was decoded at reduced resolution.
+    """
+
+    def __init__(self, path, max_decode_pixels=MAX_DECODE_PIXELS):
+        self.path = path
+        self.scale = 1.0
+        self._array = None      # numpy array or memmap, shape (H, W) or (H, W, 3)
+        self._image = None      # decoded PIL image (bounded by max_decode_pixels)
+
+        if path.lower().endswith(".npy"):
+            self._array = np.load(path, mmap_mode="r")
+            self.mode = "memmap"
+        else:
+            img = _open_unbounded(path)
+            self._array = self._memmap_raw(img)
+            if self._array is not None:
+                self.mode = "memmap"
+                img.close()
+            elif img.format == "JPEG":
+                full_w, full_h = img.size
+                scale = 1
+                while scale < 8 and (full_w // scale) * (full_h // scale) > max_decode_pixels:
+                    scale *= 2
+                img.draft("RGB", (full_w // scale, full_h // scale))
+                self._check_budget(img.size, max_decode_pixels)
+                self._image = img.convert("RGB")
+                self.scale = self._image.size[0] / full_w
+                self.mode = "draft" if scale > 1 else "decoded"
+                img.close()
+            else:
+                self._check_budget(img.size, max_decode_pixels)
+                self._image = img.convert("RGB")
+                self.mode = "decoded"
+                img.close()
+
+        if self._array is not None:
+            self.height, self.width = self._array.shape[:2]
+        else:
+            self.width, self.height = self._image.size
+        logging.info(f"Field raster {self.width}x{self.height} opened ({self.mode}, scale {self.scale:.3f})")
+
+    @staticmethod
+    def _check_budget(size, max_decode_pixels):
+        if size[0] * size[1] > max_decode_pixels:
+            raise ValueError(
+                f"Raster {size[0]}x{size[1]} exceeds the {max_decode_pixels:,} pixel decode budget. "
+                "Export the orthomosaic as uncompressed TIFF or JPEG for tiled analysis."
+            )
+
+    def _memmap_raw(self, img):
+        """
+        Maps uncompressed, top-down RGB/L rasters straight from disk.
+        Pillow describes such files as 'raw' tiles (strips) with byte offsets we can reuse.
+        """
+        if img.mode not in ("RGB", "L") or not img.tile:
+            return None
+        bands = 3 if img.mode == "RGB" else 1
+        width, height = img.size
+        row_bytes = width * bands
+        base = None
+        for tile in img.tile:
+            decoder, extents, offset, args = tile[0], tile[1], tile[2], tile[3]
+            rawmode = args[0] if isinstance(args, tuple) else args
+            stride = args[1] if isinstance(args, tuple) and len(args) > 1 else 0
+            orientation = args[2] if isinstance(args, tuple) and len(args) > 2 else 1
+            x0, y0, x1, y1 = extents
+            if decoder != "raw" or rawmode != img.mode or orientation != 1:
+                return None
+            if stride not in (0, row_bytes) or x0 != 0 or x1 != width:
+                return None
+            if base is None:
+                base = offset - y0 * row_bytes
+            if offset != base + y0 * row_bytes:
+                return None  # Strips are not contiguous on disk
+        shape = (height, width, bands) if bands == 3 else (height, width)
+        return np.memmap(self.path, dtype=np.uint8, mode="r", offset=base, shape=shape)
+
+    def read_region(self, x, y, w, h):
+        if self._array is not None:
+            region = np.asarray(self._array[y:y + h, x:x + w])
+            if region.ndim == 2:
+                return Image.fromarray(region).convert("RGB")
+            return Image.fromarray(np.ascontiguousarray(region[..., :3]))
+        return self._image.crop((x, y, x + w, y + h))
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """
+    Yields (row, col, x, y, w, h) for overlapping tiles covering the raster.
+    Tiles advance by tile_size - overlap; edge tiles are clamped inside the raster.
+    """
+    step = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    for row, y in enumerate(starts(height)):
+        for col, x in enumerate(starts(width)):
+            yield row, col, x, y, min(tile_size, width - x), min(tile_size, height - y)
+
+
+def _encode_tile(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+def analyze_field_image(path, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_concurrency=4, client=None):
+    """
+    Tiled assay of a large drone / orthomosaic image.
+
+    Returns:
+        dict: {
+            "heatmap": np.ndarray (rows x cols) of grade severity (0=A, 1=B, 2=Reject, NaN=failed),
+            "defect_heatmap": np.ndarray (rows x cols) of defect counts per tile,
+            "tiles": [{row, col, x, y, w, h, fci_grade, visual_defects, disease_name}],
+            "summary": field-level aggregate (grade area share, hotspots, defect frequency, worst grade)
+        }
+    """
+    raster = TiledRaster(path)
+    specs = list(tile_grid(raster.width, raster.height, tile_size, overlap))
+    rows = max(s[0] for s in specs) + 1
+    cols = max(s[1] for s in specs) + 1
+    heatmap = np.full((rows, cols), np.nan, dtype=np.float32)
+    defect_heatmap = np.zeros((rows, cols), dtype=np.int32)
+    tiles = []
+
+    def assay(spec):
+        row, col, x, y, w, h = spec
+        return spec, analyze_crop_disease(_encode_tile(raster.read_region(x, y, w, h)), client=client)
+
+    # Bounded submission: never more than 2 x max_concurrency tiles encoded at once
+    max_pending = 2 * max(1, max_concurrency)
+    pending = set()
+    spec_iter = iter(specs)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="tile") as pool:
+        while True:
+            for spec in spec_iter:
+                pending.add(pool.submit(assay, spec))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (row, col, x, y, w, h), result = future.result()
+                grade = _normalize_grade(result.get("fci_grade"))
+                defects = [d for d in result.get("visual_defects") or [] if str(d).lower() not in ("none", "n/a")]
+                heatmap[row, col] = GRADE_SEVERITY.get(grade, np.nan)
+                defect_heatmap[row, col] = len(defects) if grade != "N/A" else 0
+                tiles.append({
+                    "row": row, "col": col,
+                    # Report pixel bounds in original-image coordinates
+                    "x": int(x / raster.scale), "y": int(y / raster.scale),
+                    "w": int(w / raster.scale), "h": int(h / raster.scale),
+                    "fci_grade": result.get("fci_grade"),
+                    "disease_name": result.get("disease_name"),
+                    "visual_defects": result.get("visual_defects") or [],
+                })
+
+    tiles.sort(key=lambda t: (t["row"], t["col"]))
+    return {
+        "heatmap": heatmap,
+        "defect_heatmap": defect_heatmap,
+        "tiles": tiles,
+        "summary": summarize_field(tiles, heatmap),
+    }
+
+
+def summarize_field(tiles, heatmap, hotspot_count=5):
+    """Field-level summary: consignment-style aggregate plus area shares and worst tiles."""
+    summary = summarize_consignment(tiles)
+    assayed = max(1, summary["assayed"])
+    summary["grade_area_share"] = {
+        grade: round(count / assayed, 3) for grade, count in summary["grade_distribution"].items()
+    }
+    summary["mean_severity"] = float(np.nanmean(heatmap)) if np.isfinite(heatmap).any() else None
+
+    ranked = sorted(
+        (t for t in tiles if _normalize_grade(t["fci_grade"]) != "N/A"),
+        key=lambda t: (GRADE_SEVERITY[_normalize_grade(t["fci_grade"])], len(t["visual_defects"])),
+        reverse=True,
+    )
+    summary["hotspots"] = [
+        {"row": t["row"], "col": t["col"], "x": t["x"], "y": t["y"],
+         "fci_grade": t["fci_grade"], "disease_name": t["disease_name"]}
+        for t in ranked[:hotspot_count]
+        if GRADE_SEVERITY[_normalize_grade(t["fci_grade"])] > 0
+    ]
+    return summary
+
+
+def render_heatmap(heatmap, cell_px=32):
+    """
+    Renders the severity grid as an RGBA image (green = Grade A, amber = Grade B, red = Reject,
+    transparent = failed tile) for overlaying on the field map.
+    """
+    palette = np.array([[46, 125, 50, 160], [255, 160, 0, 160], [198, 40, 40, 180]], dtype=np.uint8)
+    rgba = np.zeros(heatmap.shape + (4,), dtype=np.uint8)
+    valid = np.isfinite(heatmap)
+    rgba[valid] = palette[heatmap[valid].astype(int)]
+    image = Image.fromarray(rgba)
+    return image.resize((heatmap.shape[1] * cell_px, heatmap.shape[0] * cell_px), Image.NEAREST)
@@ -0,0 +1,156 @@
+"""
+geo.py
+SUPPORT MODULE: Distance & Logistics Cost Matrices
+Responsibility: Great-circle distances and haulage costs between farm parcels and buyer / mandi
+locations, computed for all N x M pairs in one vectorized NumPy pass. Bids are ranked on the
+farmer's net realized price (price - haulage per kg) instead of the headline price.
+
+Benchmark (10k farms x 1k buyers vs a per-pair Python loop):
+    python -m utils.geo
+"""
+
+import os
+import sys
+import math
+import time
+
+import numpy as np
+
+from utils.pricing import FREIGHT_RS_PER_KG_KM
+
+EARTH_RADIUS_KM = 6371.0088
+ROAD_CIRCUITY = float(os.getenv("ROAD_CIRCUITY", 1.3))         # Road km per great-circle km (rural India)
+HANDLING_RS_PER_KG = float(os.getenv("HANDLING_RS_PER_KG", 0.25))  # Loading / unloading, per kg
+GEO_BENCH_BUDGET_S = 1.0
+
+DEFAULT_FARM = (19.9975, 73.7898)   # Survey 45/2A, Nashik (the demo land parcel)
+
+# Mandis the farm can truck to: name -> (lat, lon)
+MARKETS = {
+    "Nashik APMC": (20.0063, 73.7897),
+    "Lasalgaon APMC": (20.1500, 74.2333),
+    "Pimpalgaon Baswant APMC": (20.1667, 73.9833),
+    "Pune (Gultekdi) APMC": (18.4942, 73.8680),
+    "Vashi APMC, Navi Mumbai": (19.0330, 73.0297),
+}
+
+
+def as_coords(points):
+    """[(lat, lon), ...] (or one pair) -> float64 array of shape (n, 2), in degrees."""
+    coords = np.asarray(points, dtype=np.float64)
+    return coords.reshape(-1, 2)
+
+
+def unit_vectors(points):
+    """(lat, lon) degrees -> unit vectors on the sphere, shape (n, 3)."""
+    radians = np.radians(as_coords(points))
+    cos_lat = np.cos(radians[:, 0])
+    return np.column_stack([cos_lat * np.cos(radians[:, 1]), cos_lat * np.sin(radians[:, 1]), np.sin(radians[:, 0])])
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Great-circle km between every origin and destination.
+    The haversine term equals (1 - u.v) / 2 for unit vectors u, v, so the whole N x M matrix is
+    one BLAS matrix product plus in-place sqrt / arcsin (error ~1 m, far below road-cost precision).
+
+    Returns:
+        np.ndarray: shape (len(origins), len(destinations))
+    """
+    h = unit_vectors(origins) @ unit_vectors(destinations).T
+    np.subtract(1.0, h, out=h)
+    np.clip(h, 0.0, 2.0, out=h)
+    h *= 0.5
+    np.sqrt(h, out=h)
+    np.arcsin(h, out=h)
+    h *= 2 * EARTH_RADIUS_KM
+    return h
+
+
+def road_km_matrix(origins, destinations, circuity=ROAD_CIRCUITY):
+    return haversine_matrix(origins, destinations) * circuity
+
+
+def logistics_cost_matrix(origins, destinations, rate_per_kg_km=FREIGHT_RS_PER_KG_KM,
+                          handling_per_kg=HANDLING_RS_PER_KG, circuity=ROAD_CIRCUITY):
+    """
+    Haulage cost in ₹/kg for every origin -> destination pair: road km x freight rate + handling.
+
+    Returns:
+        np.ndarray: shape (len(origins), len(destinations))
+    """
+    return road_km_matrix(origins, destinations, circuity) * rate_per_kg_km + handling_per_kg
+
+
+def haversine_km(origin, destination):
+    """Scalar reference implementation (one pair, pure Python)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*origin, *destination))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, max(0.0, h))))
+
+
+def rank_by_net_price(bids, farm=DEFAULT_FARM):
+    """
+    Adds road distance, haulage cost and net price to each bid and sorts best net price first.
+    Bids without a "location" keep their quoted distance_km; pickup bids cost the farmer nothing
+    (the buyer's freight is already in the price).
+
+    Returns:
+        list: the same bid dicts, with "distance_km", "logistics_cost", "net_price" set
+    """
+    if not bids:
+        return bids
+    located = [i for i, bid in enumerate(bids) if bid.get("location")]
+    road_km = np.array([float(bid.get("distance_km") or 0) for bid in bids])
+    if located:
+        road_km[located] = road_km_matrix(farm, [bids[i]["location"] for i in located])[0]
+    cost = road_km * FREIGHT_RS_PER_KG_KM + HANDLING_RS_PER_KG
+    pickup = np.array([bid.get("distance") == "Pickup" for bid in bids])
+    cost[pickup] = 0.0
+    net = np.array([float(bid["price"]) for bid in bids]) - cost
+
+    for i, bid in enumerate(bids):
+        bid["distance_km"] = round(float(road_km[i]), 1)
+        if not pickup[i]:
+            bid["distance"] = f"{bid['distance_km']:g} km"
+        bid["logistics_cost"] = round(float(cost[i]), 2)
+        bid["net_price"] = round(float(net[i]), 2)
+    order = np.argsort(-net, kind="stable")
+    return [bids[i] for i in order]
+
+
+def benchmark(n_farms=10000, n_sites=1000, loop_pairs=200000, seed=11):
+    """
+    Cost matrix for n_farms x n_sites random points over Maharashtra, vectorized vs a per-pair
+    Python loop (timed on `loop_pairs` pairs and extrapolated), with a spot check that both agree.
+
+    Returns:
+        dict: {"pairs", "numpy_s", "loop_s_est", "speedup", "max_abs_err_km"}
+    """
+    rng = np.random.default_rng(seed)
+    farms = np.column_stack([rng.uniform(16, 22, n_farms), rng.uniform(72.6, 80.9, n_farms)])
+    sites = np.column_stack([rng.uniform(16, 22, n_sites), rng.uniform(72.6, 80.9, n_sites)])
+
+    start = time.perf_counter()
+    cost = logistics_cost_matrix(farms, sites)
+    numpy_s = time.perf_counter() - start
+
+    rows = max(1, loop_pairs // n_sites)
+    farm_list, site_list = farms[:rows].tolist(), sites.tolist()
+    start = time.perf_counter()
+    loop = [[haversine_km(f, s) * ROAD_CIRCUITY * FREIGHT_RS_PER_KG_KM + HANDLING_RS_PER_KG for s in site_list]
+            for f in farm_list]
+    loop_s = (time.perf_counter() - start) * n_farms / rows
+
+    err_km = np.max(np.abs(cost[:rows] - np.array(loop))) / (ROAD_CIRCUITY * FREIGHT_RS_PER_KG_KM)
+    return {"pairs": n_farms * n_sites, "numpy_s": round(numpy_s, 3), "loop_s_est": round(loop_s, 2),
+            "speedup": round(loop_s / numpy_s), "max_abs_err_km": float(err_km)}
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    report = benchmark(*args)
+    print(report)
+    assert report["numpy_s"] < GEO_BENCH_BUDGET_S, f"{report['numpy_s']}s exceeds {GEO_BENCH_BUDGET_S}s"
+    assert report["max_abs_err_km"] < 1e-3, "Vectorized distances disagree with the scalar haversine"
+    print(f"✅ {report['pairs']:,} pairs in {report['numpy_s']}s ({report['speedup']}x faster than the loop)")
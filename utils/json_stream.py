@@ -0,0 +1,124 @@
+"""
+json_stream.py
+SUPPORT MODULE: Incremental JSON Field Parser
+Responsibility: Pulls top-level fields out of a JSON object while an LLM is still streaming it,
+so the UI can show `crop_type`, `fci_grade`, ... the moment each one is complete.
+
+Tolerant by design: text before the first '{' (```json fences, chatter) and anything after the
+closing '}' is ignored, and fields completed before a truncated ending are kept.
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Feed text chunks; each feed() returns the (key, value) pairs completed by that chunk.
+
+    Usage:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+        parser.fields   # everything parsed so far
+        parser.done     # True once the closing brace arrived
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek_object"
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._nesting = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer):
+            ch = buffer[self._pos]
+            state = self._state
+
+            if state == "seek_object":
+                if ch == "{":
+                    self._state = "seek_key"
+
+            elif state == "seek_key":
+                if ch == '"':
+                    self._state = "key"
+                    self._key_start = self._pos + 1
+                    self._escaped = False
+                elif ch == "}":
+                    self.done = True
+                    break
+
+            elif state == "key":
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._key = json.loads(buffer[self._key_start - 1:self._pos + 1])
+                    self._state = "colon"
+
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+                    self._value_start = self._pos + 1
+                    self._nesting = 0
+                    self._in_string = False
+                    self._escaped = False
+
+            elif state == "value":
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif ch == "\\":
+                        self._escaped = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in "[{":
+                    self._nesting += 1
+                elif ch in "]}" and self._nesting > 0:
+                    self._nesting -= 1
+                elif self._nesting == 0 and ch in ",}":
+                    value = self._decode(buffer[self._value_start:self._pos])
+                    self.fields[self._key] = value
+                    completed.append((self._key, value))
+                    if ch == "}":
+                        self.done = True
+                        break
+                    self._state = "seek_key"
+
+            self._pos += 1
+
+        return completed
+
+    @staticmethod
+    def _decode(raw):
+        raw = raw.strip()
+        try:
+            return json.loads(raw)
+        except ValueError:
+            # LLM slips such as trailing commas inside arrays or bare words: keep the text
+            return raw.strip('"')
+
+
+def parse_json_object(text):
+    """
+    One-shot tolerant parse of an LLM reply. Returns a dict (possibly partial) or None.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.fields or None
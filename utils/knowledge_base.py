@@ -0,0 +1,201 @@
+"""
+knowledge_base.py
+SUPPORT MODULE: Local Treatment Knowledge Base
+Responsibility: BM25 retrieval over the curated guides in data/treatment_docs, used by the
+research agent as the first-tier source before any live web search.
+
+The index is built once (chunked per '## ' section, sparse BM25 weights stored as NumPy arrays),
+persisted next to the other caches and rebuilt automatically when a guide changes.
+"""
+
+import os
+import re
+import json
+import glob
+import logging
+import threading
+
+import numpy as np
+
+from utils.cache import CACHE_DIR
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "treatment_docs")
+INDEX_PATH = os.path.join(CACHE_DIR, "kb_index.npz")
+KB_MIN_CONFIDENCE = float(os.getenv("KB_MIN_CONFIDENCE", 0.7))
+
+_ANY_CROP = {"any", "all", "general"}   # '# Crop: Any' marks a guide that applies to every crop
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "at", "by", "with", "is", "are",
+    "be", "it", "as", "per", "from", "this", "that", "if", "use", "india", "2024", "2025",
+    "treatment", "disease", "crop", "guide",
+}
+
+
+def tokenize(text):
+    """Lower-case word tokens, stopwords removed, plural 's' folded."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _chunk_document(path):
+    """Splits a guide into '## ' sections, each prefixed with the document's '# ' headings."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    headings = [line[2:].strip() for line in text.splitlines() if line.startswith("# ")]
+    title = " | ".join(headings) or os.path.basename(path)
+
+    chunks = []
+    for section in re.split(r"\n(?=## )", text):
+        body = "\n".join(line for line in section.splitlines() if not line.startswith("# ")).strip()
+        if body:
+            chunks.append({"doc": os.path.basename(path), "title": title, "text": body})
+    return chunks
+
+
+class TreatmentKnowledgeBase:
+    """
+    In-process BM25 index. Term postings are stored column-wise (CSC-style):
+    for term t, postings live in chunk_ids[indptr[t]:indptr[t+1]] with precomputed weights.
+    """
+
+    def __init__(self, docs_dir=DOCS_DIR, index_path=INDEX_PATH):
+        self.docs_dir = docs_dir
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _signature(self):
+        files = sorted(glob.glob(os.path.join(self.docs_dir, "*.txt")))
+        return [[os.path.basename(p), os.path.getsize(p), int(os.path.getmtime(p))] for p in files]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            signature = self._signature()
+            if not self._load(signature):
+                self._build(signature)
+                self._save(signature)
+            self._loaded = True
+
+    def _build(self, signature):
+        self.chunks = []
+        for name, _, _ in signature:
+            self.chunks.extend(_chunk_document(os.path.join(self.docs_dir, name)))
+
+        vocab = {}
+        rows, cols, counts = [], [], []
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for chunk_id, chunk in enumerate(self.chunks):
+            tokens = tokenize(chunk["title"] + " " + chunk["text"])
+            lengths[chunk_id] = len(tokens)
+            term_counts = {}
+            for token in tokens:
+                term_id = vocab.setdefault(token, len(vocab))
+                term_counts[term_id] = term_counts.get(term_id, 0) + 1
+            for term_id, count in term_counts.items():
+                rows.append(chunk_id)
+                cols.append(term_id)
+                counts.append(count)
+
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(counts, dtype=np.float32)
+
+        n_chunks = max(1, len(self.chunks))
+        df = np.bincount(cols, minlength=len(vocab)).astype(np.float32)
+        idf = np.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+        avg_len = float(lengths.mean()) if len(lengths) else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / avg_len)
+        weights = idf[cols] * tf * (BM25_K1 + 1) / (tf + norm)
+
+        order = np.argsort(cols, kind="stable")
+        self.vocab = vocab
+        self.chunk_ids = rows[order]
+        self.weights = weights[order].astype(np.float32)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=len(vocab)))]).astype(np.int64)
+        logging.info(f"Knowledge base built: {len(self.chunks)} chunks, {len(vocab)} terms.")
+
+    def _save(self, signature):
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            meta = json.dumps({"signature": signature, "vocab": self.vocab, "chunks": self.chunks})
+            with open(self.index_path, "wb") as f:
+                np.savez(f, chunk_ids=self.chunk_ids, weights=self.weights, indptr=self.indptr,
+                         meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+        except OSError as e:
+            logging.warning(f"Knowledge base index not persisted ({e}).")
+
+    def _load(self, signature):
+        try:
+            with np.load(self.index_path) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta["signature"] != signature:
+                    return False
+                self.chunk_ids = data["chunk_ids"]
+                self.weights = data["weights"]
+                self.indptr = data["indptr"]
+            self.vocab = meta["vocab"]
+            self.chunks = meta["chunks"]
+            return True
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def search(self, query, k=4):
+        """Returns the top-k chunks as [{doc, title, text, score}], best first."""
+        self._ensure_loaded()
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            np.add.at(scores, self.chunk_ids[start:end], self.weights[start:end])
+
+        top = [i for i in np.argsort(-scores)[:k] if scores[i] > 0]
+        return [dict(self.chunks[i], score=round(float(scores[i]), 3)) for i in top]
+
+    def lookup_treatment(self, crop, disease, k=4):
+        """
+        Retrieval for the research agent.
+
+        Returns:
+            dict: {confidence (0-1), title, context} where confidence measures how well the best
+            guide's headings cover the disease name (70%) and the crop (30%). A guide written for
+            other crops scores 0 (same disease name, different host: e.g. no tomato guide for onion).
+        """
+        hits = self.search(f"{disease} {crop} treatment symptoms fungicide", k=k * 2)
+        if not hits:
+            return {"confidence": 0.0, "title": None, "context": ""}
+
+        best_doc = hits[0]["doc"]
+        title_tokens = set(tokenize(hits[0]["title"]))
+        disease_tokens = set(tokenize(disease))
+        crop_tokens = set(tokenize(crop))
+        disease_cover = len(disease_tokens & title_tokens) / len(disease_tokens) if disease_tokens else 0.0
+        crop_cover = len(crop_tokens & title_tokens) / len(crop_tokens) if crop_tokens else 0.0
+        confidence = 0.7 * disease_cover + 0.3 * crop_cover
+        if crop_tokens and not crop_cover and not (_ANY_CROP & title_tokens):
+            confidence = 0.0
+
+        sections = [h["text"] for h in hits if h["doc"] == best_doc][:k]
+        return {
+            "confidence": round(confidence, 2),
+            "title": hits[0]["title"],
+            "context": "\n\n".join(sections),
+        }
+
+
+knowledge_base = TreatmentKnowledgeBase()
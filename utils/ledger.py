@@ -0,0 +1,274 @@
+"""
+ledger.py
+SUPPORT MODULE: Invoice Ledger
+Responsibility: Durable record of every ONDC deal for month-end reconciliation.
+
+- IDs are ULIDs (48-bit millisecond time + 80 random bits, Crockford base32): sortable by
+  creation time, monotonic within a process, and collision-free in practice.
+- Amounts are numbers (quantity_kg, price_per_kg, total_amount); formatting is the UI's job.
+- Storage is one append-only JSONL file. An index of byte offsets by invoice_id, buyer, crop and
+  date is built on first query and extended incrementally from the last indexed offset.
+- Exports (JSONL / CSV) stream record by record, so memory stays flat for millions of invoices.
+
+Month-end export:
+    python -m utils.ledger --format csv --month 2026-10 --out invoices_2026_10.csv
+"""
+
+import os
+import io
+import base64
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+
+LEDGER_DIR = os.getenv("VERIYIELD_LEDGER_DIR", ".veriyield_ledger")
+INVOICE_FIELDS = ["invoice_id", "date", "timestamp", "buyer", "seller", "crop", "grade", "quantity_kg",
+                  "price_per_kg", "total_amount", "currency", "status", "fill_id"]
+
+_CROCKFORD = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", b"0123456789ABCDEFGHJKMNPQRSTVWXYZ")
+_RANDOM_BITS = 80
+
+
+class UlidGenerator:
+    """Monotonic ULIDs: within one millisecond the random part is incremented instead of redrawn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rng = random.SystemRandom()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self, now_ms=None):
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        with self._lock:
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                rand = self._last_random + 1
+                if rand >> _RANDOM_BITS:   # 2^80 IDs in one millisecond: borrow the next one
+                    now_ms += 1
+                    rand = self._rng.getrandbits(_RANDOM_BITS - 1)
+            else:
+                rand = self._rng.getrandbits(_RANDOM_BITS - 1)  # Top bit clear leaves room to increment
+            self._last_ms, self._last_random = now_ms, rand
+        value = (now_ms << _RANDOM_BITS) | rand
+        # 128 bits as 26 base32 digits (2 leading zero bits): RFC 4648 encode, then map to Crockford
+        return base64.b32encode((value << 6).to_bytes(17, "big"))[:26].translate(_CROCKFORD).decode("ascii")
+
+
+new_ulid = UlidGenerator().new
+
+
+class InvoiceLedger:
+    """
+    Append-only JSONL ledger (one invoice per line) with a lazily built offset index.
+    Safe for concurrent writers in one process; other processes' appends are picked up by the
+    incremental index scan.
+    """
+
+    def __init__(self, directory=LEDGER_DIR, filename="invoices.jsonl"):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+        self._file = None
+        self._indexed_to = 0
+        self._by_id = {}
+        self._index = {"buyer": {}, "crop": {}, "date": {}}
+
+    # --- WRITES ---
+
+    def append(self, invoice):
+        """Appends one invoice (dict with at least invoice_id and timestamp) and returns it."""
+        line = (json.dumps(invoice, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None or self._file.closed:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()  # Whole lines reach the OS on every append; readers never see half a buffer
+        return invoice
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- INDEX ---
+
+    def _refresh_index(self):
+        """Indexes lines appended since the last call (by this or any other process)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed_to)
+            offset = self._indexed_to
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written tail; pick it up next time
+                try:
+                    invoice = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                self._by_id[invoice.get("invoice_id")] = offset
+                for field in ("buyer", "crop", "date"):
+                    key = str(invoice.get(field, "")).lower()
+                    self._index[field].setdefault(key, []).append(offset)
+                offset += len(line)
+            self._indexed_to = offset
+
+    # --- READS ---
+
+    def get(self, invoice_id):
+        with self._lock:
+            self._refresh_index()
+            offset = self._by_id.get(invoice_id)
+            if offset is None:
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+
+    def _offsets(self, buyer=None, crop=None, date=None, date_from=None, date_to=None):
+        """Sorted offsets matching every given filter (at least one exact filter is set)."""
+        selected = None
+        for field, value in (("buyer", buyer), ("crop", crop), ("date", date)):
+            if value is not None:
+                offsets = set(self._index[field].get(str(value).lower(), ()))
+                selected = offsets if selected is None else selected & offsets
+        if date_from is not None or date_to is not None:
+            offsets = set()
+            for day, day_offsets in self._index["date"].items():
+                if (date_from is None or day >= date_from) and (date_to is None or day <= date_to):
+                    offsets.update(day_offsets)
+            selected = offsets if selected is None else selected & offsets
+        return sorted(selected)
+
+    @staticmethod
+    def _line_date(line):
+        """The date field of a ledger line without a full parse (append() writes compact JSON)."""
+        at = line.find(b'"date":"')
+        if at >= 0:
+            return line[at + 8:at + 18].decode("ascii", "replace")
+        return str(json.loads(line).get("date", ""))
+
+    def _iter_lines(self, buyer=None, crop=None, date=None, date_from=None, date_to=None):
+        """Raw JSONL lines (bytes) of matching invoices, in ledger (= creation) order."""
+        if not os.path.exists(self.path):
+            return
+        if buyer is None and crop is None and date is None:
+            # Sequential scan without the index: memory stays flat however large the ledger is
+            ranged = date_from is not None or date_to is not None
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    if ranged:
+                        try:
+                            day = self._line_date(line)
+                        except ValueError:
+                            continue
+                        if (date_from is not None and day < date_from) or (date_to is not None and day > date_to):
+                            continue
+                    yield line
+            return
+
+        with self._lock:
+            self._refresh_index()
+            offsets = self._offsets(buyer, crop, date, date_from, date_to)
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield f.readline()
+
+    def iter_invoices(self, buyer=None, crop=None, date=None, date_from=None, date_to=None):
+        """
+        Streams invoices in ledger (= creation) order, optionally filtered by buyer, crop and
+        day ("YYYY-MM-DD", or an inclusive date_from / date_to range).
+        """
+        for line in self._iter_lines(buyer, crop, date, date_from, date_to):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def query(self, limit=100, **filters):
+        """First `limit` matching invoices as a list (for the UI)."""
+        invoices = []
+        for invoice in self.iter_invoices(**filters):
+            invoices.append(invoice)
+            if len(invoices) >= limit:
+                break
+        return invoices
+
+    # --- EXPORT ---
+
+    def export(self, out, fmt="jsonl", **filters):
+        """
+        Streams matching invoices to `out` (path or text file object) as JSONL or CSV.
+
+        Returns:
+            int: number of invoices written
+        """
+        if isinstance(out, (str, os.PathLike)):
+            with open(out, "w", encoding="utf-8", newline="") as f:
+                return self.export(f, fmt, **filters)
+
+        count = 0
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=INVOICE_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for invoice in self.iter_invoices(**filters):
+                writer.writerow(invoice)
+                count += 1
+        elif fmt == "jsonl":
+            for line in self._iter_lines(**filters):  # Ledger lines are already JSONL: copy them through
+                out.write(line.decode("utf-8"))
+                count += 1
+        else:
+            raise ValueError(f"Unknown export format '{fmt}' (use jsonl or csv)")
+        return count
+
+    def export_bytes(self, fmt="csv", **filters):
+        """Export as bytes (for st.download_button on modest ledgers)."""
+        buffer = io.StringIO()
+        self.export(buffer, fmt, **filters)
+        return buffer.getvalue().encode("utf-8")
+
+    def stats(self):
+        with self._lock:
+            self._refresh_index()
+            return {"invoices": len(self._by_id), "buyers": len(self._index["buyer"]),
+                    "crops": len(self._index["crop"]), "days": len(self._index["date"]),
+                    "bytes": self._indexed_to}
+
+
+# Singleton used by ondc.py and app.py
+invoice_ledger = InvoiceLedger()
+
+
+def month_range(month):
+    """'2026-10' -> ('2026-10-01', '2026-10-31'); dates compare as strings, so day 31 bounds every month."""
+    start = datetime.strptime(month, "%Y-%m")
+    return start.strftime("%Y-%m-01"), start.strftime("%Y-%m-31")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the VeriYield invoice ledger.")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="csv")
+    parser.add_argument("--month", help="YYYY-MM (inclusive month filter)")
+    parser.add_argument("--buyer")
+    parser.add_argument("--crop")
+    parser.add_argument("--out", help="Output path (default: stdout)")
+    args = parser.parse_args()
+
+    filters = {"buyer": args.buyer, "crop": args.crop}
+    if args.month:
+        filters["date_from"], filters["date_to"] = month_range(args.month)
+    written = invoice_ledger.export(args.out or sys.stdout, args.format, **filters)
+    print(f"✅ Exported {written} invoices", file=sys.stderr)
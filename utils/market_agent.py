@@ -1,21 +1,27 @@
 import os
 from typing import TypedDict, List
-from langchain_groq import ChatGroq
-from langchain_community.tools import DuckDuckGoSearchRun
-from langgraph.graph import StateGraph, END
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from utils.market_intel import market_intel
+from utils.context_compressor import compress_for_prompt
+from utils.registry import registry, lazy
+from utils.negotiation_memory import NegotiationMemory, extract_prices, role_content
+from utils.pricing import fair_price_from_intel, offer_ladder, counter_offer
 
 # --- 1. SETUP & CONFIGURATION ---
 os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
 
-# Initialize Fast Llama Model (The Brain)
-llm = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7 
-)
+# Initialize Fast Llama Model (The Brain), built on first use
+def _build_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model_name="llama-3.3-70b-versatile",
+        temperature=0.7 
+    )
 
-# Initialize Search Tool (The Eyes)
-search_tool = DuckDuckGoSearchRun()
+registry.register("market_agent.llm", _build_llm)
+llm = lazy("market_agent.llm")
+
+# Search (The Eyes): shared, cached service so repeated mandi-price queries hit the cache
 
 # --- 2. DEFINE AGENT STATE ---
 class AgentState(TypedDict):
@@ -25,35 +31,42 @@ class AgentState(TypedDict):
     - crop_name: What we are selling.
     - crop_grade: The quality (A/B).
     - market_intel: The REAL prices found on the web.
+    - negotiation_summary: Offers / floor price / stance folded out of older turns.
+    - farmer_ask / last_offer: Latest ₹/kg figures from each side (0 = none yet).
+    - offer_plan: The pricing engine's decision that the LLM only puts into words.
     """
     messages: List[str] 
     crop_name: str
     crop_grade: str
     market_intel: str
+    negotiation_summary: str
+    farmer_ask: float
+    last_offer: float
+    offer_plan: dict
 
 # --- 3. DEFINE NODES (The Actions) ---
 
 def market_research_node(state: AgentState):
     """
-    Step 1: Research.
-    If we don't have market data yet, search the web for REAL prices.
+    Step 1: Research + Pricing.
+    Pulls the structured price book entry (seeded, refreshed from the web in the background)
+    and lets the pricing engine decide this turn's offer.
     """
+    print(f"🕵️ Raju Bhai is checking market rates for {state['crop_name']}...")
+    entry = market_intel.get(state['crop_name'], "Nashik")
+    fair = fair_price_from_intel(entry, state['crop_grade'])
+    plan = counter_offer(
+        offer_ladder(fair["fair_price"]),
+        farmer_ask=state.get('farmer_ask') or None,
+        last_offer=state.get('last_offer') or None,
+    )
+    plan["fair_price"] = fair["fair_price"]
+
+    update = {"offer_plan": plan}
     current_intel = state.get('market_intel', '')
-    
-    # Optimization: Only search if we haven't already (to save time/rate limits)
     if not current_intel or len(current_intel) < 10:
-        print(f"🕵️ Raju Bhai is checking market rates for {state['crop_name']}...")
-        
-        # Search Query: Specific to Indian Mandis
-        query = f"current market price {state['crop_name']} Nashik Mandi today 2025"
-        try:
-            results = search_tool.invoke(query)
-        except:
-            results = "Market is volatile. Average rates are around ₹20-₹40/kg."
-            
-        return {"market_intel": results}
-    
-    return {} # No new update needed
+        update["market_intel"] = market_intel.describe(state['crop_name'], "Nashik", wait=False)
+    return update
 
 def negotiator_node(state: AgentState):
     """
@@ -61,9 +74,13 @@ def negotiator_node(state: AgentState):
     Talks to the user using the Real Market Intel.
     """
     # Extract Context
-    market_data = state['market_intel']
+    market_data = compress_for_prompt(
+        state['market_intel'], f"{state['crop_name']} Nashik", intent="price", token_budget=150,
+        label="Broker market intel")
     history = state['messages']
     
+    plan = state.get('offer_plan') or {}
+    
     # The "Raju Bhai" Persona Prompt
     system_prompt = f"""
     You are 'Raju Bhai', a smart and respected Commission Agent (Adatya) at Nashik Mandi.
@@ -71,16 +88,19 @@ def negotiator_node(state: AgentState):
     CONTEXT:
     - User is selling: {state['crop_name']}
     - Quality Grade: {state['crop_grade']}
-    - REAL MARKET DATA (From Web): {market_data}
+    - REAL MARKET DATA: {market_data}
+    - NEGOTIATION SO FAR: {state.get('negotiation_summary') or 'Just started.'}
     
-    YOUR GOAL:
-    Negotiate a price for the crop. 
+    YOUR DECISION THIS TURN (already made - do NOT change the number):
+    - Action: {plan.get('action', 'open')}
+    - Your price: ₹{plan.get('price', 0):g}/kg
+    - Why: {plan.get('reason', '')}
     
     BEHAVIOR:
-    1. **Use the Real Data:** If the web says price is ₹25, don't offer ₹50. Quote the real trends.
+    1. **Say exactly this price.** Never quote any other offer figure. Use the market data only to justify it.
     2. **Hinglish Persona:** Use words like "Bhaav", "Mandi", "Sir ji", "Maal (Produce)".
-    3. **Negotiation Strategy:** - If Grade is A, offer a premium over the web price.
-       - If Grade is B, lowball slightly and cite "Market Down".
+    3. **Match the action:** accept = close the deal happily; counter = meet them part-way;
+       firm / final / hold = politely stand your ground and cite the market; open = first offer.
     4. **Short & Conversational:** Talk like a human on WhatsApp. Max 2 sentences.
     
     Example:
@@ -109,54 +129,86 @@ def negotiator_node(state: AgentState):
     return {"messages": [response]} # Append new response to history
 
 # --- 4. COMPILE THE GRAPH ---
-workflow = StateGraph(AgentState)
+def _build_graph():
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
 
-# Add Nodes
-workflow.add_node("researcher", market_research_node)
-workflow.add_node("negotiator", negotiator_node)
+    # Add Nodes
+    workflow.add_node("researcher", market_research_node)
+    workflow.add_node("negotiator", negotiator_node)
 
-# Set Entry Point
-workflow.set_entry_point("researcher")
+    # Set Entry Point
+    workflow.set_entry_point("researcher")
 
-# Add Edges (Logic Flow)
-workflow.add_edge("researcher", "negotiator")
-workflow.add_edge("negotiator", END)
+    # Add Edges (Logic Flow)
+    workflow.add_edge("researcher", "negotiator")
+    workflow.add_edge("negotiator", END)
 
-# Compile
-app = workflow.compile()
+    # Compile
+    return workflow.compile()
+
+registry.register("market_agent.graph", _build_graph)
+app = lazy("market_agent.graph")
 
 # --- 5. EXPOSE TO APP.PY ---
 class MarketBroker:
     def __init__(self):
         self.name = "Raju Bhai"
-        # We store a cache of market data in memory so we don't search every single message
-        self.market_cache = {} 
+        # Market data comes from the shared market_intel store (TTL + background refresh)
 
-    def chat_with_broker(self, chat_history, crop_data, user_input):
+    def prepare_inputs(self, chat_history, crop_data, user_input, memory=None):
         """
-        Main function called by Streamlit.
+        Graph input state for one turn.
+        Only the last few messages go to the LLM verbatim; older ones reach it through the
+        rolling summary in `memory` (keep one NegotiationMemory per conversation).
         """
         crop_name = crop_data.get('crop_type', 'Tomato')
-        
-        # Check cache to avoid re-Googling every second (Speed Optimization)
-        cached_intel = self.market_cache.get(crop_name, "")
+
+        # app.py appends the user's message before calling; only add it if it is missing
+        history = list(chat_history)
+        if not history or history[-1] != {"role": "user", "content": user_input}:
+            history.append({"role": "user", "content": user_input})
+        summary, recent = (memory or NegotiationMemory()).window(history)
+
+        # Latest numbers from each side feed the pricing engine
+        farmer_prices = extract_prices(user_input)
+        last_offer = 0.0
+        for message in reversed(history):
+            role, content = role_content(message)
+            offers = extract_prices(content) if role == "assistant" else []
+            if offers:
+                last_offer = offers[-1]
+                break
         
         # Prepare Input State
         inputs = {
-            "messages": chat_history + [{"role": "user", "content": user_input}],
+            "messages": recent,
             "crop_name": crop_name,
             "crop_grade": crop_data.get('fci_grade', 'Grade B'),
-            "market_intel": cached_intel
+            "market_intel": "",
+            "negotiation_summary": summary,
+            "farmer_ask": farmer_prices[-1] if farmer_prices else 0.0,
+            "last_offer": last_offer,
+            "offer_plan": {}
         }
-        
+        return inputs
+
+    def chat_with_broker(self, chat_history, crop_data, user_input, memory=None):
+        """
+        Main function (synchronous). Many concurrent sessions should go through
+        utils.broker_service.broker_service instead.
+        """
         # Run LangGraph
-        result = app.invoke(inputs)
-        
-        # Update Cache with the fresh search results
-        self.market_cache[crop_name] = result['market_intel']
+        result = app.invoke(self.prepare_inputs(chat_history, crop_data, user_input, memory))
         
         # Return only the last AI message content
         return result['messages'][-1].content
 
+    async def achat_with_broker(self, chat_history, crop_data, user_input, memory=None):
+        """Async variant: the graph's sync nodes run in the event loop's executor."""
+        result = await app.ainvoke(self.prepare_inputs(chat_history, crop_data, user_input, memory))
+        return result['messages'][-1].content
+
 # Singleton
 broker_agent = MarketBroker()
\ No newline at end of file
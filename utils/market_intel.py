@@ -0,0 +1,281 @@
+"""
+market_intel.py
+SUPPORT MODULE: Market Intelligence Store
+Responsibility: One structured, TTL-aware price book shared by the broker (Raju Bhai), the ONDC
+gateway and the advisory agent. Entries are keyed by crop x market x date and hold numeric fields
+(current_price, weekly_high/low, forecast_next_week ...) instead of raw search text.
+
+- Seeded from data/mock_market.json, so every caller has an answer offline.
+- Entries are refreshed from the web in the background once they pass REFRESH_AHEAD of their TTL.
+- An expired entry gets one bounded synchronous refresh; if search is slow or fails, the last
+  structured entry is served (marked stale) rather than making the caller wait.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.search_service import search_service
+from utils.context_compressor import compress_context
+
+MARKET_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "mock_market.json")
+MARKET_INTEL_TTL_S = int(os.getenv("MARKET_INTEL_TTL_S", 6 * 3600))
+REFRESH_AHEAD = 0.8                 # Start a background refresh at 80% of the TTL
+MARKET_REFRESH_TIMEOUT_S = float(os.getenv("MARKET_REFRESH_TIMEOUT_S", 3))
+MARKET_REFRESH_BACKOFF_S = 120      # After a failed refresh, serve stale data this long before retrying
+
+NUMERIC_FIELDS = ("current_price", "change_percentage", "weekly_high", "weekly_low", "forecast_next_week")
+
+_PRICE_PER_UNIT = re.compile(
+    r"(?:₹|\brs\.?|\binr)\s*([\d,]+(?:\.\d+)?)\s*(?:/|per)?\s*(kg|quintal|qtl)?"
+    r"|([\d,]+(?:\.\d+)?)\s*(?:₹|rs\.?|rupees)?\s*(?:/|per)\s*(kg|quintal|qtl)",
+    re.IGNORECASE,
+)
+
+
+def normalize_market(market):
+    """'Vashi APMC, Navi Mumbai' -> 'vashi'; 'Nashik Mandi' -> 'nashik'."""
+    head = str(market or "").split(",")[0].lower()
+    words = [w for w in re.findall(r"[a-z]+", head) if w not in {"apmc", "mandi", "market", "yard"}]
+    return " ".join(words)
+
+
+def parse_prices_per_kg(text, reference=None):
+    """
+    Rupee prices quoted in search text, converted to ₹/kg (quintal prices / 100).
+    With a reference price, figures outside 0.3x-3x of it are ignored as noise.
+    """
+    prices = []
+    for amount_a, unit_a, amount_b, unit_b in _PRICE_PER_UNIT.findall(text or ""):
+        amount, unit = (amount_a, unit_a) if amount_a else (amount_b, unit_b)
+        try:
+            value = float(amount.replace(",", ""))
+        except ValueError:
+            continue
+        if unit.lower() in ("quintal", "qtl") or (not unit and value >= 500):
+            value /= 100
+        low, high = (reference * 0.3, reference * 3) if reference else (1, 500)
+        if low <= value <= high:
+            prices.append(round(value, 2))
+    return prices
+
+
+class MarketIntelStore:
+    """
+    Thread-safe store: {(crop, market): {date: entry}}.
+    Entry: {crop, market, date, current_price, unit, trend, change_percentage, weekly_high,
+            weekly_low, demand, supply, forecast_next_week, source, price_as_of, snippet, fetched_at}
+    """
+
+    def __init__(self, seed_path=MARKET_DATA_PATH, ttl_seconds=MARKET_INTEL_TTL_S, search=None):
+        self.seed_path = seed_path
+        self.ttl_seconds = ttl_seconds
+        self.search = search or search_service
+        self.default_market = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._refreshing = {}      # (crop, market) -> Future
+        self._failed_at = {}       # (crop, market) -> time of last failed refresh
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="market-intel")
+        self._seeded = False
+
+    # --- SEEDING ---
+
+    def _ensure_seeded(self):
+        if self._seeded:
+            return
+        with self._lock:
+            if self._seeded:
+                return
+            try:
+                with open(self.seed_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Market seed data unavailable ({e}).")
+                data = {}
+            market = data.get("market", "Vashi APMC")
+            self.default_market = market
+            day = str(data.get("last_updated", ""))[:10] or datetime.now().strftime("%Y-%m-%d")
+            # Seed data is aged by its real date (at least due for refresh), so old prices show as stale
+            try:
+                seeded_at = datetime.strptime(day, "%Y-%m-%d").timestamp()
+            except ValueError:
+                seeded_at = time.time()
+            seeded_at = min(seeded_at, time.time() - self.ttl_seconds * REFRESH_AHEAD)
+            for key, crop in data.get("crops", {}).items():
+                entry = {
+                    "crop": crop.get("crop_name", key.title()),
+                    "market": market,
+                    "date": day,
+                    "unit": crop.get("unit", "Rs/kg"),
+                    "trend": crop.get("trend", "stable"),
+                    "demand": crop.get("demand", "moderate"),
+                    "supply": crop.get("supply", "moderate"),
+                    "source": "seed",
+                    "price_as_of": day,
+                    "snippet": "",
+                    "fetched_at": seeded_at,
+                }
+                entry.update({field: float(crop[field]) for field in NUMERIC_FIELDS if field in crop})
+                self._insert(entry)
+            self._seeded = True
+
+    def _insert(self, entry, market=None):
+        """Files entry under its own market, or under `market` (reference estimates keep their label)."""
+        key = (entry["crop"].lower(), normalize_market(market or entry["market"]))
+        self._entries.setdefault(key, {})[entry["date"]] = entry
+
+    # --- READS ---
+
+    def _latest(self, crop, market):
+        history = self._entries.get((crop.lower(), normalize_market(market)))
+        return history[max(history)] if history else None
+
+    def _reference(self, crop):
+        """Latest entry for the crop in any market (seed market first)."""
+        entry = self._latest(crop, self.default_market)
+        if entry:
+            return entry
+        candidates = [h[max(h)] for (c, _), h in self._entries.items() if c == crop.lower() and h]
+        return max(candidates, key=lambda e: e["fetched_at"]) if candidates else None
+
+    def get(self, crop, market=None, wait=True):
+        """
+        Latest structured entry for crop @ market (falls back to the crop's reference market).
+        Fresh entries return immediately; ageing ones trigger a background refresh; expired ones
+        get a refresh bounded by MARKET_REFRESH_TIMEOUT_S (only if wait=True), then stale data.
+
+        Returns:
+            dict | None: entry copy with "age_s" and "stale" added.
+        """
+        self._ensure_seeded()
+        market = market or self.default_market
+        with self._lock:
+            entry = self._latest(crop, market) or self._reference(crop)
+
+        age = time.time() - entry["fetched_at"] if entry else None
+        if entry is None or age > self.ttl_seconds:
+            future = self._schedule_refresh(crop, market, entry)
+            if future is not None and wait:
+                try:
+                    entry = future.result(timeout=MARKET_REFRESH_TIMEOUT_S) or entry
+                except FutureTimeout:
+                    logging.info(f"Market refresh for {crop} @ {market} still running; serving stored data.")
+                except Exception as e:
+                    logging.warning(f"Market refresh for {crop} @ {market} failed: {e}")
+        elif age > self.ttl_seconds * REFRESH_AHEAD:
+            self._schedule_refresh(crop, market, entry)
+
+        if entry is None:
+            return None
+        age = time.time() - entry["fetched_at"]
+        return dict(entry, age_s=round(age), stale=age > self.ttl_seconds)
+
+    def describe(self, crop, market=None, wait=True):
+        """Compact prompt-ready summary of the structured entry (plus the latest web snippet)."""
+        entry = self.get(crop, market, wait=wait)
+        if entry is None:
+            return f"No market data available for {crop}."
+        text = (
+            f"{entry['crop']} @ {entry['market']}"
+            f"{' (reference estimate, no local quotes for ' + entry['estimate_for'] + ')' if entry.get('source') == 'reference' else ''}"
+            f" (prices as of {entry['price_as_of']}"
+            f"{', may be outdated' if entry['stale'] else ''}): "
+            f"₹{entry.get('current_price', 0):g}/kg, trend {entry['trend']} "
+            f"({entry.get('change_percentage', 0):+g}%), week range ₹{entry.get('weekly_low', 0):g}-"
+            f"₹{entry.get('weekly_high', 0):g}, demand {entry['demand']} / supply {entry['supply']}, "
+            f"forecast next week ₹{entry.get('forecast_next_week', entry.get('current_price', 0)):g}/kg."
+        )
+        if entry.get("snippet"):
+            text += f"\nLatest web reports: {entry['snippet']}"
+        return text
+
+    # --- REFRESH ---
+
+    def _schedule_refresh(self, crop, market, previous):
+        """Single-flight background refresh per crop x market; None while backing off."""
+        key = (crop.lower(), normalize_market(market))
+        with self._lock:
+            if key in self._refreshing:
+                return self._refreshing[key]
+            if time.time() - self._failed_at.get(key, 0) < MARKET_REFRESH_BACKOFF_S:
+                return None
+            future = self._pool.submit(self._refresh, crop, market, previous)
+            self._refreshing[key] = future
+
+        def _done(f, key=key):
+            with self._lock:
+                self._refreshing.pop(key, None)
+                if f.exception() is not None or f.result() is None or f.result()["source"] == "reference":
+                    self._failed_at[key] = time.time()
+        future.add_done_callback(_done)
+        return future
+
+    def _refresh(self, crop, market, previous):
+        """
+        Searches the web for today's price and writes a new dated entry. Returns it (or None).
+        With no price found and only another market's data to go on, that data is stored for this
+        market as a "reference" estimate that keeps the other market's name and age.
+        """
+        query = f"current wholesale market price {crop} {market} mandi rates India today per kg"
+        text = self.search.search(query, category="price")
+        reference = previous.get("current_price") if previous else None
+        prices = parse_prices_per_kg(text, reference)
+        snippet = compress_context(text, f"{crop} {market}", intent="price", token_budget=80)["text"]
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        same_market = previous is not None and normalize_market(previous["market"]) == normalize_market(market)
+        if not prices and previous is not None and not same_market:
+            entry = dict(previous, source="reference", estimate_for=market, snippet=snippet)
+            with self._lock:
+                self._insert(entry, market)
+            return entry
+
+        entry = dict(previous or {}, crop=(previous or {}).get("crop", crop.title()), market=market,
+                     date=today, source="web", snippet=snippet, fetched_at=time.time())
+        entry.pop("estimate_for", None)
+        entry.setdefault("unit", "Rs/kg")
+        entry.setdefault("demand", "moderate")
+        entry.setdefault("supply", "moderate")
+        if prices:
+            price = round(statistics.median(prices), 2)
+            if same_market and reference:
+                change = round((price - reference) / reference * 100, 1)
+                entry.update(
+                    change_percentage=change,
+                    trend="rising" if change > 2 else "dropping" if change < -2 else "stable",
+                    weekly_high=max(price, entry.get("weekly_high", price)),
+                    weekly_low=min(price, entry.get("weekly_low", price)),
+                )
+            else:
+                # First reading for this market: borrow the reference market's trend, not its levels
+                entry.update(weekly_high=price, weekly_low=price)
+                entry.setdefault("change_percentage", 0.0)
+                entry.setdefault("trend", "stable")
+                if reference and previous.get("forecast_next_week"):
+                    entry["forecast_next_week"] = round(previous["forecast_next_week"] * price / reference, 2)
+            entry.update(current_price=price, price_as_of=today)
+            entry.setdefault("forecast_next_week", price)
+        elif previous is None:
+            return None  # Nothing structured to offer yet
+        # else: keep the previous numbers (price_as_of unchanged) but attach the fresh snippet
+
+        with self._lock:
+            self._insert(entry)
+        return entry
+
+    def snapshot(self):
+        """All latest entries, for dashboards / debugging."""
+        self._ensure_seeded()
+        with self._lock:
+            return [history[max(history)] for history in self._entries.values() if history]
+
+
+# Singleton shared by market_agent, ondc and rag
+market_intel = MarketIntelStore()
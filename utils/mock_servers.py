@@ -0,0 +1,237 @@
+"""
+mock_servers.py
+SUPPORT MODULE: Local Stand-in Servers
+Responsibility: Tiny HTTP servers that mimic external APIs so the engines can be exercised offline.
+
+Usage:
+    with MockGroqServer(latency=0.2) as server:
+        client = Groq(api_key="test", base_url=server.url)
+        analyze_crop_batch(images, client=client)
+"""
+
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default assay returned by the stand-in vision model
+MOCK_ASSAY = {
+    "crop_type": "Tomato",
+    "disease_name": "Early Blight",
+    "search_term": "Early Blight Tomato treatment India 2025",
+    "visual_defects": ["Black Spots"],
+    "estimated_size_mm": "55",
+    "color_stage": "Red",
+    "fci_grade": "Grade B",
+    "confidence": "High",
+    "explanation": "Mock assay from local stand-in server."
+}
+
+
+class _LocalServer:
+    """Runs a ThreadingHTTPServer on 127.0.0.1 (random free port) in a daemon thread."""
+
+    handler_class = None
+
+    def __init__(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # Short poll interval: stop() returns in ~50 ms instead of up to 0.5 s per server
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _GroqHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass  # Keep test output quiet
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server.owner
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with server.lock:
+            if server.max_concurrent and server.in_flight >= server.max_concurrent:
+                server.rate_limited += 1
+                saturated = True
+            else:
+                saturated = False
+                server.request_count += 1
+                server.in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        if saturated:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}})
+            return
+        try:
+            time.sleep(server.latency)
+            content = server.reply(request)
+            if request.get("stream"):
+                self._send_stream(request, content, server)
+                return
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{server.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _send_stream(self, request, content, server):
+        """Server-sent events, one small content delta per event (like the real token stream)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        created = int(time.time())
+        size = max(1, server.chunk_size)
+        for i in range(0, len(content), size):
+            chunk = {
+                "id": "chatcmpl-mock-stream",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockGroqServer(_LocalServer):
+    """
+    Mimics Groq's OpenAI-compatible chat-completions endpoint (/openai/v1/chat/completions).
+    - latency: seconds to sleep per request (simulates model time)
+    - reply: callable(request_json) -> assistant message content (defaults to MOCK_ASSAY as JSON)
+    - chunk_size / token_delay: shape of the SSE stream when the request sets stream=True
+    - max_concurrent: answer HTTP 429 beyond this many in-flight requests (simulates saturation)
+    Tracks request_count, max_in_flight and rate_limited so concurrency limits can be checked.
+    """
+
+    handler_class = _GroqHandler
+
+    def __init__(self, latency=0.0, reply=None, chunk_size=8, token_delay=0.0, max_concurrent=None):
+        super().__init__()
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.token_delay = token_delay
+        self.max_concurrent = max_concurrent
+        self.rate_limited = 0
+        self.reply = reply or (lambda request: json.dumps(MOCK_ASSAY))
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class _BPPHandler(_GroqHandler):
+    def do_POST(self):
+        server = self.server.owner
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/search"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        with server.lock:
+            server.request_count += 1
+        time.sleep(server.latency)
+        if server.mode == "error":
+            self._send_json(500, {"error": {"message": "BPP unavailable"}})
+            return
+        self._send_json(200, server.on_search(request))
+
+
+class MockBPPServer(_LocalServer):
+    """
+    Mimics one ONDC buyer app (BPP): POST /search answers with an on_search catalog bid.
+    - buyer: profile dict like utils.pricing.BUYERS (buyer_app, logo, spread, distance_km, rating, pickup)
+    - latency: seconds before answering (longer than the bid window = a late bid)
+    - mode: "ok" | "malformed" (no price) | "mismatch" (answers another transaction_id) | "error" (HTTP 500)
+    The bid is the listing's asking price scaled by the buyer's spread, less freight for pickup buyers.
+    """
+
+    handler_class = _BPPHandler
+
+    def __init__(self, buyer, latency=0.0, mode="ok"):
+        super().__init__()
+        self.buyer = buyer
+        self.latency = latency
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def on_search(self, request):
+        from utils.pricing import freight_per_kg
+
+        buyer = self.buyer
+        context = dict(request.get("context", {}), action="on_search",
+                       bpp_id=re.sub(r"[^a-z0-9]+", "-", buyer["buyer_app"].lower()).strip("-"), bpp_uri=self.url)
+        item = request.get("message", {}).get("intent", {}).get("item", {})
+        ask = float(item.get("price", {}).get("value", 20))
+        price = ask * (1 + buyer.get("spread", 0.0))
+        if buyer.get("pickup"):
+            price -= freight_per_kg(buyer.get("distance_km", 0))
+        offer = {"id": "bid-1", "descriptor": item.get("descriptor", {}), "quantity": item.get("quantity", {}),
+                 "price": {"currency": "INR", "value": f"{price:.2f}"}}
+        if self.mode == "malformed":
+            offer.pop("price")
+        elif self.mode == "mismatch":
+            context["transaction_id"] = "unknown"
+        return {
+            "context": context,
+            "message": {"catalog": {"providers": [{
+                "id": context["bpp_id"],
+                "descriptor": {"name": buyer["buyer_app"], "symbol": buyer.get("logo", "🛒")},
+                "rating": buyer.get("rating", "4.0/5"),
+                "items": [offer],
+                "fulfillments": [{"type": "Self-Pickup" if buyer.get("pickup") else "Delivery",
+                                  "distance_km": buyer.get("distance_km"),
+                                  "end": {"location": {"gps": "{:.4f},{:.4f}".format(*buyer["location"])}}
+                                  if buyer.get("location") else {}}],
+            }]}},
+        }
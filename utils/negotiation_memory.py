@@ -0,0 +1,106 @@
+"""
+negotiation_memory.py
+SUPPORT MODULE: Rolling Negotiation Memory
+Responsibility: Keeps the Raju Bhai prompt bounded in long haggling sessions. The last K messages
+are sent verbatim; older ones are folded (once, incrementally) into a short negotiation summary:
+offers made by the broker, the farmer's asks and floor price, and the farmer's current stance.
+"""
+
+import os
+import re
+
+from utils.context_compressor import estimate_tokens
+
+BROKER_RECENT_MESSAGES = int(os.getenv("BROKER_RECENT_MESSAGES", 6))  # 3 exchanges
+BROKER_HISTORY_TOKEN_BUDGET = int(os.getenv("BROKER_HISTORY_TOKEN_BUDGET", 600))
+
+# "₹24", "Rs 24", "24/kg", "24 per kg", "24 rupees"
+_PRICE = re.compile(
+    r"(?:₹|\brs\.?|\binr)\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:/\s*kg|per\s*kg|rupees|rs\b)",
+    re.IGNORECASE,
+)
+_ACCEPT = re.compile(r"\b(deal|done|agreed?|accept|okay|ok|theek hai|chalo|confirm)\b", re.IGNORECASE)
+_REJECT = re.compile(r"\b(no|too low|kam|less|not enough|more|nahi|increase)\b", re.IGNORECASE)
+_HOLD = re.compile(r"\b(wait|hold|later|tomorrow|next week)\b", re.IGNORECASE)
+
+
+def role_content(message):
+    """(role, content) for Streamlit dicts and LangChain messages alike."""
+    if isinstance(message, dict):
+        return message.get("role", "user"), message.get("content", "")
+    role = "assistant" if getattr(message, "type", "") == "ai" else "user"
+    return role, getattr(message, "content", str(message))
+
+
+def extract_prices(text):
+    return [float(a or b) for a, b in _PRICE.findall(text or "")]
+
+
+def _fmt(price):
+    return f"₹{price:g}"
+
+
+class NegotiationMemory:
+    """
+    Per-conversation memory. window(history) returns (summary, recent_messages); messages already
+    folded are never re-read, so each turn costs O(new messages).
+    """
+
+    def __init__(self, recent_messages=BROKER_RECENT_MESSAGES, token_budget=BROKER_HISTORY_TOKEN_BUDGET):
+        self.recent_messages = recent_messages
+        self.token_budget = token_budget
+        self.reset()
+
+    def reset(self):
+        self.folded = 0
+        self.broker_offers = []
+        self.farmer_asks = []
+        self.stance = "opening"
+
+    def _fold(self, message):
+        role, content = role_content(message)
+        prices = extract_prices(content)
+        if role == "assistant":
+            self.broker_offers.extend(prices)
+        else:
+            self.farmer_asks.extend(prices)
+            if _ACCEPT.search(content):
+                self.stance = "ready to accept"
+            elif _HOLD.search(content):
+                self.stance = "considering holding stock"
+            elif _REJECT.search(content) or prices:
+                self.stance = "pushing for a higher rate"
+        self.folded += 1
+
+    def summary(self):
+        if not self.folded:
+            return ""
+        lines = [f"Earlier messages summarised: {self.folded}."]
+        if self.broker_offers:
+            trail = " → ".join(_fmt(p) for p in self.broker_offers[-4:])
+            lines.append(f"Your offers so far: {trail} (best {_fmt(max(self.broker_offers))}/kg).")
+        if self.farmer_asks:
+            trail = " → ".join(_fmt(p) for p in self.farmer_asks[-4:])
+            lines.append(f"Farmer's asks: {trail} (floor {_fmt(min(self.farmer_asks))}/kg).")
+        lines.append(f"Farmer's stance: {self.stance}.")
+        return " ".join(lines)
+
+    def window(self, history):
+        """
+        Folds everything older than the last K messages (and, if still over the token budget,
+        the oldest recent ones) into the summary.
+
+        Returns:
+            tuple: (summary text, list of recent messages to send verbatim)
+        """
+        if len(history) < self.folded:  # Chat was cleared / restarted
+            self.reset()
+
+        start = max(len(history) - self.recent_messages, self.folded)
+        for message in history[self.folded:start]:
+            self._fold(message)
+
+        recent = list(history[start:])
+        while len(recent) > 1 and sum(estimate_tokens(role_content(m)[1]) for m in recent) > self.token_budget:
+            self._fold(recent.pop(0))
+        return self.summary(), recent
@@ -1,103 +1,150 @@
 import time
-import random
-import json
-import re
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage
-
-# Initialize Tools
-search_tool = DuckDuckGoSearchRun()
-llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0.5)
+from datetime import datetime
+from utils.market_intel import market_intel
+from utils.pricing import quote_bids, fair_price_from_intel
+from utils.beckn import beckn_gateway
+from utils.order_book import matching_engine, ONDC_BID_TTL_S
+from utils.ledger import invoice_ledger, new_ulid
+from utils.geo import rank_by_net_price, DEFAULT_FARM
 
 def get_real_market_rate(crop_name, location="Nashik"):
     """
-    Step 1: Search the web for the REAL market price.
+    Step 1: Look up the REAL market price (structured price book, refreshed from the web).
     """
     try:
-        # Search Query
-        query = f"current wholesale market price {crop_name} {location} mandi rates India today per kg"
-        search_results = search_tool.invoke(query)
-        return search_results
-    except:
+        return market_intel.describe(crop_name, location)
+    except Exception:
         return "Market data unavailable. Assume base price is 20."
 
-def broadcast_to_ondc(crop_data):
+def broadcast_to_ondc(crop_data, quantity_kg=500, with_report=False, farm_location=DEFAULT_FARM):
     """
-    RAG-Powered Simulation:
-    1. Finds the REAL price on the web.
-    2. Generates 'Live Bids' centered around that real price.
+    ONDC Broadcast:
+    1. Reads the REAL price from the shared market price book and prices the lot (fair price = ask).
+    2. Broadcasts the listing to every configured buyer app (ONDC_BPP_URLS) concurrently and
+       collects bids until the window closes or the quorum is met.
+    3. With no BPPs configured (or no valid bid in time), quotes bids locally and deterministically.
+    4. Ranks the bids on net realized price (offer - haulage from farm_location per kg).
     """
-    # Simulate Network Latency (The "Searching..." feeling)
-    time.sleep(1.5)
-    
     crop = crop_data.get('crop_type', 'Vegetable')
     grade = crop_data.get('fci_grade', 'Grade B')
     location = "Nashik" # Default for demo
     
-    # 1. RAG: Get Real Data
-    real_market_context = get_real_market_rate(crop, location)
-    
-    # 2. LLM: Generate Structured Bids based on Real Data
-    system_prompt = f"""
-    You are the ONDC Network Gateway.
+    # 1. Get Real Data (structured; stale-but-structured if the web refresh is slow)
+    try:
+        entry = market_intel.get(crop, location)
+    except Exception as e:
+        print(f"Market intel unavailable: {e}. Using default reference price.")
+        entry = None
     
-    CONTEXT:
-    - Crop: {crop} ({grade})
-    - Location: {location}
-    - LATEST WEB SEARCH DATA: "{real_market_context}"
+    # 2. Live bids from the network
+    ask = fair_price_from_intel(entry, grade, quantity_kg)["fair_price"]
+    report = {"bids": [], "dropped": {}, "endpoints": 0, "elapsed_s": 0.0, "source": "local"}
+    if beckn_gateway.endpoints:
+        try:
+            report = dict(beckn_gateway.broadcast(crop, grade, quantity_kg, ask, location), source="ondc")
+        except Exception as e:
+            print(f"ONDC broadcast failed: {e}. Quoting locally.")
     
-    TASK:
-    Based on the REAL market prices found above, generate 3 realistic bids from Buyer Apps.
-    - If the web says price is ₹20, generate bids around ₹19-₹24.
-    - If Grade is 'Grade A', give a 10% premium.
+    # 3. Fallback: price the bids locally
+    if not report["bids"]:
+        report["bids"] = quote_bids(entry, grade, quantity_kg)
+        report["source"] = "local"
     
-    RETURN JSON ONLY:
-    [
-        {{
-            "buyer_app": "BigBasket (via ONDC)", 
-            "logo": "🥬", 
-            "price": 24, 
-            "distance": "12 km", 
-            "rating": "4.8/5"
-        }},
-        ... (2 more)
-    ]
+    # 4. Rank on what the farmer actually keeps
+    report["bids"] = rank_by_net_price(report["bids"], farm_location)
+    report["ask_price"] = ask
+    return (report["bids"], report) if with_report else report["bids"]
+
+def post_bids_to_book(bids, crop_data, quantity_kg, market="Nashik", ttl_s=ONDC_BID_TTL_S, replaces=None):
     """
-    
-    try:
-        # Invoke LLM
-        response = llm.invoke([SystemMessage(content=system_prompt)])
-        content = response.content
-        
-        # Clean JSON (remove markdown wrappers)
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].strip()
-            
-        bids = json.loads(content)
-        return bids
+    Rests every received bid in the order book (for quantity_kg, expiring after ttl_s) and tags each
+    with its order_id. The bids of an earlier broadcast (`replaces`) are cancelled first, so a
+    re-broadcast replaces this seller's demand instead of stacking it.
 
-    except Exception as e:
-        print(f"RAG Failed: {e}. Using Fallback.")
-        # FALLBACK (Safe Mode if Internet fails)
-        base = 25 if grade == "Grade A" else 18
-        return [
-            {"buyer_app": "BigBasket (via ONDC)", "logo": "🥬", "price": base+2, "distance": "12 km", "rating": "4.8/5"},
-            {"buyer_app": "Reliance Fresh", "logo": "🏬", "price": base, "distance": "8 km", "rating": "4.5/5"},
-            {"buyer_app": "Ninjacart (B2B)", "logo": "🥷", "price": base-1, "distance": "Pickup", "rating": "4.9/5"}
-        ]
+    Returns:
+        dict: {"bids", "fills", "invoices"} (fills of bids that crossed resting listings on entry)
+    """
+    crop = crop_data.get('crop_type', 'Vegetable')
+    grade = crop_data.get('fci_grade', 'Grade B')
+    for old in replaces or []:
+        if old.get('order_id'):
+            matching_engine.cancel(old['order_id'])
+    fills, invoices = [], []
+    for bid in bids:
+        placed = matching_engine.place_bid(bid['buyer_app'], crop, grade, market, quantity_kg, bid['price'], ttl_s=ttl_s)
+        bid['order_id'] = placed['order']['order_id']
+        fills += placed['fills']
+        invoices += placed['invoices']
+    return {"bids": bids, "fills": fills, "invoices": invoices}
+
+def rest_listing(crop_data, quantity_kg, reserve_price, seller="farmer", market="Nashik", ttl_s=ONDC_BID_TTL_S,
+                 replaces=None):
+    """
+    Auto-sell: rests the lot in the order book as a standing sell order at reserve_price (replacing
+    the seller's previous one, order_id `replaces`). Live bids at or above the reserve fill it now,
+    by price-time priority; bids that arrive later (e.g. from post_bids_to_book) fill it on entry.
 
-def generate_invoice(buyer, crop_data, qty):
-    """Generates a smart contract invoice"""
-    return {
-        "invoice_id": f"ONDC-TXN-{random.randint(10000, 99999)}",
+    Returns:
+        dict: {"order", "fills", "invoices"} from the matching engine
+    """
+    if replaces:
+        matching_engine.cancel(replaces)
+    crop = crop_data.get('crop_type', 'Vegetable')
+    grade = crop_data.get('fci_grade', 'Grade B')
+    return matching_engine.place_listing(seller, crop, grade, market, quantity_kg, reserve_price, ttl_s=ttl_s)
+
+def accept_bid(bid, crop_data, quantity_kg, seller="farmer", market="Nashik", match_book=False, listing_order_id=None):
+    """
+    Sells the lot to the bid the farmer picked: fills that bid's resting order directly at its price.
+    match_book=True instead lists the lot immediate-or-cancel with the bid's price as reserve, so
+    price-time priority fills it from the best live bids (never below that price).
+    A resting auto-sell listing (listing_order_id) is withdrawn first and only the quantity it has
+    not already sold is offered. Nothing is left resting; an expired bid simply returns no fills.
+
+    Returns:
+        dict: {"order", "fills", "invoices"} from the matching engine
+    """
+    if listing_order_id:
+        matching_engine.cancel(listing_order_id)
+        quantity_kg -= sum(fill['quantity_kg'] for fill in matching_engine.fills_for(listing_order_id))
+        if quantity_kg <= 0:   # Auto-sell already sold the whole lot
+            return {"order": None, "fills": [], "invoices": []}
+    if not match_book:
+        return matching_engine.take(bid.get('order_id'), seller, quantity_kg)
+    crop = crop_data.get('crop_type', 'Vegetable')
+    grade = crop_data.get('fci_grade', 'Grade B')
+    return matching_engine.place_listing(seller, crop, grade, market, quantity_kg, bid['price'], immediate=True)
+
+_stamp = (None, "")
+
+def _timestamp():
+    """'YYYY-MM-DD HH:MM:SS' for now, formatted once per second (invoices are written in bursts)."""
+    global _stamp
+    second = int(time.time())
+    if _stamp[0] != second:
+        _stamp = (second, datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S"))
+    return _stamp[1]
+
+def generate_invoice(buyer, crop_data, qty, seller=None, fill_id=None, ledger=invoice_ledger):
+    """
+    Generates a smart contract invoice and records it in the append-only invoice ledger.
+    Amounts are numeric (₹ and kg); the UI formats them.
+    """
+    timestamp = _timestamp()
+    price = round(float(buyer['price']), 2)
+    invoice = {
+        "invoice_id": f"ONDC-{new_ulid()}",
+        "date": timestamp[:10],
+        "timestamp": timestamp,
         "buyer": buyer['buyer_app'],
+        "seller": seller,
         "crop": crop_data.get('crop_type'),
-        "quantity": f"{qty} kg",
-        "price_per_kg": f"₹ {buyer['price']}",
-        "total_amount": f"₹ {buyer['price'] * qty:,}",
+        "grade": crop_data.get('fci_grade'),
+        "quantity_kg": qty,
+        "price_per_kg": price,
+        "total_amount": round(price * qty, 2),
+        "currency": "INR",
         "status": "Smart Contract Locked 🔒",
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-    }
\ No newline at end of file
+        "fill_id": fill_id,
+    }
+    return ledger.append(invoice)
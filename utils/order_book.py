@@ -0,0 +1,348 @@
+"""
+order_book.py
+SUPPORT MODULE: ONDC Order Book & Matching Engine
+Responsibility: Matches farmer listings against buyer bids for many sellers and buyers at once.
+One book per crop x grade x market; each side is a heap ordered by price, then arrival
+(price-time priority). Orders fill partially, trade at the resting order's price, and every
+fill produces an invoice. take() fills one chosen resting order directly, outside priority.
+
+- Bids carry an expiry (default ONDC_BID_TTL_S, the "Expires in 5:00" in Tab 4). Expiries sit
+  in one timer heap and are swept before every operation; dead heap entries are skipped lazily.
+- Thread-safe (one lock), pure Python, no I/O apart from the invoice callback.
+
+Benchmark:
+    python -m utils.order_book [n_orders]
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import shutil
+import tempfile
+import threading
+from collections import deque
+from functools import lru_cache
+
+from utils.market_intel import normalize_market
+
+ONDC_BID_TTL_S = int(os.getenv("ONDC_BID_TTL_S", 300))
+ORDER_BOOK_BENCH_MIN_OPS = 20000     # Orders per second the benchmark must sustain
+_COMPACT_AFTER = 1024                # Rebuild a side's heap once it holds this many dead entries
+
+BUY, SELL = "buy", "sell"
+
+
+@lru_cache(maxsize=4096)   # A few thousand live crop x grade x market combinations; skips the regex per order
+def book_key(crop, grade, market):
+    """('Tomato', 'Grade A', 'Vashi APMC, Navi Mumbai') -> ('tomato', 'grade a', 'vashi')."""
+    return str(crop).strip().lower(), str(grade or "Grade B").strip().lower(), normalize_market(market)
+
+
+class Order:
+    __slots__ = ("order_id", "side", "owner", "quantity", "remaining", "price", "expires_at", "seq", "key", "active")
+
+    def __init__(self, order_id, side, owner, quantity, price, expires_at, seq, key):
+        self.order_id = order_id
+        self.side = side
+        self.owner = owner
+        self.quantity = quantity
+        self.remaining = quantity
+        self.price = price
+        self.expires_at = expires_at
+        self.seq = seq
+        self.key = key
+        self.active = True
+
+    def as_dict(self, now=None):
+        now = time.time() if now is None else now
+        return {
+            "order_id": self.order_id, "side": self.side, "owner": self.owner, "price": self.price,
+            "quantity": self.quantity, "remaining": self.remaining,
+            "expires_in_s": None if self.expires_at is None else max(0, round(self.expires_at - now)),
+        }
+
+
+class OrderBook:
+    """Both sides of one crop x grade x market. Heap entries: (price key, seq, order)."""
+
+    def __init__(self, key):
+        self.key = key
+        self.bids = []   # (-price, seq, order): highest price, then earliest, first
+        self.asks = []   # (price, seq, order): lowest price, then earliest, first
+        self.dead = {BUY: 0, SELL: 0}
+
+    def _side(self, side):
+        return self.bids if side == BUY else self.asks
+
+    def rest(self, order):
+        heapq.heappush(self._side(order.side), (-order.price if order.side == BUY else order.price, order.seq, order))
+
+    def best(self, side):
+        """Best live order on a side (discarding dead entries on the way)."""
+        heap = self._side(side)
+        while heap and not heap[0][2].active:
+            heapq.heappop(heap)
+            self.dead[side] -= 1
+        return heap[0][2] if heap else None
+
+    def mark_dead(self, order):
+        self.dead[order.side] += 1
+        if self.dead[order.side] > _COMPACT_AFTER and self.dead[order.side] * 2 > len(self._side(order.side)):
+            heap = [entry for entry in self._side(order.side) if entry[2].active]
+            heapq.heapify(heap)
+            if order.side == BUY:
+                self.bids = heap
+            else:
+                self.asks = heap
+            self.dead[order.side] = 0
+
+    def levels(self, side, depth=5, now=None):
+        """Top `depth` live orders of a side, best first (does not modify the book)."""
+        live = [entry for entry in self._side(side) if entry[2].active]
+        return [entry[2].as_dict(now) for entry in heapq.nsmallest(depth, live)]
+
+
+class MatchingEngine:
+    """
+    All order books plus the expiry timer heap.
+    place_listing / place_bid / take return {"order": ..., "fills": [...], "invoices": [...]}.
+    invoicer(fill) -> invoice dict; defaults to ondc.generate_invoice.
+    """
+
+    def __init__(self, invoicer=None, history=1000):
+        self._invoicer = invoicer
+        self._books = {}
+        self._orders = {}            # order_id -> live Order
+        self._timers = []            # (expires_at, seq, order)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.fills = deque(maxlen=history)
+        self._metrics = {"orders": 0, "fills": 0, "expired": 0, "cancelled": 0, "volume_kg": 0}
+
+    # --- ORDER ENTRY ---
+
+    def place_listing(self, seller, crop, grade, market, quantity_kg, reserve_price, ttl_s=None, now=None,
+                      immediate=False):
+        """
+        A seller lot: sells to bids at or above reserve_price; any remainder rests in the book
+        (immediate=True: immediate-or-cancel, the remainder is cancelled instead).
+        """
+        return self._place(SELL, seller, book_key(crop, grade, market), quantity_kg, reserve_price, ttl_s, now,
+                           immediate)
+
+    def place_bid(self, buyer, crop, grade, market, quantity_kg, price, ttl_s=ONDC_BID_TTL_S, now=None,
+                  immediate=False):
+        """A buyer bid: buys from listings at or below price until it fills or expires."""
+        return self._place(BUY, buyer, book_key(crop, grade, market), quantity_kg, price, ttl_s, now, immediate)
+
+    def take(self, order_id, owner, quantity_kg, now=None):
+        """
+        Fills one resting order directly at its price, ahead of better-priced orders (the
+        counterparty picked it). Immediate-or-cancel: whatever the resting order cannot absorb
+        is not rested, and an expired, filled or cancelled order_id fills nothing.
+        """
+        if quantity_kg <= 0:
+            raise ValueError("Quantity must be positive")
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            resting = self._orders.get(order_id)
+            if resting is None:
+                return {"order": None, "fills": [], "invoices": []}
+            self._seq += 1
+            order = Order(f"ORD-{self._seq}", SELL if resting.side == BUY else BUY, owner, quantity_kg,
+                          resting.price, None, self._seq, resting.key)
+            order.active = False
+            self._metrics["orders"] += 1
+            fills = [self._fill(self._books[resting.key], order, resting, now)]
+        invoices = [self._invoice(fill) for fill in fills]
+        return {"order": order.as_dict(now), "fills": fills, "invoices": invoices}
+
+    def cancel(self, order_id):
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                return False
+            self._retire(order)
+            self._metrics["cancelled"] += 1
+            return True
+
+    def _place(self, side, owner, key, quantity, price, ttl_s, now, immediate=False):
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Quantity and price must be positive")
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self._seq += 1
+            order = Order(f"ORD-{self._seq}", side, owner, quantity, float(price),
+                          None if ttl_s is None else now + ttl_s, self._seq, key)
+            self._metrics["orders"] += 1
+            book = self._books.get(key)
+            if book is None:
+                book = self._books[key] = OrderBook(key)
+            fills = self._match(book, order, now)
+            if order.remaining and not immediate:
+                book.rest(order)
+                self._orders[order.order_id] = order
+                if order.expires_at is not None:
+                    heapq.heappush(self._timers, (order.expires_at, order.seq, order))
+            else:
+                order.active = False
+        invoices = [self._invoice(fill) for fill in fills]
+        return {"order": order.as_dict(now), "fills": fills, "invoices": invoices}
+
+    # --- MATCHING ---
+
+    def _match(self, book, order, now):
+        fills = []
+        opposite = SELL if order.side == BUY else BUY
+        while order.remaining:
+            resting = book.best(opposite)
+            if resting is None:
+                break
+            if resting.expires_at is not None and resting.expires_at <= now:
+                self._orders.pop(resting.order_id, None)
+                self._retire(resting)
+                self._metrics["expired"] += 1
+                continue
+            crosses = resting.price <= order.price if order.side == BUY else resting.price >= order.price
+            if not crosses:
+                break
+            fills.append(self._fill(book, order, resting, now))
+        return fills
+
+    def _fill(self, book, order, resting, now):
+        """Trades as much as both orders allow at the resting order's price."""
+        quantity = min(order.remaining, resting.remaining)
+        order.remaining -= quantity
+        resting.remaining -= quantity
+        bid, listing = (order, resting) if order.side == BUY else (resting, order)
+        fill = {
+            "fill_id": f"FILL-{self._metrics['fills'] + 1}",
+            "crop": book.key[0], "grade": book.key[1], "market": book.key[2],
+            "buyer": bid.owner, "seller": listing.owner,
+            "bid_id": bid.order_id, "listing_id": listing.order_id,
+            "quantity_kg": quantity, "price": resting.price,   # Trades at the resting order's price
+            "timestamp": now,
+        }
+        self.fills.append(fill)
+        self._metrics["fills"] += 1
+        self._metrics["volume_kg"] += quantity
+        if not resting.remaining:
+            self._orders.pop(resting.order_id, None)
+            self._retire(resting)
+        return fill
+
+    def _retire(self, order):
+        if order.active:
+            order.active = False
+            book = self._books.get(order.key)
+            if book is not None:
+                book.mark_dead(order)
+
+    # --- EXPIRY ---
+
+    def _expire(self, now):
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            _, _, order = heapq.heappop(timers)
+            if order.active:
+                self._orders.pop(order.order_id, None)
+                self._retire(order)
+                self._metrics["expired"] += 1
+
+    def expire(self, now=None):
+        with self._lock:
+            before = self._metrics["expired"]
+            self._expire(time.time() if now is None else now)
+            return self._metrics["expired"] - before
+
+    # --- READS ---
+
+    def depth(self, crop, grade, market, levels=5, now=None):
+        """Best bids and asks for one book (after sweeping expired orders)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            book = self._books.get(book_key(crop, grade, market))
+            if book is None:
+                return {"bids": [], "asks": []}
+            return {"bids": book.levels(BUY, levels, now), "asks": book.levels(SELL, levels, now)}
+
+    def order(self, order_id, now=None):
+        with self._lock:
+            order = self._orders.get(order_id)
+            return order.as_dict(now) if order is not None and order.active else None
+
+    def fills_for(self, order_id):
+        """Recent fills (within the history window) in which order_id took part, oldest first."""
+        with self._lock:
+            return [fill for fill in self.fills if order_id in (fill["bid_id"], fill["listing_id"])]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, books=len(self._books), live_orders=len(self._orders),
+                        timers=len(self._timers))
+
+    # --- INVOICES ---
+
+    def _invoice(self, fill):
+        if self._invoicer is None:
+            from utils.ondc import generate_invoice
+            self._invoicer = lambda f: generate_invoice(
+                {"buyer_app": f["buyer"], "price": f["price"]},
+                {"crop_type": f["crop"].title(), "fci_grade": f["grade"].title()},
+                f["quantity_kg"], seller=f["seller"], fill_id=f["fill_id"],
+            )
+        return self._invoicer(fill)
+
+
+# Singleton used by app.py
+matching_engine = MatchingEngine()
+
+
+def benchmark(n_orders=200000, books=30, seed=7):
+    """
+    Random listings / bids around ₹20/kg across `books` books, with short bid expiries so the
+    timer heap is exercised. Every fill is invoiced into a throwaway ledger.
+
+    Returns:
+        dict: {"orders", "seconds", "orders_per_s", "fills", "expired"}
+    """
+    from utils.ondc import generate_invoice
+    from utils.ledger import InvoiceLedger
+
+    rng = random.Random(seed)
+    ledger = InvoiceLedger(tempfile.mkdtemp(prefix="order_book_bench_"))
+    engine = MatchingEngine(invoicer=lambda f: generate_invoice(
+        {"buyer_app": f["buyer"], "price": f["price"]}, {"crop_type": f["crop"], "fci_grade": f["grade"]},
+        f["quantity_kg"], seller=f["seller"], fill_id=f["fill_id"], ledger=ledger))
+    markets = [("Tomato", "Grade A"), ("Tomato", "Grade B"), ("Onion", "Grade B"), ("Potato", "Grade A"),
+               ("Wheat", "Grade B")]
+    keys = [(crop, grade, f"Market {i}") for i in range(books // len(markets) + 1) for crop, grade in markets][:books]
+    orders = [(rng.random() < 0.5, rng.choice(keys), rng.randint(50, 2000), round(rng.uniform(17, 23) * 2) / 2)
+              for _ in range(n_orders)]
+
+    clock = time.time()
+    start = time.perf_counter()
+    for i, (is_bid, (crop, grade, market), quantity, price) in enumerate(orders):
+        now = clock + i * 0.001   # 1,000 orders per simulated second; bids live 60 simulated seconds
+        if is_bid:
+            engine.place_bid(f"buyer-{i % 500}", crop, grade, market, quantity, price, ttl_s=60, now=now)
+        else:
+            engine.place_listing(f"farmer-{i % 2000}", crop, grade, market, quantity, price, now=now)
+    seconds = time.perf_counter() - start
+    stats = engine.stats()
+    shutil.rmtree(ledger.directory, ignore_errors=True)
+    return {"orders": n_orders, "seconds": round(seconds, 3), "orders_per_s": round(n_orders / seconds),
+            "fills": stats["fills"], "expired": stats["expired"]}
+
+
+if __name__ == "__main__":
+    report = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+    print(report)
+    assert report["orders_per_s"] >= ORDER_BOOK_BENCH_MIN_OPS, \
+        f"{report['orders_per_s']} orders/s is below {ORDER_BOOK_BENCH_MIN_OPS}"
+    print(f"✅ {report['orders_per_s']:,} orders/s ({report['fills']:,} fills, {report['expired']:,} expired)")
@@ -0,0 +1,233 @@
+"""
+phash.py
+SUPPORT MODULE: Perceptual Hash Index
+Responsibility: Recognises near-duplicate photos (crops, resizes, WhatsApp recompression) that a
+byte-hash cache misses, and flags audit evidence reused across different parcels.
+
+- dhash / phash: 64-bit perceptual hashes computed with NumPy.
+- MultiIndexHashTable: Hamming-radius lookups via multi-index hashing (4 x 16-bit substrings).
+  By pigeonhole, any hash within radius r matches at least one substring within r // 4 bits,
+  so a query probes a few dozen buckets instead of scanning every stored hash.
+"""
+
+import io
+import os
+import json
+import time
+import logging
+import threading
+from array import array
+from itertools import combinations
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.cache import CACHE_DIR
+
+PHASH_RADIUS = int(os.getenv("PHASH_RADIUS", 6))  # Max Hamming distance treated as "same photo"
+
+
+def _grayscale(image_or_bytes, size):
+    if isinstance(image_or_bytes, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image_or_bytes))
+        image.draft("L", (size[0] * 4, size[1] * 4))
+        image = ImageOps.exif_transpose(image)
+    else:
+        image = image_or_bytes
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image_or_bytes):
+    """Difference hash: 8x8 horizontal gradient signs of a 9x8 thumbnail."""
+    pixels = _grayscale(image_or_bytes, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+# Orthonormal DCT-II basis for 32x32 inputs (pHash works on the low-frequency 8x8 block)
+_N = 32
+_DCT = np.sqrt(2.0 / _N) * np.cos(np.pi * (2 * np.arange(_N)[None, :] + 1) * np.arange(_N)[:, None] / (2 * _N))
+_DCT[0, :] /= np.sqrt(2.0)
+
+
+def phash(image_or_bytes):
+    """DCT hash: signs of the 8x8 lowest frequencies relative to their median (DC excluded)."""
+    pixels = _grayscale(image_or_bytes, (_N, _N))
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].ravel()
+    median = np.median(low[1:])
+    return _bits_to_int(low > median)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# Bits set per byte value, for vectorised popcounts over uint64 arrays
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _hamming_many(candidates, value):
+    xored = candidates ^ np.uint64(value)
+    return _POPCOUNT8[xored.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class MultiIndexHashTable:
+    """
+    64-bit hashes split into 4 x 16-bit substrings, each with its own bucket table.
+    Buckets hold compact array('Q') lists of distinct full hashes.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = 16
+    _MASK = (1 << CHUNK_BITS) - 1
+
+    def __init__(self):
+        self._tables = [dict() for _ in range(self.CHUNKS)]
+        self._seen = set()
+        # Probe masks for each substring radius (0 bits, 1 bit, 2 bits flipped ...)
+        self._flip_masks = {0: [0]}
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _chunks(self, value):
+        return [(value >> (i * self.CHUNK_BITS)) & self._MASK for i in range(self.CHUNKS)]
+
+    def _masks(self, radius):
+        if radius not in self._flip_masks:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in combinations(range(self.CHUNK_BITS), r):
+                    mask = 0
+                    for bit in bits:
+                        mask |= 1 << bit
+                    masks.append(mask)
+            self._flip_masks[radius] = masks
+        return self._flip_masks[radius]
+
+    def add(self, value):
+        if value in self._seen:
+            return
+        self._seen.add(value)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is None:
+                table[chunk] = array("Q", [value])
+            else:
+                bucket.append(value)
+
+    def query(self, value, radius):
+        """Returns [(hash, distance)] for stored hashes within `radius`, nearest first."""
+        masks = self._masks(radius // self.CHUNKS)
+        buckets = []
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    buckets.append(np.frombuffer(bucket, dtype=np.uint64))  # Zero-copy view
+        if not buckets:
+            return []
+
+        candidates = np.concatenate(buckets)
+        distances = _hamming_many(candidates, value)
+        keep = distances <= radius
+        matches = dict(zip(candidates[keep].tolist(), distances[keep].tolist()))
+        return sorted(matches.items(), key=lambda item: item[1])
+
+
+class PerceptualIndex:
+    """
+    Every image seen by the vision engine, keyed by pHash.
+    Records: {"id", "hash", "kind" ("assay" | "audit"), "context", "result", "ts"}.
+    Persisted as append-only JSON lines so the index survives restarts.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "phash_index.jsonl")
+        self._table = MultiIndexHashTable()
+        self._records_by_hash = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._index(json.loads(line))
+                    except ValueError:
+                        continue  # Skip a torn last line after a crash
+        except OSError:
+            pass
+
+    def _index(self, record):
+        self._table.add(record["hash"])
+        self._records_by_hash.setdefault(record["hash"], []).append(record)
+        self._next_id = max(self._next_id, record["id"] + 1)
+
+    def add(self, image_hash, kind, result=None, context=None):
+        with self._lock:
+            record = {
+                "id": self._next_id,
+                "hash": image_hash,
+                "kind": kind,
+                "context": context or {},
+                "result": result,
+                "ts": time.time(),
+            }
+            self._index(record)
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except (OSError, TypeError, ValueError) as e:
+                logging.warning(f"Perceptual index write failed ({e}).")
+            return record
+
+    def lookup(self, image_hash, kind=None, radius=PHASH_RADIUS):
+        """Returns [(record, distance)] for near-duplicates, nearest (then newest) first."""
+        with self._lock:
+            hits = []
+            for stored_hash, distance in self._table.query(image_hash, radius):
+                for record in reversed(self._records_by_hash[stored_hash]):
+                    if kind is None or record["kind"] == kind:
+                        hits.append((record, distance))
+            return hits
+
+
+def benchmark(size=1_000_000, queries=2000, radius=PHASH_RADIUS):
+    """Lookup latency at `size` stored hashes (random 64-bit values, planted near-duplicates)."""
+    rng = np.random.default_rng(7)
+    table = MultiIndexHashTable()
+    values = rng.integers(0, 2 ** 63, size=size, dtype=np.int64).astype(np.uint64) * np.uint64(2) + \
+        rng.integers(0, 2, size=size, dtype=np.int64).astype(np.uint64)
+    start = time.perf_counter()
+    for value in values.tolist():
+        table.add(value)
+    build_s = time.perf_counter() - start
+
+    probes = []
+    for value in values[:queries].tolist():
+        flips = rng.choice(64, size=radius, replace=False)
+        for bit in flips:
+            value ^= 1 << int(bit)
+        probes.append(value)
+
+    found = 0
+    start = time.perf_counter()
+    for probe in probes:
+        found += bool(table.query(probe, radius))
+    per_query_ms = (time.perf_counter() - start) * 1000 / queries
+    return {"size": len(table), "build_s": round(build_s, 2), "query_ms": round(per_query_ms, 4),
+            "recall": found / queries}
+
+
+if __name__ == "__main__":
+    print(benchmark())
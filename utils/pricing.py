@@ -0,0 +1,156 @@
+"""
+pricing.py
+SUPPORT MODULE: Deterministic Pricing Engine
+Responsibility: Turns numeric market data into prices: a fair reference price, the broker's offer
+ladder and counter-offers, and per-buyer ONDC bids. Pure Python, no I/O, same inputs -> same
+prices, so the LLM only has to phrase an offer (or is skipped entirely for the ONDC bid list).
+"""
+
+import os
+
+DEFAULT_REFERENCE_PRICE = 20.0   # ₹/kg when no market data is available
+FREIGHT_RS_PER_KG_KM = float(os.getenv("FREIGHT_RS_PER_KG_KM", 0.01))
+
+GRADE_PREMIUM = {"grade a": 0.10, "grade b": 0.0, "grade c": -0.12, "reject": -0.35}
+TREND_ADJUSTMENT = {"rising": 0.03, "stable": 0.0, "dropping": -0.04}
+_LEVEL = {"low": -1, "moderate": 0, "medium": 0, "high": 1}
+DEMAND_SUPPLY_STEP = 0.03        # Per level of demand over supply
+
+# Broker (Raju Bhai) ladder: opens below fair price, concedes in rungs up to the ceiling
+LADDER_OPENING_DISCOUNT = 0.12
+LADDER_CEILING = 1.0
+LADDER_RUNGS = 4
+ACCEPT_TOLERANCE = 0.03          # Accept an ask within 3% of the next rung
+FIRM_ABOVE_CEILING = 0.15        # Asks this far above the ceiling get no concession
+
+# ONDC buyer apps: spread vs fair price, distance from the farm, delivery point (lat, lon), bulk appetite
+BUYERS = [
+    {"buyer_app": "BigBasket (via ONDC)", "logo": "🥬", "spread": 0.06, "distance_km": 12, "rating": "4.8/5",
+     "pickup": False, "location": (19.9553, 73.7367), "bulk_kg": 1000, "bulk_bonus": 0.01},
+    {"buyer_app": "Reliance Fresh", "logo": "🏬", "spread": 0.02, "distance_km": 8, "rating": "4.5/5",
+     "pickup": False, "location": (19.9496, 73.8370), "bulk_kg": 2000, "bulk_bonus": 0.01},
+    {"buyer_app": "Ninjacart (B2B)", "logo": "🥷", "spread": -0.02, "distance_km": 35, "rating": "4.9/5",
+     "pickup": True, "location": (20.1667, 73.9833), "bulk_kg": 1000, "bulk_bonus": 0.04},
+]
+
+
+def _round_price(value):
+    """Mandi-style prices: nearest ₹0.5."""
+    return round(value * 2) / 2
+
+
+def _grade_key(grade):
+    grade = str(grade or "").lower()
+    for key in GRADE_PREMIUM:
+        if key in grade:
+            return key
+    return "grade b"
+
+
+def fair_price(reference_price, grade="Grade B", trend="stable", demand="moderate", supply="moderate",
+               quantity_kg=None):
+    """
+    Reference price adjusted for grade, trend, demand vs supply and lot size.
+
+    Returns:
+        dict: {"fair_price", "reference_price", "adjustments": {name: fraction}}
+    """
+    reference = float(reference_price or DEFAULT_REFERENCE_PRICE)
+    adjustments = {
+        "grade": GRADE_PREMIUM[_grade_key(grade)],
+        "trend": TREND_ADJUSTMENT.get(str(trend).lower(), 0.0),
+        "demand_supply": DEMAND_SUPPLY_STEP * (_LEVEL.get(str(demand).lower(), 0) - _LEVEL.get(str(supply).lower(), 0)),
+        "quantity": 0.0,
+    }
+    if quantity_kg is not None:
+        if quantity_kg < 200:
+            adjustments["quantity"] = -0.03   # Small lots cost buyers more per kg to handle
+        elif quantity_kg >= 2000:
+            adjustments["quantity"] = 0.02
+    factor = 1 + sum(adjustments.values())
+    return {
+        "fair_price": round(reference * factor, 2),
+        "reference_price": reference,
+        "adjustments": adjustments,
+    }
+
+
+def fair_price_from_intel(entry, grade="Grade B", quantity_kg=None):
+    """fair_price() fed from a market_intel entry (None -> DEFAULT_REFERENCE_PRICE)."""
+    entry = entry or {}
+    return fair_price(entry.get("current_price"), grade, entry.get("trend", "stable"),
+                      entry.get("demand", "moderate"), entry.get("supply", "moderate"), quantity_kg)
+
+
+def offer_ladder(fair, rungs=LADDER_RUNGS, opening_discount=LADDER_OPENING_DISCOUNT, ceiling=LADDER_CEILING):
+    """Broker offers from the opening bid up to the walk-away ceiling, evenly spaced."""
+    low, high = fair * (1 - opening_discount), fair * ceiling
+    if rungs <= 1:
+        return [_round_price(high)]
+    step = (high - low) / (rungs - 1)
+    ladder = []
+    for i in range(rungs):
+        price = _round_price(low + step * i)
+        if not ladder or price > ladder[-1]:
+            ladder.append(price)
+    return ladder
+
+
+def counter_offer(ladder, farmer_ask=None, last_offer=None):
+    """
+    The broker's next move given the farmer's latest ask and the broker's previous offer.
+
+    Returns:
+        dict: {"action" ("open" | "hold" | "accept" | "counter" | "final" | "firm"), "price", "reason"}
+    """
+    ceiling = ladder[-1]
+    if last_offer is None:
+        next_rung = ladder[0]
+    else:
+        next_rung = next((p for p in ladder if p > last_offer), ceiling)
+
+    if farmer_ask is None:
+        if last_offer is None:
+            return {"action": "open", "price": ladder[0], "reason": "Opening offer below the fair mandi rate."}
+        return {"action": "hold", "price": last_offer, "reason": "No counter-price from the farmer yet."}
+
+    if farmer_ask <= next_rung * (1 + ACCEPT_TOLERANCE) and farmer_ask <= ceiling:
+        return {"action": "accept", "price": _round_price(farmer_ask), "reason": "Farmer's ask is within our range."}
+    if last_offer is not None and last_offer >= ceiling:
+        return {"action": "final", "price": ceiling, "reason": "Already at our best rate for this grade."}
+    if farmer_ask > ceiling * (1 + FIRM_ABOVE_CEILING):
+        price = last_offer if last_offer is not None else ladder[0]
+        return {"action": "firm", "price": price, "reason": "Ask is far above today's market rate."}
+    return {"action": "counter", "price": next_rung, "reason": "Meeting the farmer part-way."}
+
+
+def freight_per_kg(distance_km):
+    return round(FREIGHT_RS_PER_KG_KM * float(distance_km or 0), 2)
+
+
+def quote_bids(entry, grade="Grade B", quantity_kg=500, buyers=BUYERS):
+    """
+    ONDC bid list from a market_intel entry, highest price first.
+    Pickup buyers deduct their own freight; bulk buyers add a bonus above their lot threshold.
+    Bids keep the keys app.py renders (buyer_app, logo, price, distance, rating) plus a breakdown.
+    """
+    base = fair_price_from_intel(entry, grade, quantity_kg)
+    bids = []
+    for buyer in buyers:
+        factor = 1 + buyer["spread"]
+        if quantity_kg >= buyer.get("bulk_kg", float("inf")):
+            factor += buyer.get("bulk_bonus", 0.0)
+        price = base["fair_price"] * factor
+        freight = freight_per_kg(buyer["distance_km"]) if buyer.get("pickup") else 0.0
+        bids.append({
+            "buyer_app": buyer["buyer_app"],
+            "logo": buyer["logo"],
+            "price": _round_price(price - freight),
+            "distance": "Pickup" if buyer.get("pickup") else f"{buyer['distance_km']} km",
+            "distance_km": buyer["distance_km"],
+            "location": buyer.get("location"),
+            "rating": buyer["rating"],
+            "breakdown": {"fair_price": base["fair_price"], "spread": buyer["spread"], "freight_per_kg": freight},
+        })
+    return sorted(bids, key=lambda bid: -bid["price"])
+
@@ -1,20 +1,37 @@
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import TypedDict, List
-from langchain_groq  import ChatGroq
-from langchain_community.tools import DuckDuckGoSearchRun
-from langgraph.graph import StateGraph, END
 from langchain_core.messages import SystemMessage, HumanMessage
+from utils.knowledge_base import knowledge_base, KB_MIN_CONFIDENCE
+from utils.search_service import search_service
+from utils.market_intel import market_intel
+from utils.advisory_store import advisory_store
+from utils.context_compressor import compress_for_prompt
+from utils.registry import registry, lazy
 
 # --- CONFIGURATION ---
 # We use DuckDuckGo because it is FREE and requires NO API KEY.
-search_tool = DuckDuckGoSearchRun()
+# Searches go through the shared search_service (TTL cache + request coalescing).
 
-# Initialize Fast Llama Model
-llm = ChatGroq(
-    api_key=os.getenv("GROQ_API_KEY"),
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.3
-)
+# Research fan-out: one deadline per research step; slow sources are dropped, not awaited
+SEARCH_TIMEOUT_S = float(os.getenv("SEARCH_TIMEOUT_S", 6))
+# Shared by every concurrent session; queued time counts against the deadline, so keep it roomy (I/O-bound)
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", 16))
+research_pool = ThreadPoolExecutor(max_workers=RESEARCH_WORKERS, thread_name_prefix="research")
+
+# Initialize Fast Llama Model (built on first use by the component registry)
+def _build_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        model_name="llama-3.3-70b-versatile",
+        temperature=0.3
+    )
+
+registry.register("rag.llm", _build_llm)
+llm = lazy("rag.llm")
 
 # --- 1. DEFINE AGENT STATE ---
 class AgentState(TypedDict):
@@ -22,57 +39,132 @@ class AgentState(TypedDict):
     crop_name: str
     disease_name: str
     location: str
+    search_term: str
     search_results: str
+    research_ok: bool
     final_advisory: str
 
 # --- 2. DEFINE NODES (The Actions) ---
 
+def _query_tokens(query):
+    """Lower-cased word set used to spot near-identical queries."""
+    return set(re.findall(r"[a-z0-9]+", query.lower()))
+
+def dedupe_queries(queries, threshold=0.7):
+    """
+    Drops queries whose word sets overlap an earlier query by >= threshold (Jaccard).
+    queries: list of (label, query); first occurrence wins, so list the most specific first.
+    """
+    kept = []
+    for label, query in queries:
+        if not query:
+            continue
+        tokens = _query_tokens(query)
+        duplicate = any(
+            len(tokens & seen) / max(1, len(tokens | seen)) >= threshold
+            for _, _, seen in kept
+        )
+        if not duplicate:
+            kept.append((label, query, tokens))
+    return [(label, query) for label, query, _ in kept]
+
+# Cache category per research label (prices go stale in minutes, treatments in days)
+SEARCH_CATEGORIES = {"disease": "treatment", "market": "price"}
+
+# Stand-in texts for failed / late sources; a report built on any of them is not stored
+SEARCH_UNAVAILABLE = "Live web search unavailable. Using internal knowledge base."
+SEARCH_TIMED_OUT = "Live web search timed out. Using internal knowledge base."
+MARKET_UNAVAILABLE = "Market data unavailable."
+FALLBACK_NOTICES = (SEARCH_UNAVAILABLE, SEARCH_TIMED_OUT, MARKET_UNAVAILABLE)
+
+def parallel_search(queries, timeout=SEARCH_TIMEOUT_S, deadline=None):
+    """
+    Runs (label, query) searches concurrently with one shared deadline (time.monotonic();
+    defaults to now + timeout).
+    Returns {label: [result texts]}; failed or late sources contribute a short notice instead.
+    """
+    deadline = time.monotonic() + timeout if deadline is None else deadline
+    futures = {
+        research_pool.submit(search_service.search, query, SEARCH_CATEGORIES.get(label, "general")): (label, query)
+        for label, query in queries
+    }
+    done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+    results = {}
+    for future, (label, query) in futures.items():
+        if future in done and future.exception() is None:
+            text = future.result()
+        elif future in done:
+            print(f"⚠️ Search failed for '{query}': {future.exception()}")
+            text = SEARCH_UNAVAILABLE
+        else:
+            print(f"⏱️ Search missed the research deadline: '{query}'")
+            future.cancel()
+            text = SEARCH_TIMED_OUT
+        results.setdefault(label, []).append(text)
+    return results
+
 def researcher_node(state: AgentState):
     """
     Step 1: The Researcher.
-    Searches the live internet for 2 things:
-    1. Latest treatments for the disease.
-    2. Current market prices for the crop in that location.
+    1. Treatments: answered from the local treatment guides when retrieval is confident,
+       otherwise searched on the live internet.
+    2. Current market prices for the crop in that location (shared market_intel price book).
+    Web searches and the price lookup run in parallel with duplicates dropped.
+    research_ok is False when any source fell back to a stand-in notice.
     """
     print(f"🕵️ Agent searching for: {state['disease_name']} in {state['location']}...")
-    # USE THE SMART SEARCH TERM FROM VISION (if available)
-    # If vision didn't give one, fallback to the old logic
-    query_disease = state.get("search_term") 
-    if not query_disease:
-        query_disease = f"{state['disease_name']} treatment {state['crop_name']} fungicides India 2025"
-        
-    res_disease = search_tool.invoke(query_disease)
-    
-    # Search Query 1: Disease Treatment
-    query_disease = f"{state['disease_name']} treatment {state['crop_name']} fungicides India 2025"
+    queries = []
+    deadline = time.monotonic() + SEARCH_TIMEOUT_S   # Covers the web searches AND the price lookup
+    market_future = research_pool.submit(market_intel.describe, state['crop_name'], state['location'])
+
+    # Tier 1: Local knowledge base (milliseconds, works offline)
+    local = knowledge_base.lookup_treatment(state['crop_name'], state['disease_name'])
+    if local["confidence"] >= KB_MIN_CONFIDENCE:
+        print(f"📚 Treatment found in local guide: {local['title']} (confidence {local['confidence']})")
+        disease_source = "LOCAL KNOWLEDGE BASE"
+    else:
+        # Tier 2: USE THE SMART SEARCH TERM FROM VISION (if available), plus the generic disease query
+        disease_source = "WEB SEARCH"
+        queries += [
+            ("disease", state.get("search_term")),
+            ("disease", f"{state['disease_name']} treatment {state['crop_name']} fungicides India 2025"),
+        ]
+
+    results = parallel_search(dedupe_queries(queries), deadline=deadline) if queries else {}
+    if disease_source == "LOCAL KNOWLEDGE BASE":
+        res_disease = f"Source: {local['title']}\n{local['context']}"
+    else:
+        res_disease = "\n".join(results.get("disease", []))
     try:
-        res_disease = search_tool.invoke(query_disease)
+        res_market = market_future.result(timeout=max(0.0, deadline - time.monotonic()))
     except Exception as e:
-        res_disease = "Live web search unavailable. Using internal knowledge base."
-    
-    # Search Query 2: Market Price
-    query_market = f"Current market price {state['crop_name']} {state['location']} APMC mandis today"
-    res_market = search_tool.invoke(query_market)
+        print(f"⏱️ Market lookup unavailable: {e}")
+        res_market = MARKET_UNAVAILABLE
+    research_ok = not any(text in FALLBACK_NOTICES for texts in results.values() for text in texts) \
+        and res_market != MARKET_UNAVAILABLE
+
+    # Keep only the sentences that matter for this crop / disease / price before prompting
+    res_disease = compress_for_prompt(
+        res_disease, f"{state['crop_name']} {state['disease_name']} {state.get('search_term', '')}",
+        intent="treatment", token_budget=400, label="Treatment research")
+    res_market = compress_for_prompt(
+        res_market, f"{state['crop_name']} {state['location']}", intent="price", token_budget=200,
+        label="Market research")
     
     # Combine results
     combined_knowledge = f"""
-    [WEB SEARCH - DISEASE TREATMENT]:
+    [{disease_source} - DISEASE TREATMENT]:
     {res_disease}
     
-    [WEB SEARCH - MARKET DATA]:
+    [MARKET INTEL - PRICES]:
     {res_market}
     """
     
-    return {"search_results": combined_knowledge}
+    return {"search_results": combined_knowledge, "research_ok": research_ok}
 
-def consultant_node(state: AgentState):
-    """
-    Step 2: The Consultant.
-    Synthesizes the Web Search data into a professional report.
-    """
-    print("🧠 Agent synthesizing advice...")
-    
-    prompt = f"""
+def _consultant_prompt(state: AgentState):
+    return f"""
     You are VeriYield's Senior Agricultural Advisor.
     
     CONTEXT:
@@ -80,7 +172,7 @@ def consultant_node(state: AgentState):
     - Disease: {state['disease_name']}
     - Location: {state['location']}
     
-    LATEST WEB DATA:
+    LATEST RESEARCH DATA (local treatment guides and/or web):
     {state['search_results']}
     
     TASK:
@@ -88,7 +180,7 @@ def consultant_node(state: AgentState):
     Structure it exactly like this:
     
     ### 🛡️ Immediate Treatment Plan
-    (List 2-3 specific chemicals/organic methods mentioned in the search results).
+    (List 2-3 specific chemicals/organic methods mentioned in the research data).
     
     ### 💰 Market Pulse ({state['location']})
     (Summarize the price trends found in the search. Should the farmer sell now or hold?)
@@ -96,58 +188,129 @@ def consultant_node(state: AgentState):
     ### ⚠️ Prevention & Strategy
     (One bullet point on preventing recurrence).
     
-    Keep it professional, empathetic, and strictly based on the search data provided.
+    Keep it professional, empathetic, and strictly based on the research data provided.
     """
+
+def consultant_node(state: AgentState):
+    """
+    Step 2: The Consultant.
+    Synthesizes the Web Search data into a professional report.
+    """
+    print("🧠 Agent synthesizing advice...")
     
     # Call Llama-3
-    response = llm.invoke([SystemMessage(content=prompt)])
+    response = llm.invoke([SystemMessage(content=_consultant_prompt(state))])
     
     return {"final_advisory": response.content}
 
 # --- 3. BUILD THE GRAPH ---
-workflow = StateGraph(AgentState)
+def _build_graph():
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
 
-# Add Nodes
-workflow.add_node("researcher", researcher_node)
-workflow.add_node("consultant", consultant_node)
+    # Add Nodes
+    workflow.add_node("researcher", researcher_node)
+    workflow.add_node("consultant", consultant_node)
 
-# Add Edges (The Logic Flow)
-# Start -> Researcher -> Consultant -> End
-workflow.set_entry_point("researcher")
-workflow.add_edge("researcher", "consultant")
-workflow.add_edge("consultant", END)
+    # Add Edges (The Logic Flow)
+    # Start -> Researcher -> Consultant -> End
+    workflow.set_entry_point("researcher")
+    workflow.add_edge("researcher", "consultant")
+    workflow.add_edge("consultant", END)
 
-# Compile the Graph
-app_graph = workflow.compile()
+    # Compile the Graph
+    return workflow.compile()
+
+registry.register("rag.graph", _build_graph)
+app_graph = lazy("rag.graph")
 
 # --- 4. EXPOSED FUNCTION FOR APP.PY ---
 
+class DegradedResearch(RuntimeError):
+    """Raised by run_pipeline when the report was built on fallback research."""
+
 class AgentChain:
-    def generate_detailed_advisory(self, disease_data, weather_context, market_context):
-        """
-        Main function called by app.py.
-        Now ignores 'weather_context' hardcoded strings and fetches LIVE data.
-        """
-        
-        # Extract inputs safely
-        crop = disease_data.get('crop_type', 'Crop')
-        disease = disease_data.get('disease_name', 'Unknown Issue')
-        # Extract city from market context if possible, or default to Nashik
-        location = "Nashik" 
-        
-        # Initialize State
-        inputs = {
+    @staticmethod
+    def _initial_state(crop, disease, location, search_term=""):
+        return {
             "crop_name": crop,
             "disease_name": disease,
             "location": location,
+            "search_term": search_term,
             "search_results": "",
+            "research_ok": False,
             "final_advisory": ""
         }
+
+    def _run_graph(self, crop, disease, location, search_term=""):
+        return app_graph.invoke(self._initial_state(crop, disease, location, search_term))
+
+    def run_pipeline(self, crop, disease, location, search_term=""):
+        """
+        Runs researcher -> consultant without the advisory store (used by the precompute job).
+        Raises DegradedResearch when a source fell back, so the job does not store that report.
+        """
+        state = self._run_graph(crop, disease, location, search_term)
+        if not state.get("research_ok"):
+            raise DegradedResearch(f"Research fell back for {crop} / {disease} / {location}")
+        return state["final_advisory"]
+
+    def stream_detailed_advisory(self, disease_data, location=None):
+        """
+        Streaming variant of generate_detailed_advisory for st.write_stream.
+        Yields the report as text chunks: a stored report arrives as one chunk, a fresh one
+        token-by-token from the consultant (the researcher step runs before the first yield).
+        The report is saved to the advisory store only when the stream completed, is non-empty
+        and its research did not fall back.
+        """
+        crop = disease_data.get('crop_type', 'Crop')
+        disease = disease_data.get('disease_name', 'Unknown Issue')
+        location = location or "Nashik"
+
+        cached = advisory_store.get(crop, disease, location)
+        if cached:
+            print(f"⚡ Advisory served from store: {crop} / {disease} / {location}")
+            yield cached["advisory"]
+            return
+
+        state = self._initial_state(crop, disease, location, disease_data.get('search_term', ''))
+        state.update(researcher_node(state))
+        print("🧠 Agent streaming advice...")
+
+        parts = []
+        for chunk in llm.stream([SystemMessage(content=_consultant_prompt(state))]):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        # Reached only when the stream ran to completion (an interrupted consumer never gets here)
+        advisory = "".join(parts)
+        if state["research_ok"] and advisory.strip():
+            advisory_store.put(crop, disease, location, advisory)
+
+    def generate_detailed_advisory(self, disease_data, weather_context, market_context, location=None):
+        """
+        Main function called by app.py.
+        Serves today's stored report for (crop, disease, location) when one exists,
+        otherwise fetches LIVE data through the graph and stores the result.
+        """
         
-        # Run the Graph
-        result = app_graph.invoke(inputs)
-        
-        return result["final_advisory"]
+        # Extract inputs safely
+        crop = disease_data.get('crop_type', 'Crop')
+        disease = disease_data.get('disease_name', 'Unknown Issue')
+        # District comes from the linked land parcel; default to Nashik
+        location = location or "Nashik"
+
+        cached = advisory_store.get(crop, disease, location)
+        if cached:
+            print(f"⚡ Advisory served from store: {crop} / {disease} / {location}")
+            return cached["advisory"]
+
+        state = self._run_graph(crop, disease, location, disease_data.get('search_term', ''))
+        advisory = state["final_advisory"]
+        if state.get("research_ok"):
+            advisory_store.put(crop, disease, location, advisory)  # Degraded reports are served, not stored
+        return advisory
 
 # Singleton Instance
-agent_chain = AgentChain()
+agent_chain = AgentChain()
\ No newline at end of file
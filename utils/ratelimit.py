@@ -0,0 +1,60 @@
+"""
+ratelimit.py
+SUPPORT MODULE: Token Bucket Rate Limiter
+Responsibility: Keeps bursts of Groq calls inside the account's requests-per-minute budget.
+"""
+
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens/second up to `capacity`.
+    acquire() blocks until a token is available (or the timeout passes).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Takes tokens without waiting. Returns True on success."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Blocks until tokens are available. Returns False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
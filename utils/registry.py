@@ -0,0 +1,141 @@
+"""
+registry.py
+SUPPORT MODULE: Lazy Component Registry
+Responsibility: Builds expensive shared components (Groq / ChatGroq clients, the search tool,
+compiled LangGraph graphs, the Web3 connection) on first use instead of at import time, and
+hands the same instance to every caller afterwards.
+
+Usage:
+    registry.register("rag.llm", lambda: ChatGroq(...))
+    llm = lazy("rag.llm")        # Module-level name keeps working: llm.invoke(...) builds on first call
+
+Cold-start check (fails if importing the app's modules exceeds the budget):
+    python -m utils.registry
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+COLD_START_BUDGET_S = float(os.getenv("COLD_START_BUDGET_S", 1.0))
+
+# Modules app.py imports at start-up, and the heavy libraries they must not pull in eagerly
+APP_MODULES = ["utils.vision", "utils.rag", "utils.market_agent", "utils.ondc", "utils.blockchain"]
+DEFERRED_LIBRARIES = ["langchain_groq", "langgraph", "groq", "web3", "duckduckgo_search", "aiohttp"]
+
+
+class LazyRegistry:
+    """Name -> factory; each component is built once (thread-safe) on the first get()."""
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._build_seconds = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        if name not in self._factories:
+            raise KeyError(f"No component registered as '{name}'")
+        with self._locks[name]:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()  # Failures are not cached
+                self._build_seconds[name] = round(time.perf_counter() - start, 3)
+        return self._instances[name]
+
+    def is_built(self, name):
+        return name in self._instances
+
+    def reset(self, name=None):
+        """Drops built instances (all, or one) so the next get() rebuilds them."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def stats(self):
+        return {name: self._build_seconds.get(name) if name in self._instances else "lazy"
+                for name in sorted(self._factories)}
+
+
+registry = LazyRegistry()
+
+
+class LazyProxy:
+    """Stand-in for a registered component; attribute access and calls build and forward to it."""
+
+    __slots__ = ("_name", "_registry")
+
+    def __init__(self, name, owner=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_registry", owner or registry)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+    def __repr__(self):
+        state = "built" if self._registry.is_built(self._name) else "lazy"
+        return f"<LazyProxy {self._name} ({state})>"
+
+
+def lazy(name):
+    return LazyProxy(name)
+
+
+def measure_cold_start(modules=APP_MODULES):
+    """
+    Imports `modules` in a fresh interpreter and reports the time taken plus any deferred
+    library that got loaded anyway.
+
+    Returns:
+        dict: {"seconds", "per_module", "eager_libraries"}
+    """
+    script = (
+        "import sys, time, json\n"
+        f"modules = {modules!r}\n"
+        f"deferred = {DEFERRED_LIBRARIES!r}\n"
+        "per_module = {}\n"
+        "start = time.perf_counter()\n"
+        "for m in modules:\n"
+        "    t = time.perf_counter()\n"
+        "    __import__(m)\n"
+        "    per_module[m] = round(time.perf_counter() - t, 3)\n"
+        "total = round(time.perf_counter() - start, 3)\n"
+        "eager = [lib for lib in deferred if lib in sys.modules]\n"
+        "print(json.dumps({'seconds': total, 'per_module': per_module, 'eager_libraries': eager}))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, GROQ_API_KEY=os.getenv("GROQ_API_KEY") or "cold-start-check")
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    report = measure_cold_start()
+    print(json.dumps(report, indent=2))
+    assert not report["eager_libraries"], f"Imported eagerly: {report['eager_libraries']}"
+    assert report["seconds"] <= COLD_START_BUDGET_S, \
+        f"Cold start {report['seconds']}s exceeds budget {COLD_START_BUDGET_S}s"
+    print(f"✅ Cold start {report['seconds']}s within {COLD_START_BUDGET_S}s budget")
@@ -0,0 +1,130 @@
+"""
+search_service.py
+SUPPORT MODULE: Shared Web Search Service
+Responsibility: One DuckDuckGo front door for the research agent, the mandi broker and the ONDC
+gateway. Queries are normalised, cached with per-category TTLs (prices go stale fast, treatments
+don't) and concurrent identical requests are coalesced into a single upstream call.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import Future
+
+from utils.registry import registry
+
+# Seconds a cached result stays fresh, per category
+CATEGORY_TTLS = {
+    "price": int(os.getenv("SEARCH_TTL_PRICE", 15 * 60)),
+    "treatment": int(os.getenv("SEARCH_TTL_TREATMENT", 7 * 24 * 3600)),
+    "general": int(os.getenv("SEARCH_TTL_GENERAL", 3600)),
+}
+
+# Words that vary between callers without changing what the search returns
+_FILLER = {
+    "current", "today", "todays", "latest", "live", "now", "the", "in", "of", "for", "per", "kg",
+    "rate", "rates", "wholesale", "india", "mandi", "mandis", "apmc", "2024", "2025",
+}
+
+
+def normalize_query(query):
+    """
+    Cache key for a query: lower-case content words, filler removed, order-independent.
+    "current market price Tomato Nashik Mandi today 2025" and
+    "Current market price Tomato Nashik APMC mandis today" share one key.
+    """
+    words = re.findall(r"[a-z0-9]+", query.lower())
+    return " ".join(sorted({w for w in words if w not in _FILLER}))
+
+
+class SearchService:
+    """
+    Thread-safe TTL + LRU cache in front of DuckDuckGoSearchRun with single-flight coalescing.
+    Upstream errors are not cached; they propagate to every waiting caller so each keeps its
+    own fallback text.
+    """
+
+    def __init__(self, ttls=None, max_entries=2000, backend=None):
+        self.ttls = dict(CATEGORY_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self._backend = backend
+        self._cache = OrderedDict()   # key -> (expires_at, result)
+        self._in_flight = {}          # key -> Future
+        self._lock = threading.Lock()
+        self._metrics = Counter()
+
+    def _get_backend(self):
+        return self._backend or registry.get("search.duckduckgo")
+
+    def search(self, query, category="general"):
+        """Returns the search result text for `query` (cached, coalesced, or fresh)."""
+        key = f"{category}:{normalize_query(query)}"
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.time():
+                self._cache.move_to_end(key)
+                self._metrics["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._cache[key]
+                self._metrics["expired"] += 1
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._metrics["coalesced"] += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self._metrics["misses"] += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._get_backend().invoke(query)
+        except Exception as e:
+            with self._lock:
+                self._metrics["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._cache[key] = (time.time() + self.ttls.get(category, self.ttls["general"]), result)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            del self._in_flight[key]
+            self._metrics["upstream_calls"] += 1
+        future.set_result(result)
+        return result
+
+    def invalidate(self, query=None, category="general"):
+        with self._lock:
+            if query is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(f"{category}:{normalize_query(query)}", None)
+
+    def stats(self):
+        """Hit/miss/coalesce counters plus the current hit rate."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            lookups = metrics.get("hits", 0) + metrics.get("misses", 0) + metrics.get("coalesced", 0)
+            metrics["hit_rate"] = round((metrics.get("hits", 0) + metrics.get("coalesced", 0)) / lookups, 3) if lookups else 0.0
+            metrics["entries"] = len(self._cache)
+            return metrics
+
+
+def _build_duckduckgo():
+    from langchain_community.tools import DuckDuckGoSearchRun
+    return DuckDuckGoSearchRun()
+
+registry.register("search.duckduckgo", _build_duckduckgo)
+
+# Singleton shared by rag, market_agent and ondc
+search_service = SearchService()